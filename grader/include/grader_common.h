@@ -51,6 +51,8 @@ void get_user_input(char* buffer, int size);
 
 // grading.c
 int calculate_score(const char* user_ans, const char* correct_ans, int full_score);
+int calculate_scores_batch(int count, const char** user_answers, const int* accepted_offsets,
+                           const char** accepted_answers, const int* full_scores, int* out_scores);
 
 // main.c (CLI 入口)
 void start_exam();
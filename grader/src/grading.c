@@ -1,98 +1,136 @@
 #include "grader_common.h"
 #include <ctype.h>
+#include <stdint.h>
 
 #define MIN(a,b) (((a)<(b))?(a):(b))
+#define MAX(a,b) (((a)>(b))?(a):(b))
 #define MIN3(a,b,c) MIN(MIN(a,b),c)
 
-// 内部辅助：标准化字符串 (转小写 + 去除首尾空格 + 合并中间空格)
-void normalize_string(char* dest, const char* src, size_t dest_size) {
-    size_t i = 0, j = 0;
+// 内部辅助：UTF-8 解码为 Unicode 码点，返回码点个数（最多 max_len 个）
+// 非法的 UTF-8 字节按单字节码点处理，兼容 GBK 等旧编码输入
+static int utf8_decode(const char* src, uint32_t* dest, int max_len) {
+    const unsigned char* p = (const unsigned char*)src;
+    int n = 0;
+
+    while (*p && n < max_len) {
+        uint32_t cp = *p;
+        int extra = 0;
+
+        if (cp >= 0xC2 && cp <= 0xDF) { extra = 1; cp &= 0x1F; }
+        else if (cp >= 0xE0 && cp <= 0xEF) { extra = 2; cp &= 0x0F; }
+        else if (cp >= 0xF0 && cp <= 0xF4) { extra = 3; cp &= 0x07; }
+
+        int k = 1;
+        for (; k <= extra; k++) {
+            if ((p[k] & 0xC0) != 0x80) break;
+            cp = (cp << 6) | (p[k] & 0x3F);
+        }
+
+        if (k <= extra) {
+            // 不完整的多字节序列：只消费首字节
+            dest[n++] = *p;
+            p++;
+        } else {
+            dest[n++] = cp;
+            p += extra + 1;
+        }
+    }
+    return n;
+}
+
+// 内部辅助：标准化字符串 (解码为码点 + ASCII 转小写 + 去除首尾空格 + 合并中间空格)
+// 返回标准化后的码点个数
+static int normalize_string(uint32_t* dest, const char* src, int dest_size) {
+    uint32_t raw[MAX_STR_LEN];
+    int len = utf8_decode(src, raw, MAX_STR_LEN);
+    int i = 0, j = 0;
     int space_seen = 0; // 标记是否刚处理过空格
 
     // 1. 跳过开头的空格
-    while (src[i] && isspace((unsigned char)src[i])) {
+    while (i < len && raw[i] < 0x80 && isspace((int)raw[i])) {
         i++;
     }
 
-    while (src[i] && j < dest_size - 1) {
-        unsigned char c = (unsigned char)src[i];
-        
-        if (isspace(c)) {
+    for (; i < len && j < dest_size; i++) {
+        uint32_t c = raw[i];
+
+        if (c < 0x80 && isspace((int)c)) {
             // 只有当前面没有空格时，才写入一个空格（合并多个空格）
             if (!space_seen) {
                 dest[j++] = ' ';
                 space_seen = 1;
             }
         } else {
-            dest[j++] = tolower(c);
+            dest[j++] = (c < 0x80) ? (uint32_t)tolower((int)c) : c;
             space_seen = 0;
         }
-        i++;
     }
 
-    // 2. 去除末尾可能的空格 (如果字符串全为空格，j可能为0，需注意)
+    // 2. 去除末尾可能的空格
     if (j > 0 && dest[j-1] == ' ') {
         j--;
     }
-    
-    dest[j] = '\0';
+    return j;
 }
 
-// Levenshtein Distance (编辑距离) 算法 - 空间优化版
-int levenshtein_distance(const char *s1, const char *s2) {
-    int len1 = strlen(s1);
-    int len2 = strlen(s2);
-    
-    // 安全检查：防止数组越界
-    if (len1 > MAX_STR_LEN) len1 = MAX_STR_LEN;
-    if (len2 > MAX_STR_LEN) len2 = MAX_STR_LEN;
-
-    // 优化：只使用两行数组，将空间复杂度从 O(M*N) 降低到 O(N)
-    // 原先 matrix[257][257] 占用约 264KB 栈空间，现在仅需约 2KB
-    int v0[MAX_STR_LEN + 1];
-    int v1[MAX_STR_LEN + 1];
-
-    // 初始化第一行
-    for (int i = 0; i <= len2; i++) v0[i] = i;
-
-    for (int i = 0; i < len1; i++) {
-        v1[0] = i + 1;
-        for (int j = 0; j < len2; j++) {
-            int cost = (s1[i] == s2[j]) ? 0 : 1;
-            v1[j + 1] = MIN3(
-                v1[j] + 1,       // insertion
-                v0[j + 1] + 1,   // deletion
-                v0[j] + cost     // substitution
+// 有界编辑距离 (Ukkonen 带状 DP)：只计算主对角线附近宽度为 2k+1 的带
+// 距离不超过 max_dist 时返回精确距离，否则返回 max_dist + 1（超出预算立即退出）
+// 时间复杂度 O(k * n)，空间复杂度 O(n)
+static int bounded_levenshtein(const uint32_t* s1, int len1, const uint32_t* s2, int len2, int max_dist) {
+    int big = max_dist + 1;
+
+    // 长度差已超出预算
+    if (abs(len1 - len2) > max_dist) return big;
+    if (len1 == 0) return len2;
+    if (len2 == 0) return len1;
+
+    // 只使用两行数组，交替滚动
+    int rows[2][MAX_STR_LEN + 1];
+    int *v0 = rows[0];
+    int *v1 = rows[1];
+
+    // 初始化第一行（带外的格子置为 big）
+    for (int j = 0; j <= len2; j++) v0[j] = (j <= max_dist) ? j : big;
+
+    for (int i = 1; i <= len1; i++) {
+        int lo = MAX(1, i - max_dist);
+        int hi = MIN(len2, i + max_dist);
+
+        v1[0] = (i <= max_dist) ? i : big;
+        if (lo > 1) v1[lo - 1] = big;
+        int row_min = (lo == 1) ? v1[0] : big;
+
+        for (int j = lo; j <= hi; j++) {
+            int cost = (s1[i - 1] == s2[j - 1]) ? 0 : 1;
+            int v = MIN3(
+                v1[j - 1] + 1,   // insertion
+                v0[j] + 1,       // deletion
+                v0[j - 1] + cost // substitution
             );
+            if (v > big) v = big;
+            v1[j] = v;
+            if (v < row_min) row_min = v;
         }
-        // 将 v1 复制到 v0，为下一轮做准备
-        memcpy(v0, v1, (len2 + 1) * sizeof(int));
-    }
+        if (hi < len2) v1[hi + 1] = big;
 
-    return v0[len2];
-}
+        // 整行都已超出预算：最终距离不可能再变小，提前退出
+        if (row_min > max_dist) return big;
 
-int calculate_score(const char* user_ans, const char* correct_ans, int full_score) {
-    if (!user_ans || !correct_ans) {
-        LOG_ERROR("Invalid arguments to calculate_score");
-        return 0;
+        int *tmp = v0; v0 = v1; v1 = tmp;
     }
 
-    char u_norm[MAX_STR_LEN + 1]; // +1 for safety
-    char c_norm[MAX_STR_LEN + 1];
-
-    // 1. 预处理：标准化 (转小写、去首尾空格、合并中间空格)
-    normalize_string(u_norm, user_ans, sizeof(u_norm));
-    normalize_string(c_norm, correct_ans, sizeof(c_norm));
+    return MIN(v0[len2], big);
+}
 
-    // 2. 精确匹配 (标准化后)
-    if (strcmp(u_norm, c_norm) == 0) {
+// 内部辅助：对已标准化的码点序列评分
+static int score_normalized(const uint32_t* u_norm, int u_len, const uint32_t* c_norm, int c_len, int full_score) {
+    // 1. 精确匹配 (标准化后)
+    if (u_len == c_len && memcmp(u_norm, c_norm, c_len * sizeof(uint32_t)) == 0) {
         return full_score;
     }
 
-    // 3. 模糊匹配 (Fuzzy Matching)
-    int len = strlen(c_norm);
-    int dist = levenshtein_distance(u_norm, c_norm);
+    // 2. 模糊匹配 (Fuzzy Matching)，长度按字符（码点）计算，中英文容错一致
+    int len = c_len;
 
     // 智能容错规则：
     // - 长度 <= 3: 必须精确匹配 (dist == 0)
@@ -104,18 +142,81 @@ int calculate_score(const char* user_ans, const char* correct_ans, int full_scor
     } else if (len <= 10) {
         allowed_errors = 1;
     } else {
-        allowed_errors = (int)(len * 0.2); 
+        allowed_errors = (int)(len * 0.2);
     }
 
-    // 额外保护：如果编辑距离过大（超过长度的一半），直接判错
+    // 额外保护：编辑距离超过长度的一半直接判错
     // 防止短字符串匹配到完全无关的长字符串
-    if (dist > len / 2) {
+    if (allowed_errors > len / 2) {
+        allowed_errors = len / 2;
+    }
+
+    // 不允许误差时只接受精确匹配（已在上面判断）
+    if (allowed_errors == 0) {
         return 0;
     }
 
+    // 超出容错预算即提前退出，无需填满整个 DP 矩阵
+    int dist = bounded_levenshtein(u_norm, u_len, c_norm, c_len, allowed_errors);
     if (dist <= allowed_errors) {
         return full_score;
     }
 
     return 0;
-}
\ No newline at end of file
+}
+
+int calculate_score(const char* user_ans, const char* correct_ans, int full_score) {
+    if (!user_ans || !correct_ans) {
+        LOG_ERROR("Invalid arguments to calculate_score");
+        return 0;
+    }
+
+    uint32_t u_norm[MAX_STR_LEN];
+    uint32_t c_norm[MAX_STR_LEN];
+
+    // 预处理：解码为码点并标准化 (转小写、去首尾空格、合并中间空格)
+    int u_len = normalize_string(u_norm, user_ans, MAX_STR_LEN);
+    int c_len = normalize_string(c_norm, correct_ans, MAX_STR_LEN);
+
+    return score_normalized(u_norm, u_len, c_norm, c_len, full_score);
+}
+
+// 批量评分：一次调用完成整张试卷，减少 FFI 往返
+// - user_answers[i]: 第 i 题的用户答案
+// - accepted_answers[accepted_offsets[i] .. accepted_offsets[i+1]): 第 i 题的所有可接受答案
+//   (accepted_offsets 长度为 count + 1)
+// - full_scores[i]: 第 i 题满分
+// - out_scores[i]: 输出第 i 题在所有可接受答案中的最高得分
+// 返回 0 表示成功，-1 表示参数错误
+int calculate_scores_batch(int count, const char** user_answers, const int* accepted_offsets,
+                           const char** accepted_answers, const int* full_scores, int* out_scores) {
+    if (count < 0 || (count > 0 && (!user_answers || !accepted_offsets || !full_scores || !out_scores))) {
+        LOG_ERROR("Invalid arguments to calculate_scores_batch");
+        return -1;
+    }
+
+    uint32_t u_norm[MAX_STR_LEN];
+    uint32_t c_norm[MAX_STR_LEN];
+
+    for (int i = 0; i < count; i++) {
+        int best = 0;
+        out_scores[i] = 0;
+        if (!user_answers[i]) continue;
+
+        // 用户答案每题只标准化一次
+        int u_len = normalize_string(u_norm, user_answers[i], MAX_STR_LEN);
+
+        for (int k = accepted_offsets[i]; k < accepted_offsets[i + 1]; k++) {
+            if (!accepted_answers || !accepted_answers[k]) continue;
+            int c_len = normalize_string(c_norm, accepted_answers[k], MAX_STR_LEN);
+            int current = score_normalized(u_norm, u_len, c_norm, c_len, full_scores[i]);
+            if (current > best) {
+                best = current;
+                if (best >= full_scores[i]) break; // 已满分，无需继续比较
+            }
+        }
+        out_scores[i] = best;
+    }
+
+    return 0;
+}
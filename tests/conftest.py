@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# web/__init__.py 在导入时校验必需的环境变量（缺少时 sys.exit(100)），测试使用内存 SQLite 与占位配置
+TEST_ENV = {
+    'DATABASE_URL': 'sqlite://',
+    'DASHSCOPE_API_KEY': 'test',
+    'SECRET_KEY': 'test',
+    'FLASK_ENV': 'testing',
+    'REDIS_HOST': '127.0.0.1',
+    'REDIS_PORT': '6399',
+    'SESSION_TYPE': 'filesystem',
+}
+for name, value in TEST_ENV.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app():
+    """只初始化数据库的最小应用（不启动评分队列、SocketIO 等后台服务）"""
+    pytest.importorskip('flask_sqlalchemy')
+    from flask import Flask
+    from web.extensions import db
+    from web.services import question_search
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    question_search._backend_cache.clear()
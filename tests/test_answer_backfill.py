@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.extensions import db
+from web.models import ExamAnswer, ExamResult
+from web.services.answer_backfill import backfill_exam_answers, parse_timestamp
+from web.utils.data_manager import DataManager
+
+
+def _detail(qid, score):
+    return {'id': qid, 'category': '默认题集', 'question': f'q{qid}', 'user_ans': 'a',
+            'correct_ans': 'a', 'score': score, 'full_score': 10}
+
+
+def _legacy(result_id, timestamp, details):
+    # 旧版记录：逐题详情保存在 details_json，taken_at 尚未填充
+    db.session.add(ExamResult(id=result_id, timestamp=timestamp, total_score=0, max_score=0,
+                              details_json=details if isinstance(details, str) else json.dumps(details)))
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('2026-10-17 12:30:05') == datetime(2026, 10, 17, 12, 30, 5)
+    # 带毫秒等后缀的旧格式只取前 19 个字符
+    assert parse_timestamp('2026-10-17 12:30:05.123456') == datetime(2026, 10, 17, 12, 30, 5)
+    assert parse_timestamp(None) is None
+    assert parse_timestamp('') is None
+    assert parse_timestamp('昨天下午') is None
+    assert parse_timestamp('2026-13-01 00:00:00') is None
+
+
+def test_backfill_converts_legacy_details(app):
+    _legacy('r1', '2026-10-01 08:00:00', [_detail(1, 10), _detail(2, 0)])
+    _legacy('r2', '2026-10-02 09:00:00', [_detail(3, 5)])
+    db.session.commit()
+
+    assert backfill_exam_answers(batch_size=1) == (2, 2)
+    db.session.expire_all()
+
+    r1 = db.session.get(ExamResult, 'r1')
+    assert r1.details_json is None
+    assert r1.taken_at == datetime(2026, 10, 1, 8, 0, 0)
+    assert [(a.position, a.question_id, a.score) for a in r1.answers] == [(0, 1, 10), (1, 2, 0)]
+    assert [d['id'] for d in r1.details] == [1, 2]
+    assert ExamAnswer.query.filter_by(result_id='r2').count() == 1
+
+
+def test_backfill_is_resumable_and_idempotent(app):
+    _legacy('r1', '2026-10-01 08:00:00', [_detail(1, 10)])
+    db.session.commit()
+    assert backfill_exam_answers() == (1, 1)
+
+    # 再次执行不重复写入作答行
+    assert backfill_exam_answers() == (0, 0)
+    assert ExamAnswer.query.count() == 1
+
+
+def test_backfill_handles_bad_rows(app):
+    _legacy('r1', '不是时间', [_detail(1, 10)])
+    _legacy('r2', '2026-10-02 09:00:00', '{broken')
+    # 已无 details_json、只缺 taken_at 的记录只补时间
+    db.session.add(ExamResult(id='r3', timestamp='2026-10-03 10:00:00', details_json=None))
+    db.session.commit()
+
+    assert backfill_exam_answers() == (3, 2)
+    db.session.expire_all()
+
+    r1 = db.session.get(ExamResult, 'r1')
+    assert r1.details_json is None and r1.taken_at is None
+    assert len(r1.answers) == 1
+    r2 = db.session.get(ExamResult, 'r2')
+    assert r2.details_json is None and r2.answers == []
+    assert db.session.get(ExamResult, 'r3').taken_at == datetime(2026, 10, 3, 10, 0, 0)
+
+    # 无法解析时间的记录每次都会被重新检查，但不会再转换
+    assert backfill_exam_answers() == (1, 0)
+
+
+def test_backfill_reports_progress(app):
+    for i in range(5):
+        _legacy(f'r{i}', '2026-10-01 08:00:00', [_detail(i, 1)])
+    db.session.commit()
+
+    calls = []
+    backfill_exam_answers(batch_size=2, progress=lambda processed, converted: calls.append((processed, converted)))
+    assert calls == [(2, 2), (4, 4), (5, 5)]
+
+
+def test_load_results_puts_untimed_rows_last(app, tmp_path):
+    db.session.add_all([
+        ExamResult(id='a', timestamp='', taken_at=None),
+        ExamResult(id='b', timestamp='2026-10-01 08:00:00', taken_at=datetime(2026, 10, 1, 8)),
+        ExamResult(id='c', timestamp='2026-10-02 08:00:00', taken_at=datetime(2026, 10, 2, 8)),
+        ExamResult(id='d', timestamp='2026-10-02 08:00:00', taken_at=datetime(2026, 10, 2, 8)),
+        ExamResult(id='e', timestamp='', taken_at=None),
+    ])
+    db.session.commit()
+
+    results = DataManager(SimpleNamespace(UPLOAD_FOLDER=str(tmp_path))).load_results()
+    # 最新在前，同一时间按 id 倒序；缺少时间的旧记录排在最后
+    assert [r['id'] for r in results] == ['d', 'c', 'b', 'e', 'a']
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.extensions import db
+from web.models import Question, SystemCounter
+from web.services import counters
+from web.utils.data_manager import DataManager
+
+
+@pytest.fixture
+def data_manager(app, tmp_path):
+    return DataManager(SimpleNamespace(UPLOAD_FOLDER=str(tmp_path)))
+
+
+def _stored():
+    return {c.name: c.value for c in SystemCounter.query.all()}
+
+
+def _result(result_id, score, max_score):
+    return {
+        'id': result_id,
+        'timestamp': '2026-10-17 12:00:00',
+        'total_score': score,
+        'max_score': max_score,
+        'details': [{'id': 1, 'category': '默认题集', 'question': 'q', 'user_ans': 'a',
+                     'correct_ans': 'a', 'score': score, 'full_score': max_score}]
+    }
+
+
+def test_read_counters_initialises_missing_rows(app):
+    db.session.add(Question(content='q', answer='a'))
+    db.session.commit()
+    assert counters.read_counters() == {'exams': 0, 'max_score_sum': 0, 'questions': 1, 'score_sum': 0}
+    assert _stored() == {'exams': 0, 'max_score_sum': 0, 'questions': 1, 'score_sum': 0}
+
+
+def test_exam_results_increment_and_delete_decrement(app, data_manager):
+    counters.reconcile()
+    data_manager.record_exam_result(_result('r1', 7, 10))
+    data_manager.save_exam_results_bulk([
+        {**_result('r2', 5, 10), 'user_id': None, 'category': '默认题集'},
+        {**_result('r3', 10, 10), 'user_id': None, 'category': '默认题集'},
+    ])
+    assert _stored() == {'exams': 3, 'max_score_sum': 30, 'questions': 0, 'score_sum': 22}
+
+    data_manager.delete_result('r2')
+    assert _stored() == {'exams': 2, 'max_score_sum': 20, 'questions': 0, 'score_sum': 17}
+
+
+def test_increment_without_rows_is_noop(app):
+    counters.increment(exams=1)
+    db.session.commit()
+    assert _stored() == {}
+
+
+def test_reconcile_corrects_drift(app, data_manager):
+    counters.reconcile()
+    data_manager.record_exam_result(_result('r1', 7, 10))
+    # 绕过应用直接修改数据：计数器与真实值出现偏差
+    SystemCounter.query.filter_by(name='exams').update({SystemCounter.value: 42})
+    SystemCounter.query.filter_by(name='score_sum').update({SystemCounter.value: -3})
+    db.session.commit()
+
+    assert counters.reconcile() == {'exams': 1, 'max_score_sum': 10, 'questions': 0, 'score_sum': 7}
+    assert _stored() == {'exams': 1, 'max_score_sum': 10, 'questions': 0, 'score_sum': 7}
+
+
+def test_reconcile_applies_difference_not_absolute(app, monkeypatch):
+    counters.reconcile()
+    real_snapshot = counters._snapshot
+
+    def snapshot_then_concurrent_write():
+        # 统计完成后、修正前，另一个事务提交了一份考试记录并累加了计数器
+        result = real_snapshot()
+        counters.increment(exams=1, score_sum=5, max_score_sum=10)
+        return result
+
+    monkeypatch.setattr(counters, '_snapshot', snapshot_then_concurrent_write)
+    counters.reconcile()
+    # 偏差为 0，修正不会覆盖并发提交的增量
+    assert _stored()['exams'] == 1
+    assert _stored()['score_sum'] == 5
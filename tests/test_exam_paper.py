@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.models import ExamPaper
+from web.services.exam_paper import paper_answers, paper_questions
+from web.services.grading_engine import GradingEngine, QuestionIndex
+
+BANK = [
+    {'id': 11, 'content': '一', 'answer': 'a', 'score': 10, 'category': '默认题集'},
+    {'id': 12, 'content': '二', 'answer': 'b', 'score': 10, 'category': '默认题集'},
+    {'id': 13, 'content': '三', 'answer': 'c', 'score': 10, 'category': '默认题集'},
+]
+
+
+def _paper():
+    paper = ExamPaper(id='paper-1', user_id=1, category='all', bank_version='v1')
+    paper.question_ids = [11, 12, 13]
+    return paper
+
+
+def _submit(rendered, answers):
+    # 模拟浏览器按渲染出的字段名提交答案
+    return {f"q_{q['position']}": answers[q['id']] for q in rendered}
+
+
+def test_delete_between_render_and_submit_keeps_answers_aligned():
+    paper = _paper()
+    form = _submit(paper_questions(paper, BANK), {11: 'a', 12: 'b', 13: 'c'})
+
+    # 提交前删除第 2 题：当前题库只剩 11、13
+    current_bank = [q for q in BANK if q['id'] != 12]
+    ids, user_answers = paper_answers(paper, form)
+    assert ids == [11, 12, 13]
+
+    # 快照仍包含被删除的题目：按渲染时的试卷评分
+    result = GradingEngine().grade(ids, user_answers, QuestionIndex(BANK, version='v1'))
+    assert [d['id'] for d in result['details']] == [11, 12, 13]
+    assert result['total_score'] == result['max_score'] == 30
+
+    # 快照失效、回退到当前题库：被删除的题目跳过，后续题目的答案不错位
+    result = GradingEngine().grade(ids, user_answers, QuestionIndex(current_bank))
+    assert [(d['id'], d['user_ans']) for d in result['details']] == [(11, 'a'), (13, 'c')]
+    assert result['total_score'] == result['max_score'] == 20
+
+
+def test_render_after_delete_keeps_field_positions():
+    paper = _paper()
+    rendered = paper_questions(paper, [q for q in BANK if q['id'] != 12])
+    assert [(q['id'], q['position']) for q in rendered] == [(11, 0), (13, 2)]
+
+    ids, user_answers = paper_answers(paper, _submit(rendered, {11: 'a', 13: 'c'}))
+    result = GradingEngine().grade(ids, user_answers, QuestionIndex(BANK, version='v1'))
+    scores = {d['id']: d['score'] for d in result['details']}
+    assert scores == {11: 10, 12: 0, 13: 10}
@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.services.grading import GradingService
+from web.services.grading_engine import GradingEngine, QuestionIndex, safe_encode, split_answers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ('Paris', 'Paris', 10),
+    ('paris', 'Paris', 10),
+    ('  Paris ', 'Paris', 10),
+    ('Pariss', 'Paris', 10),
+    ('London', 'Paris', 10),
+    ('', 'Paris', 5),
+    ('北京', '北京', 8),
+    ('北 京', '北京', 8),
+    ('南京', '北京', 8),
+    ('光合作用', '光合作用；photosynthesis', 10),
+    ('Photosynthesis', '光合作用；photosynthesis', 10),
+    ('the quick brown fox jumps over the lazy dog', 'the quick brown fox jumped over a lazy dog', 20),
+    ('x' * 600, 'x' * 590, 10),
+    ('答案', '', 3),
+    ('abc', 'abc;abd;xyz', 0),
+]
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    compiler = shutil.which('gcc') or shutil.which('cc')
+    if not compiler:
+        pytest.skip('C 编译器不可用')
+    lib_path = str(tmp_path_factory.mktemp('grader') / 'libgrading.so')
+    subprocess.run([
+        compiler, '-shared', '-fPIC', '-std=c99', '-O2',
+        '-I', os.path.join(ROOT, 'grader', 'include'),
+        os.path.join(ROOT, 'grader', 'src', 'grading.c'),
+        '-o', lib_path
+    ], check=True)
+    service = GradingService(lib_path)
+    assert service.is_available() and service.has_batch
+    return service
+
+
+def _items():
+    return [
+        (safe_encode(user_ans), [safe_encode(a) for a in split_answers(answer)], full_score)
+        for user_ans, answer, full_score in CASES
+    ]
+
+
+def _expected(service):
+    return [
+        max(service.calculate_score(user_ans, accepted_ans, full_score) for accepted_ans in accepted)
+        for user_ans, accepted, full_score in _items()
+    ]
+
+
+def test_batch_matches_calculate_score(service):
+    assert service.score_many(_items()) == _expected(service)
+
+
+def test_per_question_fallback_matches_batch(service, monkeypatch):
+    batch = service.score_many(_items())
+    # 旧版本动态库没有批量导出时逐题调用 calculate_score
+    monkeypatch.setattr(service, 'has_batch', False)
+    assert service.score_many(_items()) == batch
+
+
+def test_empty_batch(service):
+    assert service.score_many([]) == []
+
+
+def test_engine_batch_matches_single_question(service):
+    questions = [
+        {'id': i, 'content': f'q{i}', 'answer': answer, 'score': full_score, 'category': '默认题集'}
+        for i, (_, answer, full_score) in enumerate(CASES)
+    ]
+    index = QuestionIndex(questions, version='v1')
+    engine = GradingEngine(service)
+    pairs = [(index.get(i), user_ans) for i, (user_ans, _, _) in enumerate(CASES)]
+    assert engine.score_batch(pairs) == [engine.score_question(q, user_ans) for q, user_ans in pairs]
+
+    result = engine.grade(list(range(len(CASES))), {str(i): c[0] for i, c in enumerate(CASES)}, index)
+    assert [d['score'] for d in result['details']] == _expected(service)
@@ -0,0 +1,106 @@
+import os
+import stat
+import time
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.extensions import db
+from web.models import Question
+from web.services import question_exporter
+from web.services.question_exporter import QuestionExporter, export_questions_file
+
+
+@pytest.fixture
+def questions(app):
+    db.session.add_all([
+        Question(content='第一行\n第二行', answer='A', score=5, category='语文'),
+        Question(content='2+2', answer='4', score=10, image='sum.png', category=None),
+    ])
+    db.session.commit()
+
+
+def _leftovers(directory):
+    return [name for name in os.listdir(directory) if name.startswith('.questions.')]
+
+
+def test_export_writes_grader_format(questions, tmp_path):
+    data_file = tmp_path / 'questions.txt'
+    content_hash, written = export_questions_file(str(data_file), chunk_size=1)
+    assert written and content_hash
+    assert data_file.read_text(encoding='utf-8') == '第一行[NEWLINE]第二行|A|5||语文\n2+2|4|10|sum.png|默认题集'
+    assert _leftovers(tmp_path) == []
+
+
+def test_unchanged_content_skips_write(questions, tmp_path):
+    data_file = tmp_path / 'questions.txt'
+    content_hash, _ = export_questions_file(str(data_file))
+    inode = os.stat(data_file).st_ino
+    mtime = os.stat(data_file).st_mtime_ns
+
+    # 现有文件的哈希与 known_hash 两种方式都应跳过写入
+    assert export_questions_file(str(data_file)) == (content_hash, False)
+    assert export_questions_file(str(data_file), known_hash=content_hash) == (content_hash, False)
+    assert os.stat(data_file).st_ino == inode
+    assert os.stat(data_file).st_mtime_ns == mtime
+    assert _leftovers(tmp_path) == []
+
+
+def test_changed_content_replaced_atomically_keeping_mode(questions, tmp_path):
+    data_file = tmp_path / 'questions.txt'
+    old_hash, _ = export_questions_file(str(data_file))
+    os.chmod(data_file, 0o640)
+    old_inode = os.stat(data_file).st_ino
+
+    Question.query.filter_by(answer='4').update({Question.answer: '四'})
+    db.session.commit()
+    new_hash, written = export_questions_file(str(data_file), known_hash=old_hash)
+
+    assert written and new_hash != old_hash
+    # 新文件通过 rename 替换（新 inode），权限沿用原文件
+    assert os.stat(data_file).st_ino != old_inode
+    assert stat.S_IMODE(os.stat(data_file).st_mode) == 0o640
+    assert data_file.read_text(encoding='utf-8').endswith('2+2|四|10|sum.png|默认题集')
+    assert _leftovers(tmp_path) == []
+
+
+def test_new_file_is_world_readable(questions, tmp_path):
+    data_file = tmp_path / 'questions.txt'
+    export_questions_file(str(data_file))
+    assert stat.S_IMODE(os.stat(data_file).st_mode) == 0o644
+
+
+def test_failed_export_keeps_original_file(questions, tmp_path, monkeypatch):
+    data_file = tmp_path / 'questions.txt'
+    data_file.write_text('旧内容', encoding='utf-8')
+
+    def broken(*args):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(question_exporter, '_format_line', broken)
+    with pytest.raises(RuntimeError):
+        export_questions_file(str(data_file))
+    assert data_file.read_text(encoding='utf-8') == '旧内容'
+    assert _leftovers(tmp_path) == []
+
+
+def test_exporter_coalesces_bursts(app, questions, tmp_path):
+    data_file = tmp_path / 'questions.txt'
+    exporter = QuestionExporter(app, str(data_file), delay=0.05, max_delay=1.0)
+    try:
+        for _ in range(5):
+            exporter.schedule()
+        deadline = time.time() + 5
+        while exporter.stats()['exports'] == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        assert exporter.stats() == {'pending': False, 'exports': 1, 'skipped': 0}
+
+        # 内容未变化的再次导出只计为跳过
+        exporter.schedule()
+        deadline = time.time() + 5
+        while exporter.stats()['skipped'] == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        assert exporter.stats() == {'pending': False, 'exports': 1, 'skipped': 1}
+    finally:
+        exporter.close()
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.extensions import db
+from web.models import Question
+from web.services import question_search
+
+
+def _add_questions(count, content='相同的题目内容'):
+    questions = [Question(content=content, answer='答案', category='默认题集') for _ in range(count)]
+    db.session.add_all(questions)
+    db.session.commit()
+    return {q.id for q in questions}
+
+
+def _collect_pages(term, limit):
+    seen = []
+    cursor = None
+    while True:
+        questions, cursor = question_search.search_questions(term, limit=limit, cursor=cursor)
+        seen.extend(q.id for q in questions)
+        if cursor is None:
+            return seen
+
+
+def test_like_tie_spans_page_boundary(app):
+    # LIKE 回退时所有结果得分相同，只能靠 id 分页
+    ids = _add_questions(5)
+    seen = _collect_pages('相同', limit=2)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
+
+
+def test_fts5_tie_spans_page_boundary(app):
+    question_search.ensure_search_index()
+    if question_search._backend() != 'fts5':
+        pytest.skip('SQLite 未启用 FTS5 trigram 分词')
+    # 内容完全相同，bm25 得分相同，同分结果跨越分页边界
+    ids = _add_questions(5)
+    _add_questions(2, content='另一道不相关的题')
+    seen = _collect_pages('相同的题目', limit=2)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
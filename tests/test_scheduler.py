@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from web.utils.scheduler import FairScheduler, QueueFull
+
+
+def _drain(scheduler):
+    order = []
+    while scheduler.qsize():
+        order.append(scheduler.get(timeout=0))
+    return order
+
+
+def test_round_robin_between_users():
+    scheduler = FairScheduler(capacity=100)
+    for i in range(3):
+        scheduler.put(f'a{i}', user_id=1)
+    scheduler.put('b0', user_id=2)
+    scheduler.put('c0', user_id=3)
+    scheduler.put('b1', user_id=2)
+    # 用户 1 批量提交不会让其他用户排在其全部任务之后
+    assert _drain(scheduler) == ['a0', 'b0', 'c0', 'a1', 'b1', 'a2']
+
+
+def test_higher_priority_lane_first():
+    scheduler = FairScheduler(capacity=100)
+    scheduler.put('m', user_id=1, lane='maintenance')
+    scheduler.put('r', user_id=1, lane='regrade')
+    scheduler.put('e', user_id=2, lane='exam')
+    assert _drain(scheduler) == ['e', 'r', 'm']
+
+
+def test_total_capacity_raises_queue_full():
+    scheduler = FairScheduler(capacity=2, workers=2)
+    scheduler.put('t1', user_id=1)
+    scheduler.put('t2', user_id=2)
+    with pytest.raises(QueueFull) as exc:
+        scheduler.put('t3', user_id=3)
+    assert exc.value.retry_after >= 1
+    assert exc.value.lane == 'exam'
+    assert scheduler.stats()['lanes']['exam']['rejected'] == 1
+    # 出队后恢复接收
+    scheduler.get(timeout=0)
+    scheduler.put('t3', user_id=3)
+    assert scheduler.qsize() == 2
+
+
+def test_lane_capacity_limits_only_that_lane():
+    scheduler = FairScheduler(capacity=10, lane_capacity={'regrade': 1})
+    scheduler.put('r1', user_id=1, lane='regrade')
+    with pytest.raises(QueueFull) as exc:
+        scheduler.put('r2', user_id=1, lane='regrade')
+    assert exc.value.lane == 'regrade'
+    scheduler.put('e1', user_id=1, lane='exam')
+    assert scheduler.qsize() == 2
+
+
+def test_retry_after_tracks_backlog_and_service_time():
+    scheduler = FairScheduler(capacity=1000, workers=2)
+    for i in range(100):
+        scheduler.put(f't{i}', user_id=i)
+    for _ in range(20):
+        scheduler.record_service_time(2.0)
+    # 100 个任务 * 约 2 秒 / 2 个工作线程
+    assert 80 <= scheduler._retry_after() <= 101
+
+
+def test_get_returns_none_when_closed_or_timed_out():
+    scheduler = FairScheduler()
+    assert scheduler.get(timeout=0.01) is None
+    scheduler.close()
+    assert scheduler.get() is None
+
+
+def test_unknown_lane_rejected():
+    with pytest.raises(ValueError):
+        FairScheduler().put('t', user_id=1, lane='bogus')
@@ -98,7 +98,10 @@ def create_app(config_class=Config):
     # 9. 注册SocketIO事件处理器
     _register_socketio_events(app)
     
-    # 10. 初始化Celery
+    # 10. 注册命令行工具（flask import-questions 等）
+    _register_cli_commands(app)
+    
+    # 11. 初始化Celery
     from web import celery_utils
     app.extensions['celery'] = celery_utils.make_celery(app)
     
@@ -192,6 +195,12 @@ def _initialize_services(app, config_class):
             db.create_all()
             data_manager.init_db(app)
 
+    # 定期按真实数据校准全局计数器（多进程时由 Redis 锁保证每个周期只执行一次）
+    reconcile_interval = app.config.get('COUNTER_RECONCILE_INTERVAL', 3600)
+    if reconcile_interval:
+        from web.services.counters import CounterReconciler
+        app.counter_reconciler = CounterReconciler(app, interval=reconcile_interval)
+
 def _register_blueprints(app):
     """注册所有蓝图（延迟导入避免循环依赖）"""
     # 延迟导入蓝图
@@ -283,8 +292,12 @@ def _register_socketio_events(app):
     @socketio.on('join')
     def on_join(data):
         from flask_socketio import join_room
+        from flask_login import current_user
         room = data.get('room')
         if room:
+            # admin: 前缀的房间（如队列实时统计）仅管理员可加入
+            if str(room).startswith('admin:') and not (current_user.is_authenticated and current_user.is_admin):
+                return
             join_room(room)
             app.logger.debug(f"客户端加入房间: {room}")
     
@@ -306,4 +319,64 @@ def _register_socketio_events(app):
     
     @socketio.on('draft_status')
     def on_draft_status(data):
-        app.logger.debug(f"收到草稿状态事件: {data}")
\ No newline at end of file
+        app.logger.debug(f"收到草稿状态事件: {data}")
+
+def _register_cli_commands(app):
+    """注册 Flask CLI 命令"""
+    import click
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['txt', 'csv', 'jsonl']), default=None,
+                  help='文件格式，默认按扩展名判断（其他扩展名按 questions.txt 格式）')
+    @click.option('--category', default='默认题集', help='未指定类别的题目归入该类别')
+    @click.option('--batch-size', default=1000, show_default=True, help='每批写入的题目数')
+    def import_questions_command(path, fmt, category, batch_size):
+        """批量导入题目（CSV / JSONL / questions.txt 格式）"""
+        from web.services.question_import import detect_format, import_questions
+        from web.services.question_bank import bump_bank_version
+
+        def progress(report):
+            stats = report.to_dict()
+            click.echo(f"[Import] {stats['inserted']} inserted, {stats['rows']} rows read ({stats['rows_per_sec']} rows/s)")
+
+        with open(path, 'rb') as f:
+            report = import_questions(f, fmt or detect_format(path), default_category=category,
+                                      batch_size=batch_size, progress=progress)
+        stats = report.to_dict()
+        if stats['inserted']:
+            bump_bank_version()
+            app.data_manager.export_questions_to_txt()
+        for error in stats['errors']:
+            click.echo(f"  第 {error['line']} 行: {error['error']}", err=True)
+        if stats['error_count'] > len(stats['errors']):
+            click.echo(f"  ……另有 {stats['error_count'] - len(stats['errors'])} 条错误未显示", err=True)
+        click.echo(
+            f"导入完成：读取 {stats['rows']} 行，新增 {stats['inserted']}，重复 {stats['duplicates']}，"
+            f"错误 {stats['error_count']}，耗时 {stats['elapsed']} 秒（{stats['rows_per_sec']} 行/秒）"
+        )
+
+    @app.cli.command('backfill-exam-answers')
+    @click.option('--batch-size', default=500, show_default=True, help='每批处理的考试记录数')
+    def backfill_exam_answers_command(batch_size):
+        """把旧考试记录的 details_json 分批拆分到 exam_answer 并补齐 taken_at（可中断后重新执行）"""
+        from web.services.answer_backfill import backfill_exam_answers
+
+        def progress(processed, converted):
+            click.echo(f"[Backfill] {processed} results checked, {converted} converted")
+
+        processed, converted = backfill_exam_answers(batch_size=batch_size, progress=progress)
+        click.echo(f"回填完成：检查 {processed} 条考试记录，转换 {converted} 条")
+
+    @app.cli.command('rebuild-question-stats')
+    def rebuild_question_stats_command():
+        """根据 exam_answer 重建每个用户的题目作答 / 错误统计（请先执行 backfill-exam-answers）"""
+        count = app.data_manager.rebuild_question_stats()
+        click.echo(f"已重建 {count} 条题目统计")
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters_command():
+        """按真实数据重新计算全局计数器（题目数、考试数、得分总和）"""
+        from web.services.counters import reconcile
+        values = reconcile()
+        click.echo(', '.join(f"{name}={value}" for name, value in values.items()))
@@ -13,7 +13,13 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from web.extensions import db
 from flask import current_app
-from web.models import User, SystemSetting, UserCategoryStat
+from web.models import User, SystemSetting, UserCategoryStat, RegradeJob
+from web.services.score_cache import get_score_cache
+from web.services.regrade import create_regrade_job, find_conflicting_job, is_resumable
+from web.services import counters
+from web.services.question_bank import bump_bank_version
+from web.services.question_import import IMPORT_BATCH_SIZE, detect_format, import_questions
+from web.utils.scheduler import QueueFull
 
 admin_bp = Blueprint('admin_bp', __name__)
 
@@ -203,12 +209,26 @@ def manage():
         query = Question.query
     else:
         query = Question.query.filter_by(type='personal', owner_id=current_user.id)
+    categories = data_manager.get_categories() if data_manager else []
+    if search and data_manager:
+        # 搜索结果按相关度排序，使用游标分页（不做 COUNT 与 OFFSET）
+        cursor = request.args.get('cursor')
+        questions, next_cursor = data_manager.search_questions(
+            search, category=category or None,
+            owner_id=None if current_user.is_admin else current_user.id,
+            per_page=10, cursor=cursor
+        )
+        return render_template('quiz/manage.html',
+                             questions=questions,
+                             pagination=None,
+                             cursor=cursor,
+                             next_cursor=next_cursor,
+                             search=search,
+                             current_category=category,
+                             categories=categories)
     if category:
         query = query.filter_by(category=category)
-    if search:
-        query = query.filter(Question.content.ilike(f'%{search}%'))
     pagination = query.order_by(Question.id.desc()).paginate(page=page, per_page=10, error_out=False)
-    categories = data_manager.get_categories() if data_manager else []
     return render_template('quiz/manage.html', 
                          questions=pagination.items, 
                          pagination=pagination,
@@ -232,6 +252,7 @@ def add():
         images = request.files.getlist('image[]')
         from web.models import Question
         if contents and answers and scores:
+            added = 0
             for i, (c, a, s) in enumerate(zip(contents, answers, scores)):
                 if c and a and s:
                     cat = categories[i] if i < len(categories) and categories[i] else '默认题集'
@@ -249,7 +270,12 @@ def add():
                     else:
                         q = Question(content=c, answer=a, score=int(s), image=image_filename, category=cat, mode='html', type='personal', owner_id=current_user.id)
                     db.session.add(q)
+                    added += 1
+            counters.increment(questions=added)
             db.session.commit()
+            bump_bank_version()
+            if data_manager:
+                data_manager.schedule_export()
             flash('题目添加处理完成！', 'success')
             return redirect(url_for('admin_bp.manage'))
     data_manager = getattr(current_app, 'data_manager', None)
@@ -276,7 +302,12 @@ def delete_question(id):
         return redirect(url_for('main.index'))
     image_filename = q.image
     db.session.delete(q)
+    counters.increment(questions=-1)
     db.session.commit()
+    bump_bank_version()
+    get_score_cache().invalidate_question(id)
+    if data_manager:
+        data_manager.schedule_export()
     if image_filename:
         image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images', image_filename)
         if os.path.exists(image_path):
@@ -334,12 +365,30 @@ def edit_question(id):
                         except:
                             pass
                 image_filename = new_filename
+            grading_changed = (q.answer != answer or q.score != int(score))
             q.content = content
             q.answer = answer
             q.score = int(score)
             q.image = image_filename
             q.category = request.form.get('category', '默认题集')
             db.session.commit()
+            bump_bank_version()
+            # 与新增 / 删除 / 导入一致：后台重新导出 questions.txt，供挂载该文件的命令行评分程序使用
+            if data_manager:
+                data_manager.schedule_export()
+            if grading_changed:
+                get_score_cache().invalidate_question(q.id)
+                if current_user.is_admin and request.form.get('regrade') == 'yes':
+                    conflict = find_conflicting_job([q.id])
+                    if conflict:
+                        flash(f'该题目正在由重评任务 #{conflict.id} 处理，请在其完成后再提交重评', 'warning')
+                        return redirect(url_for('admin_bp.manage'))
+                    job = create_regrade_job([q.id], created_by=current_user.id)
+                    try:
+                        current_app.grading_queue.add_regrade(current_user.id, job.id)
+                        flash(f'已提交重评任务 #{job.id}，历史考试记录将按新答案重新评分', 'info')
+                    except QueueFull as e:
+                        flash(f'评分队列繁忙，重评任务 #{job.id} 已保存，请在 {e.retry_after} 秒后续跑', 'warning')
             return redirect(url_for('admin_bp.manage'))
     # GET 或未通过校验时渲染页面
     question_html = render_content(q.content, getattr(q, 'mode', 'html')) if q else ''
@@ -351,3 +400,76 @@ def queue():
     if not current_user.is_admin:
         return {'error': 'Unauthorized'}, 403
     return current_app.grading_queue.get_queue_stats()
+
+@admin_bp.route('/admin/regrade', methods=['POST'])
+@login_required
+def regrade():
+    """按题目 id 提交批量重评任务（question_ids 以逗号分隔）"""
+    if not current_user.is_admin:
+        return {'error': 'Unauthorized'}, 403
+    raw = request.form.get('question_ids', '')
+    try:
+        question_ids = [int(x) for x in raw.replace('，', ',').split(',') if x.strip()]
+        conflict = find_conflicting_job(question_ids)
+        if conflict:
+            return {'error': f'Questions overlap running regrade job #{conflict.id}', 'job': conflict.to_dict()}, 409
+        job = create_regrade_job(question_ids, created_by=current_user.id)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    try:
+        task_id = current_app.grading_queue.add_regrade(current_user.id, job.id)
+    except QueueFull as e:
+        return {'error': str(e), 'job': job.to_dict()}, 503, {'Retry-After': str(e.retry_after)}
+    return {'job': job.to_dict(), 'task_id': task_id}
+
+@admin_bp.route('/admin/import', methods=['POST'])
+@login_required
+def import_questions_file():
+    """批量导入题目文件（CSV / JSONL / questions.txt 格式），返回行级错误与吞吐量"""
+    if not current_user.is_admin:
+        return {'error': 'Unauthorized'}, 403
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return {'error': 'No file uploaded'}, 400
+    fmt = request.form.get('format') or detect_format(file.filename)
+    try:
+        batch_size = int(request.form.get('batch_size') or IMPORT_BATCH_SIZE)
+        report = import_questions(
+            file.stream, fmt,
+            default_category=request.form.get('category') or '默认题集',
+            batch_size=max(1, batch_size)
+        )
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if report.inserted:
+        bump_bank_version()
+        data_manager = getattr(current_app, 'data_manager', None)
+        if data_manager:
+            data_manager.schedule_export()
+    return report.to_dict()
+
+@admin_bp.route('/admin/regrade/<int:job_id>')
+@login_required
+def regrade_status(job_id):
+    if not current_user.is_admin:
+        return {'error': 'Unauthorized'}, 403
+    job = RegradeJob.query.get_or_404(job_id)
+    return job.to_dict()
+
+@admin_bp.route('/admin/regrade/<int:job_id>/resume', methods=['POST'])
+@login_required
+def regrade_resume(job_id):
+    """续跑失败或中断的重评任务（从已提交的游标继续）"""
+    if not current_user.is_admin:
+        return {'error': 'Unauthorized'}, 403
+    job = RegradeJob.query.get_or_404(job_id)
+    if not is_resumable(job):
+        return {'error': f'Job is {job.status}', 'job': job.to_dict()}, 409
+    conflict = find_conflicting_job(job.question_ids, exclude_id=job.id)
+    if conflict:
+        return {'error': f'Questions overlap running regrade job #{conflict.id}', 'job': job.to_dict()}, 409
+    try:
+        task_id = current_app.grading_queue.add_regrade(current_user.id, job.id)
+    except QueueFull as e:
+        return {'error': str(e), 'job': job.to_dict()}, 503, {'Retry-After': str(e.retry_after)}
+    return {'job': job.to_dict(), 'task_id': task_id}
@@ -1,11 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from web.extensions import db
 from web.models import User
-import random
+from web.services.exam_paper import create_exam_paper, get_open_paper, mark_submitted, paper_answers, paper_questions, remaining_seconds
+from web.utils.scheduler import QueueFull
 import io
 import csv
-from datetime import datetime
+import zlib
 
 
 
@@ -36,30 +37,30 @@ def batch_delete_history():
 @login_required
 def select_set():
     data_manager = getattr(current_app, 'data_manager', None)
-    questions = data_manager.load_questions() if data_manager else []
+    # 类别目录由一次 GROUP BY 得到并随题库版本缓存，无需加载全部题目
+    catalog = data_manager.get_category_catalog() if data_manager else []
     categories = {}
     category_types = {}
-    for q in questions:
-        cat = q.get('category', '默认题集')
-        categories[cat] = categories.get(cat, 0) + 1
-        if q.get('is_personal'):
-            category_types[cat] = 'personal'
-        else:
-            if cat not in category_types:
-                category_types[cat] = 'public'
+    category_owners = {}
+    for entry in catalog:
+        cat = entry['name']
+        categories[cat] = categories.get(cat, 0) + entry['count']
+        category_types[cat] = entry['type']
+        category_owners[cat] = entry['owner_id']
+    total_count = sum(categories.values())
     return render_template(
         'quiz/select_set.html',
         categories=categories,
-        total_count=len(questions),
+        total_count=total_count,
         category_types=category_types,
-        questions_empty=(len(questions)==0)
+        category_owners=category_owners,
+        questions_empty=(total_count==0)
     )
 
 @exam_bp.route('/start_exam')
 @login_required
 def start_exam():
     data_manager = getattr(current_app, 'data_manager', None)
-    questions = data_manager.load_questions() if data_manager else []
     # 仪表盘数据
     stats = data_manager.get_system_stats() if data_manager else None
     user_stats = None
@@ -76,84 +77,74 @@ def start_exam():
             'total_exams': ug_total_exams,
             'avg_accuracy': ug_accuracy
         }
-    return render_template('quiz/exam_home.html', questions_empty=(len(questions)==0), stats=stats, user_stats=user_stats)
+    questions_empty = not stats or stats['total_questions'] == 0
+    return render_template('quiz/exam_home.html', questions_empty=questions_empty, stats=stats, user_stats=user_stats)
 
 @exam_bp.route('/exam', methods=['GET', 'POST'])
 @login_required
 def exam():
     category = request.args.get('category')
-    
+    data_manager = getattr(current_app, 'data_manager', None)
+    bank = data_manager.load_questions() if data_manager else ()
+
     if request.method == 'GET' and not session.get('in_exam'):
         if not category:
             return redirect(url_for('exam.select_set'))
+        # 服务端抽题并保存试卷，会话中只保存试卷 id
+        paper = create_exam_paper(
+            bank, category, current_user.id,
+            per_category=current_app.config.get('EXAM_QUESTIONS_PER_CATEGORY', 0)
+        )
+        if not paper:
+            flash('该题集没有题目！', 'warning')
+            return redirect(url_for('exam.select_set'))
         session['in_exam'] = True
-        session['start_time'] = datetime.now().timestamp()
-        session['exam_category'] = category
+        session['exam_paper_id'] = paper.id
 
     if not session.get('in_exam'):
         return redirect(url_for('main.index'))
 
-    data_manager = getattr(current_app, 'data_manager', None)
-    all_questions = data_manager.load_questions() if data_manager else []
-    
-    current_category = session.get('exam_category', 'all')
-    if current_category != 'all':
-        filtered_ids = [q['id'] for q in all_questions if q.get('category', '默认题集') == current_category]
-    else:
-        # 综合测试：包含所有公共题目和当前用户的个人题目
-        filtered_ids = []
-        for q in all_questions:
-            if not q.get('is_personal'):
-                filtered_ids.append(q['id'])
-            else:
-                # 个人题目需属于当前用户
-                owned = getattr(current_user, 'owned_categories', None)
-                cat = q.get('category', '默认题集')
-                if owned and cat in owned:
-                    filtered_ids.append(q['id'])
-
-    if not filtered_ids:
+    paper = get_open_paper(session.get('exam_paper_id'), current_user.id)
+    if not paper:
         session.pop('in_exam', None)
-        flash('该题集没有题目！', 'warning')
+        session.pop('exam_paper_id', None)
+        flash('试卷不存在或已提交，请重新选择题集', 'warning')
         return redirect(url_for('exam.select_set'))
 
     if request.method == 'GET':
-        random.shuffle(filtered_ids)
-        session['exam_ids'] = filtered_ids
-        
-        shuffled_questions = [q for q in all_questions if q['id'] in filtered_ids]
-        shuffled_questions.sort(key=lambda x: filtered_ids.index(x['id']))
-        
-        start_time = session.get('start_time', datetime.now().timestamp())
-        # Dynamic duration: 5 minutes per question
-        duration_sec = len(filtered_ids) * 5 * 60
-        elapsed = datetime.now().timestamp() - start_time
-        remaining_sec = max(0, int(duration_sec - elapsed))
-        
-        return render_template('quiz/exam.html', questions=shuffled_questions, remaining_sec=remaining_sec)
+        return render_template('quiz/exam.html', questions=paper_questions(paper, bank), remaining_sec=remaining_seconds(paper))
 
     if request.method == 'POST':
-        ids = session.get('exam_ids')
-        if not ids:
-             return redirect(url_for('main.index'))
-             
-        user_answers = {}
-        for i, q_id in enumerate(ids):
-             user_answers[str(i)] = request.form.get(f'q_{i}', '')
+        # 表单序号对应试卷中的固定位置（paper.question_ids），考试期间删除题目不会导致答案错位
+        ids, user_answers = paper_answers(paper, request.form)
         
+        # 按生成试卷时的题库快照版本评分，任务只携带题目 id、答案与快照版本
         exam_data = {
             'ids': ids,
             'user_answers': user_answers,
-            'all_questions': all_questions,
-            'category': current_category
+            'bank_version': paper.bank_version,
+            'category': paper.category
         }
         
         # Access grading_queue via current_app.extensions if available, or just check 'grading_queue' attr
         # We will assume it's attached to current_app
-        task_id = current_app.grading_queue.add_task(current_user.id, exam_data)
+        try:
+            task_id = current_app.grading_queue.add_task(current_user.id, exam_data)
+        except QueueFull as e:
+            # 评分队列已满：保留考试状态并回填答案，提示稍后重新提交
+            # （提示直接渲染在页面中，不写入 session 的 flash，过载时少一次会话存储写入）
+            html = render_template(
+                'quiz/exam.html',
+                questions=paper_questions(paper, bank),
+                remaining_sec=remaining_seconds(paper),
+                answers=request.form,
+                error_message=f'当前提交人数过多，请在 {e.retry_after} 秒后重新提交'
+            )
+            return html, 503, {'Retry-After': str(e.retry_after)}
 
+        mark_submitted(paper)
         session.pop('in_exam', None)
-        session.pop('exam_ids', None)
+        session.pop('exam_paper_id', None)
         
         return redirect(url_for('exam.waiting', task_id=task_id))
     
@@ -178,22 +169,20 @@ def queue_status(task_id):
 def history():
     user_id = None if current_user.is_admin else current_user.id
     data_manager = getattr(current_app, 'data_manager', None)
-    results = data_manager.load_results(user_id=user_id) if data_manager else []
-    results.sort(key=lambda x: x['timestamp'], reverse=True)
-    
     q = request.args.get('q', '').strip()
-    if q:
-        q_lower = q.lower()
-        results = [r for r in results if q_lower in str(r.get('username', '')).lower() or q_lower in str(r.get('timestamp', '')).lower()]
-        start_time = request.args.get('start_time', '').strip()
-        end_time = request.args.get('end_time', '').strip()
-        if start_time:
-            results = [r for r in results if r.get('timestamp', '') >= start_time]
-        if end_time:
-            results = [r for r in results if r.get('timestamp', '') <= end_time]
-        return render_template('quiz/history.html', results=results, search_query=q, start_time=start_time, end_time=end_time)
-        
-    return render_template('quiz/history.html', results=results, search_query=q)
+    start_time = request.args.get('start_time', '').strip()
+    end_time = request.args.get('end_time', '').strip()
+    category = request.args.get('category', '').strip()
+    cursor = request.args.get('cursor')
+    results, next_cursor = data_manager.query_history(
+        user_id=user_id, search=q, start_date=start_time, end_date=end_time,
+        category=category, cursor=cursor
+    ) if data_manager else ([], None)
+    categories = data_manager.get_categories() if data_manager else []
+    return render_template(
+        'quiz/history.html', results=results, search_query=q, start_time=start_time, end_time=end_time,
+        current_category=category, categories=categories, cursor=cursor, next_cursor=next_cursor
+    )
 
 @exam_bp.route('/history/view/<result_id>')
 @login_required
@@ -213,26 +202,57 @@ def view_history(result_id):
 @exam_bp.route('/export_history')
 @login_required
 def export_history():
+    """流式导出历史记录 CSV（筛选条件与历史页面相同），gzip=1 时输出 gzip 压缩文件"""
     user_id = None if current_user.is_admin else current_user.id
-    results = data_manager.load_results(user_id=user_id)
-    results.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['用户', '时间', '得分', '满分', '得分率'])
-    
-    for r in results:
-        score = r.get('total_score', 0)
-        max_s = r.get('max_score', 0)
-        percentage = f"{(score / max_s * 100):.1f}%" if max_s > 0 else "0.0%"
-        username = r.get('username', 'Unknown')
-        writer.writerow([username, r['timestamp'], score, max_s, percentage])
-        
-    output.seek(0)
-    
+    data_manager = getattr(current_app, 'data_manager', None)
+    if not data_manager:
+        return redirect(url_for('exam.history'))
+    rows = data_manager.iter_history_rows(
+        user_id=user_id,
+        search=request.args.get('q', '').strip(),
+        start_date=request.args.get('start_time', '').strip(),
+        end_date=request.args.get('end_time', '').strip(),
+        category=request.args.get('category', '').strip()
+    )
+    compress = request.args.get('gzip') == '1'
+
+    def generate_csv():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['用户', '时间', '类型', '得分', '满分', '得分率'])
+        for i, r in enumerate(rows, 1):
+            score = r.total_score or 0
+            max_s = r.max_score or 0
+            percentage = f"{(score / max_s * 100):.1f}%" if max_s > 0 else "0.0%"
+            writer.writerow([r.username or 'Unknown', r.timestamp, r.category or '默认题集', score, max_s, percentage])
+            # 每 500 行输出一次，避免逐行产生过多小块
+            if i % 500 == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
+
+    def generate_bytes():
+        yield '\ufeff'.encode('utf-8')  # BOM，便于 Excel 识别 UTF-8
+        for chunk in generate_csv():
+            yield chunk.encode('utf-8')
+
+    def generate_gzip():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+        for chunk in generate_bytes():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    if compress:
+        return Response(
+            stream_with_context(generate_gzip()),
+            mimetype='application/gzip',
+            headers={"Content-Disposition": "attachment;filename=exam_history.csv.gz"}
+        )
     return Response(
-        output.getvalue().encode('utf-8-sig'),
+        stream_with_context(generate_bytes()),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment;filename=exam_history.csv"}
     )
@@ -240,6 +260,9 @@ def export_history():
 @exam_bp.route('/history/delete/<result_id>', methods=['POST'])
 @login_required
 def delete_history(result_id):
+    data_manager = getattr(current_app, 'data_manager', None)
+    if not data_manager:
+        return redirect(url_for('exam.history'))
     record = data_manager.get_result(result_id)
     if not record:
         flash('记录未找到', 'error')
@@ -3,6 +3,10 @@
 import gevent.monkey
 gevent.monkey.patch_all(ssl=True, aggressive=True)
 
+import os
+# 标记为 Celery worker 进程：GradingQueue 不做 Celery 探测，也不启动本地评分
+os.environ.setdefault('GRADING_ROLE', 'celery_worker')
+
 from web import create_app
 from web.celery_utils import make_celery
 
@@ -10,3 +14,27 @@ app = create_app()
 celery = make_celery(app)
 
 import web.tasks
+from celery import signals
+
+# 资源预热：worker_init 在开始消费队列之前执行（gevent / solo 池在主进程内执行任务），
+# prefork 子进程在 worker_process_init 中丢弃继承的连接并重新预热
+@signals.worker_init.connect(weak=False)
+def warm_up_worker(**kwargs):
+    web.tasks.resources.warm_up()
+
+@signals.worker_process_init.connect(weak=False)
+def warm_up_worker_process(**kwargs):
+    # prefork 子进程一次只执行一个任务，批量落库无结果可合并
+    from web.services.result_batcher import disable_result_batcher
+    disable_result_batcher('prefork pool runs one task per process')
+    web.tasks.resources.reset()
+    web.tasks.resources.warm_up()
+
+# 心跳：定时把本 worker 的队列深度、活跃数和耗时样本写入 Redis（ready 字段表示资源已预热）
+from web.extensions import cache_redis
+from web.utils.queue_stats import install_worker_stats
+install_worker_stats(
+    celery, cache_redis,
+    emitter_factory=web.tasks.get_socket_emitter,
+    ready_check=lambda: web.tasks.resources.ready
+)
@@ -127,12 +127,44 @@ class Config:
 
     # Exam Settings
     EXAM_DURATION_MINUTES = 60  # 考试时长（分钟）
+    EXAM_QUESTIONS_PER_CATEGORY = int(os.environ.get('EXAM_QUESTIONS_PER_CATEGORY', 0))  # 每个类别抽题数，0 表示全部
 
     # Grading Queue Config
     # 建议范围：CPU核心数 ~ 2倍CPU核心数
     # 对于 I/O 密集型（数据库读写多），可以设大一点；对于 CPU 密集型（计算多），设为核心数即可。
     # 默认自动设置为 CPU 核心数，最小为 2
     GRADING_WORKERS = max(2, os.cpu_count() or 4)
+    # Celery 不可用时的本地评分模式：process 为多进程评分（绕开 GIL，超时可强制终止），thread 为线程评分
+    # 打包的 exe 默认使用 thread，避免 spawn 子进程重新执行入口。
+    # 进程池只在 Celery 不可用、首次回退到本地评分时启动，Celery 恢复后释放，平时不占用 CPU 和内存
+    GRADING_LOCAL_MODE = os.environ.get('GRADING_LOCAL_MODE', 'thread' if getattr(sys, 'frozen', False) else 'process')
+    # 进程模式下的评分进程数，默认为 CPU 核心数且不超过 4（每个 web 进程各自启动一组）
+    GRADING_PROCESSES = int(os.environ.get('GRADING_PROCESSES', 0)) or min(4, os.cpu_count() or 2)
+    GRADING_TIMEOUT = 30  # 单份试卷评分超时（秒）
+    # 本地评分队列容量：超出后新提交返回 503 + Retry-After，而不是丢弃任务
+    GRADING_QUEUE_CAPACITY = int(os.environ.get('GRADING_QUEUE_CAPACITY', 1000))
+    # 考试结果微批量落库（可选）：收集 RESULT_BATCH_WINDOW 秒内最多 RESULT_BATCH_SIZE 份结果，一个事务写入
+    # 只对同一进程内并发执行的评分有效（本地线程 / 进程模式、Celery gevent / threads 池）；
+    # Celery prefork 池每个子进程一次只跑一个任务，子进程中自动关闭
+    RESULT_BATCH_ENABLED = os.environ.get('RESULT_BATCH_ENABLED', '0') == '1'
+    RESULT_BATCH_SIZE = int(os.environ.get('RESULT_BATCH_SIZE', 50))
+    RESULT_BATCH_WINDOW = float(os.environ.get('RESULT_BATCH_WINDOW', 0.2))
+    # questions.txt 后台导出：最后一次题目变更后静默 QUESTION_EXPORT_DELAY 秒导出，持续变更时最多延迟 QUESTION_EXPORT_MAX_DELAY 秒
+    QUESTION_EXPORT_DELAY = float(os.environ.get('QUESTION_EXPORT_DELAY', 2.0))
+    QUESTION_EXPORT_MAX_DELAY = float(os.environ.get('QUESTION_EXPORT_MAX_DELAY', 10.0))
+    # 全局计数器校准周期（秒），0 表示不在后台校准
+    COUNTER_RECONCILE_INTERVAL = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', 3600))
+    # 进程角色：web（分发评分任务）/ celery_worker（由 celery_worker.py 设置）
+    GRADING_ROLE = os.environ.get('GRADING_ROLE', 'web')
+    # Celery 可用性后台探测间隔与 ping 超时（秒），分发时按探测结果在 Celery 与本地评分之间切换
+    CELERY_HEALTH_INTERVAL = int(os.environ.get('CELERY_HEALTH_INTERVAL', 10))
+    CELERY_HEALTH_TIMEOUT = 1.0
+    # Celery worker 向 Redis 上报队列心跳的间隔（秒），队列统计直接读取心跳聚合值
+    GRADING_STATS_INTERVAL = int(os.environ.get('GRADING_STATS_INTERVAL', 5))
+    # 评分缓存：(题目版本, 标准化答案) -> 得分，进程内 LRU + 可选 Redis 共享层
+    SCORE_CACHE_SIZE = int(os.environ.get('SCORE_CACHE_SIZE', 50000))
+    SCORE_CACHE_REDIS = os.environ.get('SCORE_CACHE_REDIS', '1') != '0'
+    SCORE_CACHE_TTL = 24 * 3600
 
     # Redis Config
     REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
@@ -39,7 +39,11 @@ def handle_disconnect():
 
 @socketio.on('join')
 def handle_join(data):
+    from flask_login import current_user
     room = data.get('room')
+    if room and str(room).startswith('admin:') and not (current_user.is_authenticated and current_user.is_admin):
+        print(f"[SocketIO] Client {request.sid} denied admin room: {room}")
+        return
     print(f"[SocketIO] Client {request.sid} join room: {room}")
     socketio.enter_room(request.sid, room)
 
@@ -0,0 +1,43 @@
+"""add regrade_job
+
+Revision ID: a3f1c2d9b7e4
+Revises: d4430e897553
+Create Date: 2026-10-17 10:12:40.512233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c2d9b7e4'
+down_revision = 'd4430e897553'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('regrade_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('question_ids_json', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('cursor', sa.String(length=36), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('processed', sa.Integer(), nullable=True),
+        sa.Column('changed', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'], name='fk_regradejob_created_by'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('regrade_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_regrade_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('regrade_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_regrade_job_status'))
+
+    op.drop_table('regrade_job')
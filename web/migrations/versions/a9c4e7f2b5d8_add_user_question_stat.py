@@ -0,0 +1,41 @@
+"""add user_question_stat
+
+Revision ID: a9c4e7f2b5d8
+Revises: f4b8c1d6e3a7
+Create Date: 2026-10-17 17:20:56.731048
+
+已有数据由 flask rebuild-question-stats 根据 exam_answer 重建。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e7f2b5d8'
+down_revision = 'f4b8c1d6e3a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_question_stat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('question', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('wrong', sa.Integer(), nullable=True),
+        sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_userquestionstat_user_id'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'question_id', name='uniq_user_question_stat')
+    )
+    with op.batch_alter_table('user_question_stat', schema=None) as batch_op:
+        batch_op.create_index('ix_user_question_stat_user_wrong', ['user_id', 'wrong'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_question_stat', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_question_stat_user_wrong')
+
+    op.drop_table('user_question_stat')
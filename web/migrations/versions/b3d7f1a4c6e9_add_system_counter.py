@@ -0,0 +1,46 @@
+"""add system_counter
+
+Revision ID: b3d7f1a4c6e9
+Revises: a9c4e7f2b5d8
+Create Date: 2026-10-17 17:58:41.226395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d7f1a4c6e9'
+down_revision = 'a9c4e7f2b5d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('system_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # 用现有数据初始化计数器
+    op.execute(
+        "INSERT INTO system_counter (name, value, updated_at) "
+        "SELECT 'questions', COUNT(*), CURRENT_TIMESTAMP FROM question"
+    )
+    op.execute(
+        "INSERT INTO system_counter (name, value, updated_at) "
+        "SELECT 'exams', COUNT(*), CURRENT_TIMESTAMP FROM exam_result"
+    )
+    op.execute(
+        "INSERT INTO system_counter (name, value, updated_at) "
+        "SELECT 'score_sum', COALESCE(SUM(total_score), 0), CURRENT_TIMESTAMP FROM exam_result"
+    )
+    op.execute(
+        "INSERT INTO system_counter (name, value, updated_at) "
+        "SELECT 'max_score_sum', COALESCE(SUM(max_score), 0), CURRENT_TIMESTAMP FROM exam_result"
+    )
+
+
+def downgrade():
+    op.drop_table('system_counter')
@@ -0,0 +1,42 @@
+"""unique (user_id, category) on user_category_stat
+
+Revision ID: b81e5f0c2a6d
+Revises: a3f1c2d9b7e4
+Create Date: 2026-10-17 11:03:18.904517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e5f0c2a6d'
+down_revision = 'a3f1c2d9b7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 合并历史上并发写入产生的重复统计行：累加到 id 最小的一行，再删除其余行
+    conn = op.get_bind()
+    duplicates = conn.execute(sa.text(
+        "SELECT user_id, category, MIN(id), SUM(COALESCE(total_attempts, 0)), "
+        "SUM(COALESCE(total_score, 0)), SUM(COALESCE(total_max_score, 0)) "
+        "FROM user_category_stat GROUP BY user_id, category HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, category, keep_id, attempts, score, max_score in duplicates:
+        conn.execute(sa.text(
+            "UPDATE user_category_stat SET total_attempts = :attempts, total_score = :score, "
+            "total_max_score = :max_score WHERE id = :keep_id"
+        ), {'attempts': attempts, 'score': score, 'max_score': max_score, 'keep_id': keep_id})
+        conn.execute(sa.text(
+            "DELETE FROM user_category_stat WHERE user_id = :user_id AND category = :category AND id != :keep_id"
+        ), {'user_id': user_id, 'category': category, 'keep_id': keep_id})
+
+    with op.batch_alter_table('user_category_stat', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uniq_user_category_stat', ['user_id', 'category'])
+
+
+def downgrade():
+    with op.batch_alter_table('user_category_stat', schema=None) as batch_op:
+        batch_op.drop_constraint('uniq_user_category_stat', type_='unique')
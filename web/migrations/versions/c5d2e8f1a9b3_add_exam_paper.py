@@ -0,0 +1,40 @@
+"""add exam_paper
+
+Revision ID: c5d2e8f1a9b3
+Revises: b81e5f0c2a6d
+Create Date: 2026-10-17 14:21:07.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8f1a9b3'
+down_revision = 'b81e5f0c2a6d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exam_paper',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=100), nullable=True),
+        sa.Column('question_ids_json', sa.Text(), nullable=False),
+        sa.Column('bank_version', sa.String(length=64), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('submitted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_exampaper_user_id'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('exam_paper', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_exam_paper_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exam_paper', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_exam_paper_user_id'))
+
+    op.drop_table('exam_paper')
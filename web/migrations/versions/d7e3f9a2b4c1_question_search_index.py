@@ -0,0 +1,53 @@
+"""question search index (pg_trgm / sqlite fts5)
+
+Revision ID: d7e3f9a2b4c1
+Revises: c5d2e8f1a9b3
+Create Date: 2026-10-17 15:02:44.107365
+
+"""
+import sqlite3
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3f9a2b4c1'
+down_revision = 'c5d2e8f1a9b3'
+branch_labels = None
+depends_on = None
+
+PG_INDEX_NAME = 'ix_question_search_trgm'
+PG_SEARCH_EXPR = "(question.content || ' ' || question.answer || ' ' || coalesce(question.category, ''))"
+FTS_TABLE = 'question_fts'
+SQLITE_FTS_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5(content, answer, category, content='question', content_rowid='id', tokenize='trigram')",
+    'CREATE TRIGGER IF NOT EXISTS question_fts_ai AFTER INSERT ON question BEGIN INSERT INTO question_fts(rowid, content, answer, category) VALUES (new.id, new.content, new.answer, new.category); END',
+    "CREATE TRIGGER IF NOT EXISTS question_fts_ad AFTER DELETE ON question BEGIN INSERT INTO question_fts(question_fts, rowid, content, answer, category) VALUES ('delete', old.id, old.content, old.answer, old.category); END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_au AFTER UPDATE ON question BEGIN INSERT INTO question_fts(question_fts, rowid, content, answer, category) VALUES ('delete', old.id, old.content, old.answer, old.category); INSERT INTO question_fts(rowid, content, answer, category) VALUES (new.id, new.content, new.answer, new.category); END",
+    "INSERT INTO question_fts(question_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON question USING gin ({PG_SEARCH_EXPR} gin_trgm_ops)')
+    elif dialect == 'sqlite':
+        # trigram 分词器需要 SQLite 3.34+，更低版本继续使用 LIKE 搜索
+        if sqlite3.sqlite_version_info < (3, 34, 0):
+            print(f"[Migration] SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram，跳过搜索索引")
+            return
+        for statement in SQLITE_FTS_STATEMENTS:
+            op.execute(sa.text(statement))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(f'DROP INDEX IF EXISTS {PG_INDEX_NAME}')
+    elif dialect == 'sqlite':
+        for trigger in ('question_fts_ai', 'question_fts_ad', 'question_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
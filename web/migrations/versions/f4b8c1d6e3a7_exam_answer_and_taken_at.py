@@ -0,0 +1,60 @@
+"""exam_answer child table and exam_result.taken_at with history indexes
+
+Revision ID: f4b8c1d6e3a7
+Revises: d7e3f9a2b4c1
+Create Date: 2026-10-17 16:38:12.904271
+
+历史记录按 (taken_at, id) 游标分页，索引直接建在 taken_at 上（不再先建再删基于 timestamp 字符串的索引）。
+逐题详情从 exam_result.details_json 拆到 exam_answer、以及旧记录的 taken_at，
+都由应用在线分批回填（每批单独提交，可中断后重跑）：
+    flask backfill-exam-answers
+本迁移只做表结构变更，不在迁移事务中更新整张 exam_result 表（Alembic 的迁移在单个事务中执行，
+大表上会长时间持有行锁）。回填完成前旧记录仍可通过 details_json 读取，taken_at 为空的记录在历史页排在最后。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8c1d6e3a7'
+down_revision = 'd7e3f9a2b4c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exam_answer',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('result_id', sa.String(length=36), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=True),
+        sa.Column('question_id', sa.Integer(), nullable=True),
+        sa.Column('category', sa.String(length=100), nullable=True),
+        sa.Column('question', sa.Text(), nullable=True),
+        sa.Column('user_ans', sa.Text(), nullable=True),
+        sa.Column('correct_ans', sa.String(length=500), nullable=True),
+        sa.Column('score', sa.Integer(), nullable=True),
+        sa.Column('full_score', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['result_id'], ['exam_result.id'], name='fk_examanswer_result_id', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('exam_answer', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_exam_answer_result_id'), ['result_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_exam_answer_question_id'), ['question_id'], unique=False)
+
+    with op.batch_alter_table('exam_result', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('taken_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_exam_result_taken_at_id', ['taken_at', 'id'], unique=False)
+        batch_op.create_index('ix_exam_result_user_taken_at', ['user_id', 'taken_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exam_result', schema=None) as batch_op:
+        batch_op.drop_index('ix_exam_result_user_taken_at')
+        batch_op.drop_index('ix_exam_result_taken_at_id')
+        batch_op.drop_column('taken_at')
+
+    with op.batch_alter_table('exam_answer', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_exam_answer_question_id'))
+        batch_op.drop_index(batch_op.f('ix_exam_answer_result_id'))
+
+    op.drop_table('exam_answer')
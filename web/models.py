@@ -101,7 +101,10 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
     @property
     def level_info(self):
-        points = self.stardust
+        return User.level_for(self.stardust)
+    @staticmethod
+    def level_for(points):
+        points = points or 0
         if points >= 20000: return '星云', 'text-promethium'
         if points >= 15000: return '超新星', 'text-danger'
         if points >= 10000: return '白矮星', 'text-white-50'
@@ -150,20 +153,32 @@ class Question(db.Model):
         }
 
 class ExamResult(db.Model):
+    # 历史记录按 (taken_at, id) 游标分页；普通用户只看自己的记录
+    __table_args__ = (
+        db.Index('ix_exam_result_taken_at_id', 'taken_at', 'id'),
+        db.Index('ix_exam_result_user_taken_at', 'user_id', 'taken_at'),
+    )
     id = db.Column(db.String(36), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_examresult_user_id'), nullable=True)
     user = db.relationship('User', backref=db.backref('results', lazy=True))
-    timestamp = db.Column(db.String(50), default=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    timestamp = db.Column(db.String(50), default=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))  # 展示用，排序与筛选使用 taken_at
+    taken_at = db.Column(db.DateTime, nullable=True)
     total_score = db.Column(db.Integer, default=0)
     max_score = db.Column(db.Integer, default=0)
+    # 旧版逐题详情 JSON；新记录写入 ExamAnswer，回填完成的旧记录置空
     details_json = db.Column(db.Text, nullable=True)
     category = db.Column(db.String(100), default='默认题集')
+    answers = db.relationship('ExamAnswer', backref='result', lazy=True, order_by='ExamAnswer.position',
+                              cascade='all, delete-orphan')
     @property
     def details(self):
-        return json.loads(self.details_json) if self.details_json else []
+        if self.details_json:
+            return json.loads(self.details_json)
+        return [a.to_dict() for a in self.answers]
     @details.setter
     def details(self, value):
-        self.details_json = json.dumps(value, ensure_ascii=False)
+        self.details_json = None
+        self.answers = [ExamAnswer.from_detail(d, i) for i, d in enumerate(value) if isinstance(d, dict)]
     def to_dict(self):
         return {
             'id': self.id,
@@ -177,6 +192,67 @@ class ExamResult(db.Model):
             'category': self.category or '默认题集'
         }
 
+# 服务端生成的试卷：记录抽中的题目顺序与题库快照版本，会话中只保存试卷 id
+class ExamPaper(db.Model):
+    __tablename__ = 'exam_paper'
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_exampaper_user_id'), nullable=False, index=True)
+    category = db.Column(db.String(100), default='all')
+    question_ids_json = db.Column(db.Text, nullable=False)
+    bank_version = db.Column(db.String(64), nullable=True)  # 生成试卷时的题库快照版本，评分按此版本进行
+    status = db.Column(db.String(20), default='open')  # open/submitted
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    @property
+    def question_ids(self):
+        return json.loads(self.question_ids_json) if self.question_ids_json else []
+    @question_ids.setter
+    def question_ids(self, value):
+        self.question_ids_json = json.dumps([int(v) for v in value])
+
+# 考试结果的逐题作答记录（替代 ExamResult.details_json），便于按题目在 SQL 中统计与重评
+class ExamAnswer(db.Model):
+    __tablename__ = 'exam_answer'
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.String(36), db.ForeignKey('exam_result.id', name='fk_examanswer_result_id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, default=0)
+    question_id = db.Column(db.Integer, nullable=True, index=True)  # 题目删除后保留作答记录，不设外键
+    category = db.Column(db.String(100), default='默认题集')
+    question = db.Column(db.Text, nullable=True)  # 作答时的题干
+    user_ans = db.Column(db.Text, nullable=True)
+    correct_ans = db.Column(db.String(500), nullable=True)
+    score = db.Column(db.Integer, default=0)
+    full_score = db.Column(db.Integer, default=0)
+    @staticmethod
+    def mapping(detail, position, result_id=None):
+        """评分详情字典 -> 列值字典（bulk_insert_mappings 与 from_detail 共用）"""
+        return {
+            'result_id': result_id,
+            'position': position,
+            'question_id': detail.get('id'),
+            'category': detail.get('category') or '默认题集',
+            'question': detail.get('question'),
+            'user_ans': detail.get('user_ans'),
+            'correct_ans': detail.get('correct_ans'),
+            'score': detail.get('score', 0),
+            'full_score': detail.get('full_score', 0)
+        }
+    @classmethod
+    def from_detail(cls, detail, position):
+        values = cls.mapping(detail, position)
+        values.pop('result_id')
+        return cls(**values)
+    def to_dict(self):
+        return {
+            'id': self.question_id,
+            'category': self.category,
+            'question': self.question,
+            'user_ans': self.user_ans,
+            'correct_ans': self.correct_ans,
+            'score': self.score,
+            'full_score': self.full_score
+        }
+
 class UserCategoryStat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_usercategorystat_user_id'), nullable=False)
@@ -185,6 +261,56 @@ class UserCategoryStat(db.Model):
     total_score = db.Column(db.Integer, default=0)
     total_max_score = db.Column(db.Integer, default=0)
     user = db.relationship('User', backref=db.backref('category_stats', lazy=True))
+    # 每个用户每个类别只有一行统计，评分落库时按该键 upsert
+    __table_args__ = (db.UniqueConstraint('user_id', 'category', name='uniq_user_category_stat'),)
+
+# 题目答案/分值修改后的批量重评任务（按 ExamResult.id 游标分块处理，可断点续跑）
+class RegradeJob(db.Model):
+    __tablename__ = 'regrade_job'
+    id = db.Column(db.Integer, primary_key=True)
+    question_ids_json = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending/running/done/failed
+    cursor = db.Column(db.String(36), nullable=True)  # 最后一个已处理的 ExamResult.id
+    total = db.Column(db.Integer, default=0)  # 预估需要检查的考试记录数
+    processed = db.Column(db.Integer, default=0)
+    changed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_regradejob_created_by'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    @property
+    def question_ids(self):
+        return json.loads(self.question_ids_json) if self.question_ids_json else []
+    @question_ids.setter
+    def question_ids(self, value):
+        self.question_ids_json = json.dumps(sorted(set(int(v) for v in value)))
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'question_ids': self.question_ids,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'changed': self.changed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# 按用户、按题目的作答 / 错误次数，评分落库时增量更新（仪表盘错题排行直接读取）
+class UserQuestionStat(db.Model):
+    __tablename__ = 'user_question_stat'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'question_id', name='uniq_user_question_stat'),
+        db.Index('ix_user_question_stat_user_wrong', 'user_id', 'wrong'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_userquestionstat_user_id'), nullable=False)
+    question_id = db.Column(db.Integer, nullable=False)
+    question = db.Column(db.Text, nullable=True)  # 最近一次作答时的题干（图表标签）
+    attempts = db.Column(db.Integer, default=0)
+    wrong = db.Column(db.Integer, default=0)
+    last_attempt_at = db.Column(db.DateTime, nullable=True)
 
 class UserPermission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -192,6 +318,13 @@ class UserPermission(db.Model):
     category = db.Column(db.String(100), nullable=False)
     user = db.relationship('User', backref=db.backref('permissions', lazy=True))
 
+# 全局计数器（题目数、考试数、得分总和等），随数据写入原子增减，定期按真实数据校准
+class SystemCounter(db.Model):
+    __tablename__ = 'system_counter'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class SystemSetting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.Text, nullable=True)
@@ -0,0 +1,89 @@
+import json
+from datetime import datetime
+
+from web.extensions import db
+from web.models import ExamAnswer, ExamResult
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+BACKFILL_BATCH_SIZE = 500
+
+
+def parse_timestamp(value):
+    """ExamResult.timestamp 字符串 -> datetime；无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def convert_legacy_results(rows):
+    """
+    把旧记录的 details_json 拆成 ExamAnswer 行，并置空 details_json、补齐 taken_at（调用方负责提交）。
+    rows: [(id, details_json, timestamp), ...]。
+    以 details_json 非空为条件逐行更新，并发回填同一记录时只有一方会写入作答行。
+    返回实际转换的记录数。
+    """
+    answers = []
+    converted = 0
+    for result_id, details_json, timestamp in rows:
+        updated = ExamResult.query.filter(
+            ExamResult.id == result_id, ExamResult.details_json.isnot(None)
+        ).update({
+            ExamResult.details_json: None,
+            ExamResult.taken_at: db.func.coalesce(ExamResult.taken_at, parse_timestamp(timestamp))
+        }, synchronize_session=False)
+        if not updated:
+            continue
+        converted += 1
+        try:
+            details = json.loads(details_json) if details_json else []
+        except ValueError:
+            print(f"[Backfill] Unreadable details for result {result_id}, stored without answers")
+            details = []
+        answers.extend(
+            ExamAnswer.mapping(d, i, result_id) for i, d in enumerate(details) if isinstance(d, dict)
+        )
+    if answers:
+        db.session.bulk_insert_mappings(ExamAnswer, answers)
+    return converted
+
+
+def backfill_exam_answers(batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    """
+    在线分批回填：按 ExamResult.id 顺序处理仍带 details_json 或缺少 taken_at 的记录，
+    每批单独提交，可随时中断后重新执行。progress(已处理, 已转换) 在每批提交后回调。
+    """
+    cursor = None
+    processed = 0
+    converted = 0
+    while True:
+        query = db.session.query(ExamResult.id, ExamResult.details_json, ExamResult.timestamp).filter(
+            db.or_(ExamResult.details_json.isnot(None), ExamResult.taken_at.is_(None))
+        )
+        if cursor:
+            query = query.filter(ExamResult.id > cursor)
+        rows = query.order_by(ExamResult.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        legacy = [(r.id, r.details_json, r.timestamp) for r in rows if r.details_json is not None]
+        converted += convert_legacy_results(legacy)
+        # 已无 details_json 但缺少 taken_at 的记录只补时间
+        for r in rows:
+            if r.details_json is None:
+                taken_at = parse_timestamp(r.timestamp)
+                if taken_at:
+                    ExamResult.query.filter(ExamResult.id == r.id, ExamResult.taken_at.is_(None)).update(
+                        {ExamResult.taken_at: taken_at}, synchronize_session=False
+                    )
+        db.session.commit()
+
+        cursor = rows[-1].id
+        processed += len(rows)
+        if progress:
+            progress(processed, converted)
+
+    print(f"[Backfill] Done: {processed} results checked, {converted} converted to exam_answer rows")
+    return processed, converted
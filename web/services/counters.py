@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from web.extensions import db
+from web.models import ExamResult, Question, SystemCounter
+
+# 全局计数器：与数据写入在同一事务中原子增减，仪表盘直接读取，不再扫描考试记录表
+# 所有写入都按名称排序后的固定顺序更新计数器行，避免不同事务交叉加锁造成死锁
+COUNTERS = ('exams', 'max_score_sum', 'questions', 'score_sum')
+RECONCILE_LOCK_KEY = 'counters:reconcile_lock'  # 多进程部署时同一周期只由一个进程校准
+
+
+def increment(**deltas):
+    """
+    累加计数器（不提交，由调用方与数据写入一起提交）：
+    UPDATE system_counter SET value = value + :delta，并发写入不会互相覆盖。
+    计数器行不存在时什么也不做，下次读取或校准时会重新计算。
+    """
+    for name in sorted(deltas):
+        delta = deltas[name]
+        if delta:
+            SystemCounter.query.filter_by(name=name).update(
+                {SystemCounter.value: SystemCounter.value + delta}, synchronize_session=False
+            )
+
+
+def read_counters():
+    """读取全部计数器（单次主键查询）；缺少计数器行时先校准"""
+    values = dict(db.session.query(SystemCounter.name, SystemCounter.value).filter(SystemCounter.name.in_(COUNTERS)).all())
+    if len(values) < len(COUNTERS):
+        try:
+            return reconcile()
+        except IntegrityError:
+            # 其他进程同时初始化了计数器行
+            db.session.rollback()
+            values = dict(db.session.query(SystemCounter.name, SystemCounter.value).filter(SystemCounter.name.in_(COUNTERS)).all())
+    return values
+
+
+def _snapshot():
+    """
+    在同一条 SELECT 中读取真实统计值与当前计数器值（同一快照，不加锁）：
+    返回 ({名称: 真实值}, {名称: 计数器值 或 None})
+    """
+    def stored(name):
+        return db.session.query(SystemCounter.value).filter(SystemCounter.name == name).scalar_subquery()
+
+    aggregates = {
+        'exams': db.session.query(func.count(ExamResult.id)).scalar_subquery(),
+        'max_score_sum': db.session.query(func.sum(ExamResult.max_score)).scalar_subquery(),
+        'questions': db.session.query(func.count(Question.id)).scalar_subquery(),
+        'score_sum': db.session.query(func.sum(ExamResult.total_score)).scalar_subquery(),
+    }
+    row = db.session.query(*[aggregates[name] for name in COUNTERS], *[stored(name) for name in COUNTERS]).one()
+    # SUM 在 PostgreSQL 上返回 Decimal，统一转为 int
+    actual = {name: int(value or 0) for name, value in zip(COUNTERS, row[:len(COUNTERS)])}
+    current = {name: (None if value is None else int(value)) for name, value in zip(COUNTERS, row[len(COUNTERS):])}
+    return actual, current
+
+
+def reconcile():
+    """
+    按真实数据校准计数器，返回最新的真实值；与计数器不一致时打印偏差。
+    全表统计不加锁执行，之后只用一个短事务按固定顺序把偏差累加回计数器行：
+    统计期间提交的考试记录已同时累加过计数器，按偏差修正不会覆盖这些增量，也不会阻塞评分提交。
+    """
+    actual, current = _snapshot()
+    db.session.commit()  # 结束只读事务，统计期间不持有任何锁
+
+    now = datetime.utcnow()
+    for name in COUNTERS:
+        if current[name] is None:
+            db.session.add(SystemCounter(name=name, value=actual[name], updated_at=now))
+            continue
+        drift = actual[name] - current[name]
+        if drift:
+            print(f"[Counters] Drift on {name}: stored={current[name]}, actual={actual[name]}")
+        SystemCounter.query.filter_by(name=name).update(
+            {SystemCounter.value: SystemCounter.value + drift, SystemCounter.updated_at: now}, synchronize_session=False
+        )
+    db.session.commit()
+    return actual
+
+
+class CounterReconciler:
+    """后台定期校准计数器（修正绕过应用的数据修改或异常中断造成的偏差）"""
+
+    def __init__(self, app, interval=3600):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        from web.extensions import cache_redis
+        if cache_redis is not None:
+            try:
+                if not cache_redis.set(RECONCILE_LOCK_KEY, '1', nx=True, ex=max(1, int(self.interval * 0.9))):
+                    return
+            except Exception as e:
+                print(f"[Counters] Reconcile lock failed: {e}")
+        try:
+            with self.app.app_context():
+                reconcile()
+        except Exception as e:
+            print(f"[Counters] Reconcile failed: {e}")
+            with self.app.app_context():
+                db.session.rollback()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,97 @@
+import random
+import uuid
+from datetime import datetime
+
+from web.extensions import db
+from web.models import ExamPaper
+from web.services.question_bank import publish_snapshot
+
+DEFAULT_CATEGORY = '默认题集'
+MINUTES_PER_QUESTION = 5
+
+
+def _visible(q, user_id):
+    # 个人题目只出现在其所有者的试卷中
+    return q.get('type') != 'personal' or q.get('owner_id') == user_id
+
+
+def sample_question_ids(bank, category, user_id, per_category=0, rng=random):
+    """
+    单次遍历题库，按类别分组后在每个类别内随机抽取 per_category 题（0 表示全部），
+    返回打乱后的题目 id 列表。category 为 'all' 时包含所有可见类别。
+    """
+    groups = {}
+    for q in bank:
+        cat = q.get('category') or DEFAULT_CATEGORY
+        if category != 'all' and cat != category:
+            continue
+        if _visible(q, user_id):
+            groups.setdefault(cat, []).append(q['id'])
+
+    ids = []
+    for group in groups.values():
+        if per_category and len(group) > per_category:
+            ids.extend(rng.sample(group, per_category))
+        else:
+            ids.extend(group)
+    rng.shuffle(ids)
+    return ids
+
+
+def create_exam_paper(bank, category, user_id, per_category=0):
+    """生成并保存试卷；没有可用题目时返回 None"""
+    ids = sample_question_ids(bank, category, user_id, per_category)
+    if not ids:
+        return None
+    paper = ExamPaper(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        category=category,
+        bank_version=publish_snapshot(bank)
+    )
+    paper.question_ids = ids
+    db.session.add(paper)
+    db.session.commit()
+    return paper
+
+
+def get_open_paper(paper_id, user_id):
+    """获取当前用户未提交的试卷"""
+    if not paper_id:
+        return None
+    paper = ExamPaper.query.get(paper_id)
+    if not paper or paper.user_id != user_id or paper.status != 'open':
+        return None
+    return paper
+
+
+def paper_questions(paper, bank):
+    """
+    按试卷顺序返回题目（已删除的题目跳过）。每道题附带 position：题目在试卷中的固定序号，
+    即表单字段 q_{position}，中途有题目被删除时其余题目的序号不变。
+    """
+    by_id = {q['id']: q for q in bank}
+    return [{**by_id[q_id], 'position': i} for i, q_id in enumerate(paper.question_ids) if q_id in by_id]
+
+
+def paper_answers(paper, form):
+    """
+    按试卷保存的题目 id 列表收集答案，返回 (ids, {序号: 答案})。
+    不按当前题库重建题目列表：渲染后被删除的题目不会让后续题目的答案错位，
+    评分时按试卷的题库快照处理（快照中没有的题目由评分引擎跳过）。
+    """
+    ids = list(paper.question_ids)
+    return ids, {str(i): form.get(f'q_{i}', '') for i in range(len(ids))}
+
+
+def remaining_seconds(paper):
+    # 每题 5 分钟，从试卷生成时开始计时
+    duration_sec = len(paper.question_ids) * MINUTES_PER_QUESTION * 60
+    elapsed = (datetime.utcnow() - paper.created_at).total_seconds() if paper.created_at else 0
+    return max(0, int(duration_sec - elapsed))
+
+
+def mark_submitted(paper):
+    paper.status = 'submitted'
+    paper.submitted_at = datetime.utcnow()
+    db.session.commit()
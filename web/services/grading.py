@@ -5,6 +5,7 @@ import os
 class GradingService:
     def __init__(self, dll_path):
         self.lib = None
+        self.has_batch = False
         self.dll_path = dll_path
         self._load_library()
 
@@ -14,6 +15,20 @@ class GradingService:
             # int calculate_score(const char* user_ans, const char* correct_ans, int full_score);
             self.lib.calculate_score.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
             self.lib.calculate_score.restype = ctypes.c_int
+            # int calculate_scores_batch(int count, const char** user_answers, const int* accepted_offsets,
+            #                            const char** accepted_answers, const int* full_scores, int* out_scores);
+            # 旧版本动态库没有该导出，此时 score_many 逐题回退到 calculate_score
+            self.has_batch = hasattr(self.lib, 'calculate_scores_batch')
+            if self.has_batch:
+                self.lib.calculate_scores_batch.argtypes = [
+                    ctypes.c_int,
+                    ctypes.POINTER(ctypes.c_char_p),
+                    ctypes.POINTER(ctypes.c_int),
+                    ctypes.POINTER(ctypes.c_char_p),
+                    ctypes.POINTER(ctypes.c_int),
+                    ctypes.POINTER(ctypes.c_int),
+                ]
+                self.lib.calculate_scores_batch.restype = ctypes.c_int
             print(f"Successfully loaded DLL from {self.dll_path}")
         except Exception as e:
             print(f"Error loading DLL: {e}")
@@ -38,5 +53,40 @@ class GradingService:
         
         return self.lib.calculate_score(user_ans_bytes, correct_ans_bytes, full_score)
 
+    def score_many(self, items):
+        """
+        Batch scoring: one C call for a whole exam.
+        items: list of (user_ans_bytes, [accepted_ans_bytes, ...], full_score)
+        Returns the best score per item (list of int).
+        """
+        count = len(items)
+        if not self.lib or count == 0:
+            return [0] * count
+
+        if not self.has_batch:
+            return [
+                max([self.lib.calculate_score(user_ans, correct_ans, full_score) for correct_ans in accepted] or [0])
+                for user_ans, accepted, full_score in items
+            ]
+
+        user_answers = (ctypes.c_char_p * count)()
+        offsets = (ctypes.c_int * (count + 1))()
+        full_scores = (ctypes.c_int * count)()
+        flat_accepted = []
+        for i, (user_ans, accepted, full_score) in enumerate(items):
+            user_answers[i] = user_ans
+            offsets[i] = len(flat_accepted)
+            full_scores[i] = full_score
+            flat_accepted.extend(accepted)
+        offsets[count] = len(flat_accepted)
+
+        accepted_answers = (ctypes.c_char_p * max(len(flat_accepted), 1))(*flat_accepted)
+        out_scores = (ctypes.c_int * count)()
+
+        ret = self.lib.calculate_scores_batch(count, user_answers, offsets, accepted_answers, full_scores, out_scores)
+        if ret != 0:
+            raise RuntimeError(f"calculate_scores_batch failed with code {ret}")
+        return list(out_scores)
+
     def is_available(self):
         return self.lib is not None
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_CATEGORY = '默认题集'
+
+# 每个进程缓存的题库索引数量（按题库版本区分），题库更新后旧版本自然淘汰
+INDEX_CACHE_SIZE = 4
+
+
+def split_answers(answer):
+    """
+    拆分可接受答案：支持中英文分号分隔多个答案。
+    与旧评分逻辑保持一致：全部为空时回退为原始答案。
+    """
+    answer = answer if answer is not None else ''
+    alternatives = [ans.strip() for ans in answer.replace('；', ';').split(';') if ans.strip()]
+    return alternatives or [answer]
+
+
+def safe_encode(text):
+    """
+    编码为 UTF-8 传给 C 评分库。
+    C 端按 Unicode 码点计算编辑距离，中英文答案的容错尺度一致。
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    return text.encode('utf-8', errors='ignore')
+
+
+def compute_bank_version(questions):
+    """
+    根据题库内容计算版本号（内容哈希）。
+    只要任意题目的题干、答案、分值或类别变化，版本号就会变化。
+    """
+    digest = hashlib.sha1()
+    for q in questions:
+        digest.update(json.dumps(
+            [q.get('id'), q.get('content'), q.get('answer'), q.get('score'), q.get('category')],
+            ensure_ascii=False
+        ).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class IndexedQuestion:
+    """预处理后的题目：答案已拆分、已编码，评分时无需重复解析"""
+    __slots__ = ('id', 'content', 'answer', 'score', 'category', 'alternatives', 'encoded_alternatives', 'version')
+
+    def __init__(self, q):
+        self.id = q['id']
+        self.content = q.get('content')
+        self.answer = q.get('answer')
+        self.score = q.get('score') or 0
+        self.category = q.get('category', DEFAULT_CATEGORY)
+        self.alternatives = split_answers(self.answer)
+        self.encoded_alternatives = [safe_encode(ans) for ans in self.alternatives]
+        # 题目评分版本：只取决于答案与分值，用作评分缓存键的一部分
+        self.version = hashlib.sha1(f"{self.answer}\x00{self.score}".encode('utf-8')).hexdigest()[:16]
+
+
+class QuestionIndex:
+    """题库索引：id -> IndexedQuestion，每个题库版本只构建一次"""
+    __slots__ = ('version', '_by_id')
+
+    def __init__(self, questions, version=None):
+        self.version = version
+        self._by_id = {q['id']: IndexedQuestion(q) for q in questions}
+
+    def get(self, q_id):
+        return self._by_id.get(q_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_cached_index(version):
+    """仅查询本地缓存，未命中返回 None"""
+    with _index_lock:
+        index = _index_cache.get(version)
+        if index is not None:
+            _index_cache.move_to_end(version)
+        return index
+
+
+def get_question_index(questions, version=None):
+    """
+    获取题库索引（进程内 LRU 缓存）。
+    version 为空时根据题库内容计算。
+    """
+    if version is None:
+        version = compute_bank_version(questions)
+
+    with _index_lock:
+        index = _index_cache.get(version)
+        if index is not None:
+            _index_cache.move_to_end(version)
+            return index
+
+    return cache_index(QuestionIndex(questions, version=version))
+
+
+def cache_index(index):
+    """将已构建的索引放入本地缓存（如评分子进程收到父进程发送的索引）"""
+    with _index_lock:
+        _index_cache[index.version] = index
+        _index_cache.move_to_end(index.version)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+class GradingEngine:
+    """
+    评分引擎：线程模式（GradingQueue）与 Celery 模式（grade_exam_task）共用。
+    lib 需提供 calculate_score(bytes, bytes, int)（通常为 GradingService，可选 score_many 批量接口），
+    为空时使用精确匹配回退。
+    score_cache: 可选 ScoreCache，相同题目版本下相同（标准化后）答案只评分一次。
+    """
+
+    def __init__(self, lib=None, score_cache=None):
+        self.lib = lib
+        self.score_cache = score_cache
+
+    def score_question(self, question, user_ans):
+        """对单题评分：取所有可接受答案中的最高分"""
+        b_user = safe_encode(user_ans) if self.lib else None
+
+        score = 0
+        for correct_ans, b_correct in zip(question.alternatives, question.encoded_alternatives):
+            current_score = 0
+            if self.lib:
+                try:
+                    current_score = self.lib.calculate_score(b_user, b_correct, question.score)
+                except Exception as e:
+                    print(f"[GradingEngine] Error calling DLL: {e}")
+                    current_score = self._fallback_score(user_ans, correct_ans, question.score)
+            else:
+                current_score = self._fallback_score(user_ans, correct_ans, question.score)
+
+            if current_score > score:
+                score = current_score
+        return score
+
+    def score_batch(self, pairs):
+        """
+        批量评分：pairs 为 [(IndexedQuestion, user_ans), ...]，返回得分列表。
+        先查评分缓存，未命中的部分在 lib 支持 score_many 时只需一次 C 调用。
+        """
+        # 缓存只用于 C 库评分结果（回退的精确匹配规则不同，不能共用缓存）
+        if not (self.score_cache and self.lib):
+            return self._score_uncached(pairs)
+
+        keys = [self.score_cache.make_key(q, user_ans) for q, user_ans in pairs]
+        cached = self.score_cache.get_many(keys)
+
+        pending = [idx for idx, key in enumerate(keys) if key not in cached]
+        # 同一批次内重复的答案只计算一次
+        unique_pending = list(OrderedDict((keys[idx], idx) for idx in pending).values())
+        scores = self._score_uncached([pairs[idx] for idx in unique_pending])
+
+        computed = {keys[idx]: score for idx, score in zip(unique_pending, scores)}
+        self.score_cache.put_many(computed)
+        self.score_cache.record_shared_stats(len(pairs) - len(pending), len(pending))
+
+        cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def _score_uncached(self, pairs):
+        if not pairs:
+            return []
+        if self.lib and hasattr(self.lib, 'score_many'):
+            try:
+                return self.lib.score_many([
+                    (safe_encode(user_ans), q.encoded_alternatives, q.score) for q, user_ans in pairs
+                ])
+            except Exception as e:
+                print(f"[GradingEngine] Batch scoring failed, falling back to per-question: {e}")
+        return [self.score_question(q, user_ans) for q, user_ans in pairs]
+
+    def grade(self, ids, user_answers, index, progress=None):
+        """
+        按考试题目顺序评分，单次线性遍历。
+        user_answers: {'0': '答案', ...}（以题目序号为键）
+        progress: 可选回调 progress(i, total)，每处理一道题调用一次
+        """
+        pairs = []
+        positions = []
+        for i, q_id in enumerate(ids):
+            q = index.get(q_id)
+            if not q:
+                continue
+            pairs.append((q, user_answers.get(str(i), '')))
+            positions.append(i)
+
+        scores = self.score_batch(pairs)
+
+        total_score = 0
+        max_score = 0
+        results = []
+        total_items = len(ids)
+
+        for (q, user_ans), score, i in zip(pairs, scores, positions):
+            total_score += score
+            max_score += q.score
+            results.append({
+                'id': q.id,
+                'category': q.category,
+                'question': q.content,
+                'user_ans': user_ans,
+                'correct_ans': q.answer,
+                'score': score,
+                'full_score': q.score
+            })
+
+            if progress:
+                progress(i, total_items)
+
+        return {
+            'total_score': total_score,
+            'max_score': max_score,
+            'details': results
+        }
+
+    @staticmethod
+    def _fallback_score(user_ans, correct_ans, full_score):
+        return full_score if user_ans.strip().lower() == correct_ans.strip().lower() else 0
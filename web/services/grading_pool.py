@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from web.services.grading_engine import INDEX_CACHE_SIZE
+
+
+def _worker_main(conn, dll_path):
+    """
+    评分子进程入口：评分库只加载一次，循环处理评分请求。
+    请求格式: (version, index 或 None, ids, user_answers)
+    """
+    from web.services.grading import GradingService
+    from web.services.grading_engine import GradingEngine, cache_index, get_cached_index
+    from web.services.score_cache import get_score_cache
+
+    lib = None
+    if dll_path and os.path.exists(dll_path):
+        service = GradingService(dll_path)
+        lib = service if service.is_available() else None
+    engine = GradingEngine(lib, score_cache=get_score_cache())
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+
+        version, index, ids, user_answers = msg
+        try:
+            if index is not None:
+                cache_index(index)
+            else:
+                index = get_cached_index(version)
+                if index is None:
+                    # 本进程的 LRU 已淘汰该版本，请父进程重新发送
+                    conn.send(('missing', version, None))
+                    continue
+            result = engine.grade(ids, user_answers, index)
+            conn.send(('ok', result, engine.score_cache.stats()))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}", None))
+
+
+class _ProcessWorker:
+    __slots__ = ('slot', 'process', 'conn', 'versions', 'cache_stats')
+
+    def __init__(self, slot, process, conn):
+        self.slot = slot
+        self.process = process
+        self.conn = conn
+        # 已发送给该子进程的题库版本（与子进程的索引 LRU 同步淘汰）
+        self.versions = OrderedDict()
+        # 子进程最近一次上报的评分缓存统计
+        self.cache_stats = None
+
+
+class GradingProcessPool:
+    """
+    评分进程池：每个子进程加载一次 libgrading，CPU 密集的评分不再受 GIL 限制。
+    超时的子进程会被直接终止并替换，保证超时真正生效。
+    """
+
+    def __init__(self, size, dll_path):
+        self.size = size
+        self.dll_path = dll_path
+        # spawn 在 Linux/Windows 行为一致，也避免 fork 继承 gevent hub 与数据库连接
+        self.ctx = multiprocessing.get_context('spawn')
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.restarts = 0
+        # 已退出子进程的缓存统计累计值
+        self._retired_cache_stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0}
+        self._workers = {}
+        self._closed = False
+        for slot in range(size):
+            self.idle.put(self._spawn(slot))
+        print(f"[GradingPool] Started {size} grading processes")
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.dll_path),
+            name=f"grading-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _ProcessWorker(slot, process, parent_conn)
+        with self.lock:
+            self._workers[slot] = worker
+        return worker
+
+    def _replace(self, worker):
+        """终止并替换子进程"""
+        try:
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join(timeout=5)
+        except Exception as e:
+            print(f"[GradingPool] Failed to stop worker {worker.slot}: {e}")
+        try:
+            worker.conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.restarts += 1
+            if worker.cache_stats:
+                for field in self._retired_cache_stats:
+                    self._retired_cache_stats[field] += worker.cache_stats.get(field, 0)
+        print(f"[GradingPool] Replacing grading process in slot {worker.slot}")
+        return self._spawn(worker.slot)
+
+    def grade(self, index, ids, user_answers, timeout=30):
+        """在空闲子进程中评分，超时则终止该进程并抛出 TimeoutError"""
+        worker = self.idle.get()
+        try:
+            payload = None if index.version in worker.versions else index
+            worker.conn.send((index.version, payload, ids, user_answers))
+
+            while True:
+                if not worker.conn.poll(timeout):
+                    worker = self._replace(worker)
+                    raise TimeoutError(f"Grading timeout after {timeout} seconds")
+
+                status, result, cache_stats = worker.conn.recv()
+                if cache_stats:
+                    worker.cache_stats = cache_stats
+                if status == 'missing':
+                    worker.conn.send((index.version, index, ids, user_answers))
+                    continue
+                break
+
+            worker.versions[index.version] = True
+            worker.versions.move_to_end(index.version)
+            while len(worker.versions) > INDEX_CACHE_SIZE:
+                worker.versions.popitem(last=False)
+
+            if status == 'error':
+                raise RuntimeError(result)
+            return result
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            # 子进程异常退出
+            worker = self._replace(worker)
+            raise RuntimeError(f"Grading process died: {e}")
+        finally:
+            self.idle.put(worker)
+
+    def cache_stats(self):
+        """汇总所有子进程的评分缓存统计"""
+        with self.lock:
+            totals = dict(self._retired_cache_stats)
+            entries = 0
+            for worker in self._workers.values():
+                if worker.cache_stats:
+                    entries += worker.cache_stats.get('entries', 0)
+                    for field in totals:
+                        totals[field] += worker.cache_stats.get(field, 0)
+        lookups = totals['local_hits'] + totals['redis_hits'] + totals['misses']
+        hits = totals['local_hits'] + totals['redis_hits']
+        totals['entries'] = entries
+        totals['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        return totals
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        workers = []
+        while True:
+            try:
+                workers.append(self.idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        print("[GradingPool] Shutdown complete")
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+
+from web.services.grading_engine import compute_bank_version, get_cached_index, get_question_index
+
+# 题库快照：按内容哈希版本化，只在 Redis 中存储一份，评分任务只携带版本号
+SNAPSHOT_KEY_PREFIX = 'grading:qbank:snapshot:'
+SNAPSHOT_TTL = 7 * 24 * 3600  # 快照保留 7 天，足够覆盖排队中的任务
+# 评分只需要这些字段，图片、渲染模式等不进入快照
+SNAPSHOT_FIELDS = ('id', 'content', 'answer', 'score', 'category')
+
+# 题库全局版本计数器：任何题目写操作后递增，各进程据此判断本地题库缓存是否过期
+BANK_VERSION_KEY = 'grading:qbank:version'
+# 兜底：即使版本号未变化（如绕过应用直接改库），缓存也最多保留这么久
+BANK_CACHE_MAX_AGE = 300
+
+_published = {}  # version -> 上次写入 Redis 的时间
+_published_lock = threading.Lock()
+# 最近一次计算内容哈希的题库对象：缓存的题库快照是不可变的，同一对象无需重复哈希
+_content_version_memo = (None, None)
+
+
+def _get_redis():
+    from web.extensions import cache_redis
+    return cache_redis
+
+
+def _snapshot_key(version):
+    return f"{SNAPSHOT_KEY_PREFIX}{version}"
+
+
+def _slim(questions):
+    return [{field: q.get(field) for field in SNAPSHOT_FIELDS} for q in questions]
+
+
+def _content_version(questions):
+    global _content_version_memo
+    memo_questions, memo_version = _content_version_memo
+    if memo_questions is questions:
+        return memo_version
+    version = compute_bank_version(questions)
+    if isinstance(questions, tuple):
+        _content_version_memo = (questions, version)
+    return version
+
+
+def publish_snapshot(questions):
+    """
+    发布题库快照，返回版本号。
+    同一版本只在 Redis 写入一次（TTL 过半时刷新），本进程同时缓存解码后的索引。
+    """
+    version = _content_version(questions)
+    # 本进程（线程模式）直接复用索引，无需经过 Redis
+    get_question_index(questions, version=version)
+
+    now = time.time()
+    with _published_lock:
+        last = _published.get(version)
+        if last and now - last < SNAPSHOT_TTL / 2:
+            return version
+
+    r = _get_redis()
+    if r:
+        try:
+            payload = json.dumps(_slim(questions), ensure_ascii=False, separators=(',', ':'))
+            r.set(_snapshot_key(version), payload, ex=SNAPSHOT_TTL)
+            with _published_lock:
+                _published[version] = now
+                # 只保留最近的发布记录
+                if len(_published) > 64:
+                    oldest = min(_published, key=_published.get)
+                    _published.pop(oldest, None)
+            print(f"[QuestionBank] Published snapshot {version[:12]} ({len(questions)} questions)")
+        except Exception as e:
+            print(f"[QuestionBank] Failed to publish snapshot {version[:12]}: {e}")
+    return version
+
+
+def load_snapshot_index(version, fallback_loader=None):
+    """
+    按版本号获取题库索引：本地 LRU -> Redis 快照 -> fallback_loader（当前数据库题库）。
+    """
+    index = get_cached_index(version)
+    if index is not None:
+        return index
+
+    r = _get_redis()
+    if r:
+        try:
+            payload = r.get(_snapshot_key(version))
+            if payload:
+                return get_question_index(json.loads(payload), version=version)
+        except Exception as e:
+            print(f"[QuestionBank] Failed to load snapshot {version[:12]}: {e}")
+
+    if fallback_loader is None:
+        raise LookupError(f"Question bank snapshot {version} not found")
+
+    print(f"[QuestionBank] Snapshot {version[:12]} missing, falling back to current question bank")
+    return get_question_index(fallback_loader())
+
+
+def resolve_exam_index(exam_data, fallback_loader=None):
+    """根据评分任务数据获取题库索引，兼容旧格式（直接携带 all_questions）的任务"""
+    if exam_data.get('bank_version'):
+        return load_snapshot_index(exam_data['bank_version'], fallback_loader=fallback_loader)
+    return get_question_index(exam_data.get('all_questions') or [])
+
+
+_local_version = 0  # 无 Redis 时的进程内版本号
+_caches = []
+
+
+class QuestionBankCache:
+    """
+    进程内题库缓存：保存 loader 结果的一份不可变快照（tuple），
+    只有 Redis 中的全局版本号变化（或超过 BANK_CACHE_MAX_AGE）时才重新查询数据库。
+    没有 Redis 时使用进程内计数器（单进程开发环境）。
+    """
+
+    def __init__(self, max_age=BANK_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+        self._loaded_at = 0
+        self.hits = 0
+        self.reloads = 0
+        _caches.append(self)
+
+    @staticmethod
+    def current_version():
+        """读取全局版本号；Redis 读取失败时返回 None（视为无法校验，直接重新加载）"""
+        r = _get_redis()
+        if r is None:
+            return _local_version
+        try:
+            return int(r.get(BANK_VERSION_KEY) or 0)
+        except Exception as e:
+            print(f"[QuestionBank] Failed to read bank version: {e}")
+            return None
+
+    def _fresh(self, version):
+        return (
+            version is not None and self._value is not None and self._version == version
+            and time.time() - self._loaded_at < self.max_age
+        )
+
+    def get(self, loader):
+        version = self.current_version()
+        if self._fresh(version):
+            self.hits += 1
+            return self._value
+        with self._lock:
+            if self._fresh(version):
+                self.hits += 1
+                return self._value
+            # 先读版本号再查询：查询期间发生的写入会让下一次读取看到新版本
+            value = tuple(loader())
+            self._version = version
+            self._value = value
+            self._loaded_at = time.time()
+            self.reloads += 1
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+    def stats(self):
+        return {'version': self._version, 'hits': self.hits, 'reloads': self.reloads}
+
+
+_bank_cache = QuestionBankCache()
+_catalog_cache = QuestionBankCache()
+
+
+def get_cached_questions(loader):
+    """获取当前题库（不可变 tuple，调用方不得修改其中的字典）"""
+    return _bank_cache.get(loader)
+
+
+def get_cached_catalog(loader):
+    """获取当前类别目录（不可变 tuple），与题库共用版本号"""
+    return _catalog_cache.get(loader)
+
+
+def bump_bank_version():
+    """题目新增 / 修改 / 删除后调用：递增全局版本号，所有进程的题库与类别缓存随之失效"""
+    global _local_version
+    _local_version += 1
+    for cache in _caches:
+        cache.invalidate()
+    r = _get_redis()
+    if r is not None:
+        try:
+            return r.incr(BANK_VERSION_KEY)
+        except Exception as e:
+            print(f"[QuestionBank] Failed to bump bank version: {e}")
+    return _local_version
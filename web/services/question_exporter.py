@@ -0,0 +1,165 @@
+import atexit
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from web.models import Question
+
+EXPORT_CHUNK_SIZE = 500
+DEFAULT_CATEGORY = '默认题集'
+
+
+def _format_line(content, answer, score, image, category):
+    """questions.txt 行格式：题目|答案|分值|图片文件名|类别"""
+    content = content.replace('\n', '[NEWLINE]') if content else ''
+    return f"{content}|{answer or ''}|{score if score is not None else 0}|{image or ''}|{category or DEFAULT_CATEGORY}"
+
+
+def _file_hash(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_questions_file(data_file, known_hash=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    分块流式读取题目写入同目录临时文件，再原子替换 data_file（需要应用上下文）。
+    内容哈希与 known_hash（缺省时为现有文件的哈希）相同则丢弃临时文件，不触碰原文件。
+    返回 (内容哈希, 是否写入)。
+    """
+    if known_hash is None:
+        known_hash = _file_hash(data_file)
+
+    rows = Question.query.with_entities(
+        Question.content, Question.answer, Question.score, Question.image, Question.category
+    ).order_by(Question.id).yield_per(chunk_size)
+
+    directory = os.path.dirname(os.path.abspath(data_file))
+    fd, tmp_path = tempfile.mkstemp(prefix='.questions.', suffix='.tmp', dir=directory)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            first = True
+            for row in rows:
+                data = ('' if first else '\n') + _format_line(*row)
+                first = False
+                encoded = data.encode('utf-8')
+                digest.update(encoded)
+                f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+        content_hash = digest.hexdigest()
+        if content_hash == known_hash:
+            os.remove(tmp_path)
+            return content_hash, False
+        # mkstemp 创建的文件权限为 0600，替换前恢复原文件权限，否则判题程序等其他用户无法读取
+        try:
+            mode = stat.S_IMODE(os.stat(data_file).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        # 同一文件系统内 rename 是原子的：读取方只会看到旧文件或完整的新文件
+        os.replace(tmp_path, data_file)
+        return content_hash, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class QuestionExporter:
+    """
+    后台导出 questions.txt：题目写操作只调用 schedule()，
+    最后一次变更后静默 delay 秒（持续变更时最多 max_delay 秒）才导出一次，合并突发的批量修改。
+    """
+
+    def __init__(self, app, data_file, delay=2.0, max_delay=10.0):
+        self.app = app
+        self.data_file = data_file
+        self.delay = delay
+        self.max_delay = max_delay
+        self.exports = 0
+        self.skipped = 0
+        self._hash = None
+        self._first_request = None
+        self._last_request = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self):
+        now = time.time()
+        with self._cond:
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._first_request is None and not self._closed:
+                    self._cond.wait()
+                if self._first_request is None:
+                    return
+                while not self._closed:
+                    deadline = min(self._last_request + self.delay, self._first_request + self.max_delay)
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._first_request = None
+                self._last_request = None
+            self._export()
+
+    def _export(self):
+        try:
+            with self.app.app_context():
+                self._hash, written = export_questions_file(self.data_file, known_hash=self._hash)
+            if written:
+                self.exports += 1
+                print(f"[Exporter] 已导出所有题目到 {self.data_file}")
+            else:
+                self.skipped += 1
+        except Exception as e:
+            print(f"[Exporter] 导出题目失败: {e}")
+
+    def stats(self):
+        with self._cond:
+            pending = self._first_request is not None
+        return {'pending': pending, 'exports': self.exports, 'skipped': self.skipped}
+
+    def close(self, timeout=10):
+        """停止后台线程；有待导出的变更时先完成导出"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_default_exporter = None
+_default_lock = threading.Lock()
+
+
+def get_question_exporter(app):
+    """本进程共享的导出器，进程退出前会把未导出的变更写完"""
+    global _default_exporter
+    if _default_exporter is None:
+        with _default_lock:
+            if _default_exporter is None:
+                _default_exporter = QuestionExporter(
+                    app,
+                    app.config.get('DATA_FILE', 'questions.txt'),
+                    delay=app.config.get('QUESTION_EXPORT_DELAY', 2.0),
+                    max_delay=app.config.get('QUESTION_EXPORT_MAX_DELAY', 10.0)
+                )
+                atexit.register(_default_exporter.close)
+    return _default_exporter
@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import io
+import json
+import time
+
+from web.extensions import db
+from web.models import Question
+from web.services import counters
+
+DEFAULT_CATEGORY = '默认题集'
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('txt', 'csv', 'jsonl')
+COLUMNS = ('content', 'answer', 'score', 'image', 'category', 'mode', 'type', 'owner_id')
+
+
+class ImportReport:
+    """导入结果：计数、前 MAX_REPORTED_ERRORS 条行级错误与吞吐量"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_no, 'error': message})
+
+    def to_dict(self):
+        elapsed = time.time() - self.started_at
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'elapsed': round(elapsed, 3),
+            'rows_per_sec': round(self.rows / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+
+def detect_format(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if ext in ('csv', 'jsonl'):
+        return ext
+    if ext == 'json':
+        return 'jsonl'
+    return 'txt'
+
+
+def _iter_records(text, fmt):
+    """逐行产出 (行号, 原始字段字典 或 解析错误信息)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f'JSON 解析失败: {e}'
+                continue
+            yield line_no, record if isinstance(record, dict) else 'JSON 行必须是对象'
+    else:
+        # questions.txt 格式（与 grader/src/get_data.c 一致）：题目|答案|分值|图片文件名|类别
+        for line_no, line in enumerate(text, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            parts = line.split('|', 4)
+            if len(parts) < 3:
+                yield line_no, '缺少分隔符，格式应为 题目|答案|分值|图片|类别'
+                continue
+            parts += [''] * (5 - len(parts))
+            yield line_no, {
+                'content': parts[0].replace('[NEWLINE]', '\n'),
+                'answer': parts[1],
+                'score': parts[2],
+                'image': parts[3],
+                'category': parts[4]
+            }
+
+
+def _validate(record, default_category):
+    """校验并规整一行，返回 (行数据, 错误信息)"""
+    content = (record.get('content') or '').strip()
+    answer = '' if record.get('answer') is None else str(record.get('answer')).strip()
+    if not content:
+        return None, '题目内容为空'
+    if not answer:
+        return None, '答案为空'
+    if len(answer) > 500:
+        return None, '答案超过 500 字符'
+    try:
+        score = int(str(record.get('score') if record.get('score') not in (None, '') else 10).strip())
+    except ValueError:
+        return None, f"分值无效: {record.get('score')!r}"
+    if score < 0:
+        return None, '分值不能为负数'
+    image = (record.get('image') or '').strip() or None
+    if image and len(image) > 200:
+        return None, '图片文件名超过 200 字符'
+    category = (record.get('category') or '').strip() or default_category
+    if len(category) > 100:
+        return None, '类别名称超过 100 字符'
+    return {'content': content, 'answer': answer, 'score': score, 'image': image, 'category': category}, None
+
+
+def _dedupe_key(content, category):
+    return hashlib.sha1(f'{category}\x00{content}'.encode('utf-8')).digest()
+
+
+def _existing_keys(chunk_size=IMPORT_BATCH_SIZE):
+    # 只保留摘要，避免把现有题库全文读入内存
+    rows = Question.query.with_entities(Question.content, Question.category).yield_per(chunk_size)
+    return {_dedupe_key(content, category or DEFAULT_CATEGORY) for content, category in rows}
+
+
+def _insert_batch(batch):
+    """批量写入一批题目并提交：PostgreSQL 使用 COPY，其他数据库使用 executemany"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in batch:
+            writer.writerow(['' if row[col] is None else row[col] for col in COLUMNS])
+        buf.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY question ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '')", buf
+            )
+        finally:
+            cursor.close()
+    else:
+        db.session.execute(Question.__table__.insert(), batch)
+    counters.increment(questions=len(batch))
+    db.session.commit()
+
+
+def import_questions(stream, fmt='txt', default_category=DEFAULT_CATEGORY, owner_id=None,
+                     batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    流式导入题目（需要应用上下文）：逐行解析校验，跳过与现有题库或本文件中
+    同类别同内容的题目，每 batch_size 条批量写入并提交一次。
+    owner_id 不为空时导入为该用户的个人题目。progress(report) 在每批提交后回调。
+    调用方负责 bump_bank_version 与导出 questions.txt。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported import format: {fmt}')
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') if not isinstance(stream, io.TextIOBase) else stream
+    report = ImportReport()
+    seen = _existing_keys()
+    extra = {
+        'mode': 'html',
+        'type': 'personal' if owner_id else 'public',
+        'owner_id': owner_id
+    }
+
+    batch = []
+    try:
+        for line_no, record in _iter_records(text, fmt):
+            report.rows += 1
+            if isinstance(record, str):
+                report.error(line_no, record)
+                continue
+            row, error = _validate(record, default_category)
+            if error:
+                report.error(line_no, error)
+                continue
+            key = _dedupe_key(row['content'], row['category'])
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            row.update(extra)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_batch(batch)
+                report.inserted += len(batch)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _insert_batch(batch)
+            report.inserted += len(batch)
+    except UnicodeDecodeError as e:
+        db.session.rollback()
+        report.error(report.rows + 1, f'文件不是 UTF-8 编码: {e}')
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if text is not stream:
+            text.detach()
+
+    print(f"[Import] {report.inserted} inserted, {report.duplicates} duplicates, {report.error_count} errors")
+    return report
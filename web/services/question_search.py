@@ -0,0 +1,164 @@
+from sqlalchemy import literal_column, or_, text
+
+from web.extensions import db
+from web.models import Question
+
+# PostgreSQL：pg_trgm GIN 索引建在下面这个表达式上，查询必须使用完全相同的表达式才能命中索引
+PG_SEARCH_EXPR = "(question.content || ' ' || question.answer || ' ' || coalesce(question.category, ''))"
+PG_INDEX_NAME = 'ix_question_search_trgm'
+# SQLite：FTS5 外部内容表（trigram 分词，支持中文子串匹配），由触发器与 question 表保持同步
+FTS_TABLE = 'question_fts'
+# trigram 索引至少需要 3 个字符，更短的关键词回退为 LIKE 扫描
+MIN_INDEXED_TERM = 3
+
+_backend_cache = {}
+
+
+def ensure_search_index():
+    """创建搜索索引（幂等，需要应用上下文）；数据库不支持时保持 LIKE 搜索"""
+    dialect = db.session.get_bind().dialect.name
+    try:
+        if dialect == 'postgresql':
+            db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            db.session.execute(text(
+                f'CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON question USING gin ({PG_SEARCH_EXPR} gin_trgm_ops)'
+            ))
+        elif dialect == 'sqlite':
+            exists = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {'name': FTS_TABLE}).first()
+            if not exists:
+                for statement in sqlite_fts_statements():
+                    db.session.execute(text(statement))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[Search] 无法创建搜索索引，使用 LIKE 搜索: {e}")
+    _backend_cache.clear()
+
+
+def sqlite_fts_statements():
+    """SQLite FTS5 表、同步触发器与初次重建（迁移与 ensure_search_index 共用）"""
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"content, answer, category, content='question', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS question_fts_ai AFTER INSERT ON question BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, content, answer, category) VALUES (new.id, new.content, new.answer, new.category); END",
+        f"CREATE TRIGGER IF NOT EXISTS question_fts_ad AFTER DELETE ON question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, answer, category) "
+        f"VALUES ('delete', old.id, old.content, old.answer, old.category); END",
+        f"CREATE TRIGGER IF NOT EXISTS question_fts_au AFTER UPDATE ON question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, answer, category) "
+        f"VALUES ('delete', old.id, old.content, old.answer, old.category); "
+        f"INSERT INTO {FTS_TABLE}(rowid, content, answer, category) VALUES (new.id, new.content, new.answer, new.category); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def _backend():
+    """当前数据库可用的搜索方式：trgm / fts5 / like（按数据库 URL 缓存）"""
+    bind = db.session.get_bind()
+    key = str(bind.url)
+    if key not in _backend_cache:
+        backend = 'like'
+        try:
+            if bind.dialect.name == 'postgresql':
+                if db.session.execute(text('SELECT 1 FROM pg_indexes WHERE indexname = :name'), {'name': PG_INDEX_NAME}).first():
+                    backend = 'trgm'
+            elif bind.dialect.name == 'sqlite':
+                if db.session.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {'name': FTS_TABLE}).first():
+                    backend = 'fts5'
+        except Exception as e:
+            print(f"[Search] 检测搜索索引失败: {e}")
+        _backend_cache[key] = backend
+    return _backend_cache[key]
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_filter(term):
+    pattern = f'%{_escape_like(term)}%'
+    return or_(
+        Question.content.ilike(pattern, escape='\\'),
+        Question.answer.ilike(pattern, escape='\\'),
+        Question.category.ilike(pattern, escape='\\')
+    )
+
+
+def match_filter(term):
+    """题目内容 / 答案 / 类别包含 term 的过滤条件（尽量走搜索索引）"""
+    backend = _backend()
+    if backend == 'trgm':
+        return literal_column(PG_SEARCH_EXPR).ilike(f'%{_escape_like(term)}%', escape='\\')
+    if backend == 'fts5' and len(term) >= MIN_INDEXED_TERM:
+        return Question.id.in_(
+            text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_match').bindparams(fts_match=_fts_phrase(term))
+        )
+    return _like_filter(term)
+
+
+def _parse_cursor(cursor):
+    try:
+        rank, last_id = cursor.rsplit(':', 1)
+        return float(rank), int(last_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search_questions(term, category=None, owner_id=None, limit=10, cursor=None):
+    """
+    按相关度排序搜索题目，使用 (相关度, id) 游标分页。
+    owner_id 不为空时只搜索该用户的个人题目。返回 (题目列表, 下一页游标 或 None)。
+    """
+    term = (term or '').strip()
+    backend = _backend()
+    if backend == 'fts5' and len(term) >= MIN_INDEXED_TERM:
+        # FTS5 的 rank 即 bm25，越小越相关
+        ranked = text(
+            f'SELECT rowid AS id, rank AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_match'
+        ).bindparams(fts_match=_fts_phrase(term)).columns(id=db.Integer, score=db.Float).subquery('ranked')
+        score = ranked.c.score
+        query = db.session.query(Question, score).join(ranked, ranked.c.id == Question.id)
+        better = score.asc()
+    elif backend == 'trgm':
+        # word_similarity 返回 real（单精度），游标以 Python float 回传后与单精度值比较会错位，统一按双精度比较
+        score = db.cast(
+            db.func.word_similarity(term, literal_column(PG_SEARCH_EXPR)), db.Float(precision=53)
+        ).label('score')
+        query = db.session.query(Question, score).filter(match_filter(term))
+        better = score.desc()
+    else:
+        score = literal_column('0.0').label('score')
+        query = db.session.query(Question, score).filter(_like_filter(term))
+        better = None
+
+    if category:
+        query = query.filter(Question.category == category)
+    if owner_id is not None:
+        query = query.filter(Question.type == 'personal', Question.owner_id == owner_id)
+
+    position = _parse_cursor(cursor)
+    if position:
+        last_score, last_id = position
+        if better is None:
+            query = query.filter(Question.id < last_id)
+        else:
+            past = score > last_score if backend == 'fts5' else score < last_score
+            query = query.filter(or_(past, (score == last_score) & (Question.id < last_id)))
+
+    order = [Question.id.desc()] if better is None else [better, Question.id.desc()]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_question, last_score = rows[-1]
+        next_cursor = f'{float(last_score)!r}:{last_question.id}'
+    return [q for q, _ in rows], next_cursor
@@ -0,0 +1,284 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func, or_
+
+from web.extensions import db
+from web.models import ExamAnswer, ExamResult, Question, RegradeJob, UserCategoryStat, UserQuestionStat
+from web.services import counters
+from web.services.answer_backfill import convert_legacy_results
+from web.services.grading_engine import DEFAULT_CATEGORY, GradingEngine, QuestionIndex
+from web.services.score_cache import get_score_cache
+
+REGRADE_ROOM = 'admin:regrade'
+CHUNK_SIZE = 200
+# running 状态超过该时长未更新，视为执行进程已退出，可以续跑
+STALE_AFTER = timedelta(minutes=10)
+# 每道题目的重评锁（值为持有锁的任务 id），同一题目同一时间只允许一个任务重评；
+# 每处理一块续期，执行进程退出后与 STALE_AFTER 同时过期
+QUESTION_LOCK_PREFIX = 'regrade:question:'
+
+
+def create_regrade_job(question_ids, created_by=None):
+    """创建重评任务（只记录题目 id，执行时读取题目的最新答案与分值）"""
+    question_ids = [int(q_id) for q_id in question_ids]
+    if not question_ids:
+        raise ValueError('No questions to regrade')
+    job = RegradeJob(status='pending', created_by=created_by)
+    job.question_ids = question_ids
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def is_resumable(job):
+    if job.status in ('pending', 'failed'):
+        return True
+    return job.status == 'running' and job.updated_at and datetime.utcnow() - job.updated_at > STALE_AFTER
+
+
+def find_conflicting_job(question_ids, exclude_id=None):
+    """题目与 question_ids 重叠、且仍在执行（未超时）的重评任务，没有时返回 None"""
+    wanted = set(int(q_id) for q_id in question_ids)
+    for job in RegradeJob.query.filter(RegradeJob.status == 'running').order_by(RegradeJob.id).all():
+        if job.id == exclude_id or is_resumable(job):
+            continue
+        if wanted.intersection(job.question_ids):
+            return job
+    return None
+
+
+def _lock_questions(job_id, question_ids):
+    """
+    按题目 id 顺序逐个获取 Redis 重评锁。返回 (已获取的锁, 冲突任务 id)：
+    冲突时释放已获取的锁并返回占用该题目的任务 id；Redis 不可用时返回 ([], None)，只依赖数据库状态检查。
+    """
+    from web.extensions import cache_redis
+    if cache_redis is None:
+        return [], None
+    ttl = int(STALE_AFTER.total_seconds())
+    keys = []
+    try:
+        for q_id in sorted(question_ids):
+            key = f'{QUESTION_LOCK_PREFIX}{q_id}'
+            if not cache_redis.set(key, job_id, nx=True, ex=ttl):
+                owner = cache_redis.get(key)
+                if owner is not None and str(owner) != str(job_id):
+                    _unlock_questions(job_id, keys)
+                    return [], owner
+                # 同一任务中断后续跑：沿用自己的锁
+                cache_redis.set(key, job_id, ex=ttl)
+            keys.append(key)
+    except Exception as e:
+        print(f"[Regrade] Question lock unavailable: {e}")
+        _unlock_questions(job_id, keys)
+        return [], None
+    return keys, None
+
+
+def _refresh_locks(keys):
+    from web.extensions import cache_redis
+    if cache_redis is None or not keys:
+        return
+    try:
+        pipe = cache_redis.pipeline()
+        for key in keys:
+            pipe.expire(key, int(STALE_AFTER.total_seconds()))
+        pipe.execute()
+    except Exception as e:
+        print(f"[Regrade] Question lock refresh failed: {e}")
+
+
+def _unlock_questions(job_id, keys):
+    from web.extensions import cache_redis
+    if cache_redis is None:
+        return
+    for key in keys:
+        try:
+            if str(cache_redis.get(key)) == str(job_id):
+                cache_redis.delete(key)
+        except Exception as e:
+            print(f"[Regrade] Question unlock failed: {e}")
+
+
+def _candidate_filter(question_ids):
+    # 逐题作答在 exam_answer 中按 question_id 索引；尚未回填的旧记录仍用 LIKE 预筛选 details_json
+    # （由 json.dumps(ensure_ascii=False) 写入，每条详情以 {"id": <题目id>, 开头）
+    answered = db.session.query(ExamAnswer.result_id).filter(ExamAnswer.question_id.in_(question_ids))
+    legacy = and_(
+        ExamResult.details_json.isnot(None),
+        or_(*[ExamResult.details_json.like(f'%{{"id": {q_id},%') for q_id in question_ids])
+    )
+    return or_(ExamResult.id.in_(answered), legacy)
+
+
+def _emit(emitter, job):
+    if not emitter:
+        return
+    try:
+        emitter.emit('regrade_progress', job.to_dict(), room=REGRADE_ROOM)
+    except Exception as e:
+        print(f"[Regrade] Progress emit failed: {e}")
+
+
+def run_regrade_job(job_id, lib=None, emitter=None, chunk_size=CHUNK_SIZE):
+    """
+    执行（或续跑）重评任务：按 ExamResult.id 游标分块读取受影响的考试记录，
+    每块一次批量评分，批量写回详情、总分和类别统计。
+    每块的结果、统计增量与游标在同一事务中提交，进程中途退出后从游标继续不会重复计算。
+    """
+    job = RegradeJob.query.get(job_id)
+    if not job:
+        return None
+    if job.status == 'done':
+        return job.to_dict()
+
+    question_ids = job.question_ids
+    # 两个任务同时重评同一题目会基于同一旧分数各自累加统计增量，造成重复计算：
+    # 与执行中的任务重叠时不执行，保持 pending，等对方完成后由管理员续跑
+    locks, blocker = _lock_questions(job_id, question_ids)
+    if blocker is None:
+        conflict = find_conflicting_job(question_ids, exclude_id=job_id)
+        blocker = conflict.id if conflict else None
+    if blocker is not None:
+        _unlock_questions(job_id, locks)
+        job.status = 'pending'
+        job.error = f'Blocked by regrade job #{blocker} on overlapping questions'
+        db.session.commit()
+        print(f"[Regrade] Job {job_id} blocked by job {blocker}")
+        _emit(emitter, job)
+        return job.to_dict()
+
+    # 已删除的题目不在索引中，相关详情保持不变
+    questions = Question.query.filter(Question.id.in_(question_ids)).all()
+    index = QuestionIndex([q.to_dict() for q in questions])
+    engine = GradingEngine(lib, score_cache=get_score_cache())
+    candidate = _candidate_filter(question_ids)
+
+    job.status = 'running'
+    job.error = None
+    if not job.cursor:
+        job.total = db.session.query(db.func.count(ExamResult.id)).filter(candidate).scalar() or 0
+    db.session.commit()
+    print(f"[Regrade] Job {job_id} running: questions={question_ids}, cursor={job.cursor}, total={job.total}")
+    _emit(emitter, job)
+
+    try:
+        while True:
+            query = db.session.query(
+                ExamResult.id, ExamResult.user_id, ExamResult.details_json, ExamResult.timestamp
+            ).filter(candidate)
+            if job.cursor:
+                query = query.filter(ExamResult.id > job.cursor)
+            rows = query.order_by(ExamResult.id).limit(chunk_size).all()
+            if not rows:
+                break
+
+            changed = _regrade_chunk(rows, question_ids, index, engine)
+            job.cursor = rows[-1].id
+            job.processed = (job.processed or 0) + len(rows)
+            job.changed = (job.changed or 0) + changed
+            db.session.commit()
+            _refresh_locks(locks)
+            _emit(emitter, job)
+
+        job.status = 'done'
+        db.session.commit()
+        print(f"[Regrade] Job {job_id} done: {job.processed} checked, {job.changed} updated")
+    except Exception as e:
+        db.session.rollback()
+        job = RegradeJob.query.get(job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        db.session.commit()
+        print(f"[Regrade] Job {job_id} failed at cursor {job.cursor}: {e}")
+    finally:
+        _unlock_questions(job_id, locks)
+
+    _emit(emitter, job)
+    return job.to_dict()
+
+
+def _regrade_chunk(rows, question_ids, index, engine):
+    """重评一块考试记录，返回实际修改的记录数（调用方负责提交事务）"""
+    # 旧记录先拆成 exam_answer 行，与重评在同一事务中提交
+    convert_legacy_results([(row.id, row.details_json, row.timestamp) for row in rows if row.details_json is not None])
+    db.session.flush()
+
+    users = {row.id: row.user_id for row in rows}
+    answers = db.session.query(
+        ExamAnswer.id, ExamAnswer.result_id, ExamAnswer.question_id, ExamAnswer.category,
+        ExamAnswer.user_ans, ExamAnswer.correct_ans, ExamAnswer.score, ExamAnswer.full_score
+    ).filter(ExamAnswer.result_id.in_(list(users)), ExamAnswer.question_id.in_(question_ids)).all()
+
+    pairs = []
+    refs = []
+    for answer in answers:
+        q = index.get(answer.question_id)
+        if q is None:
+            continue
+        pairs.append((q, answer.user_ans or ''))
+        refs.append((answer, q))
+
+    # 整块只需一次批量评分
+    scores = engine.score_batch(pairs)
+
+    mappings = []
+    dirty = set()
+    deltas = {}  # (user_id, category) -> [score 增量, max_score 增量]
+    wrong_deltas = {}  # (user_id, question_id) -> 错误次数增量
+    for (answer, q), score in zip(refs, scores):
+        old_score = answer.score or 0
+        old_full = answer.full_score or 0
+        if old_score == score and old_full == q.score and answer.correct_ans == q.answer:
+            continue
+        mappings.append({'id': answer.id, 'score': score, 'full_score': q.score, 'correct_ans': q.answer})
+        dirty.add(answer.result_id)
+
+        user_id = users.get(answer.result_id)
+        if user_id:
+            delta = deltas.setdefault((user_id, answer.category or DEFAULT_CATEGORY), [0, 0])
+            delta[0] += score - old_score
+            delta[1] += q.score - old_full
+            was_wrong = old_score < old_full
+            is_wrong = score < q.score
+            if was_wrong != is_wrong:
+                key = (user_id, answer.question_id)
+                wrong_deltas[key] = wrong_deltas.get(key, 0) + (1 if is_wrong else -1)
+    if mappings:
+        db.session.bulk_update_mappings(ExamAnswer, mappings)
+
+    if dirty:
+        # 总分由逐题得分在 SQL 中重新汇总
+        totals = db.session.query(
+            ExamAnswer.result_id, func.sum(ExamAnswer.score), func.sum(ExamAnswer.full_score)
+        ).filter(ExamAnswer.result_id.in_(list(dirty))).group_by(ExamAnswer.result_id).all()
+        old_totals = dict(
+            (r.id, (r.total_score or 0, r.max_score or 0)) for r in db.session.query(
+                ExamResult.id, ExamResult.total_score, ExamResult.max_score
+            ).filter(ExamResult.id.in_(list(dirty)))
+        )
+        db.session.bulk_update_mappings(ExamResult, [
+            {'id': result_id, 'total_score': total or 0, 'max_score': full or 0}
+            for result_id, total, full in totals
+        ])
+        counters.increment(
+            score_sum=sum((total or 0) - old_totals.get(result_id, (0, 0))[0] for result_id, total, _ in totals),
+            max_score_sum=sum((full or 0) - old_totals.get(result_id, (0, 0))[1] for result_id, _, full in totals)
+        )
+
+    for (user_id, category), (score_delta, max_delta) in deltas.items():
+        if not score_delta and not max_delta:
+            continue
+        UserCategoryStat.query.filter_by(user_id=user_id, category=category).update({
+            UserCategoryStat.total_score: UserCategoryStat.total_score + score_delta,
+            UserCategoryStat.total_max_score: UserCategoryStat.total_max_score + max_delta
+        }, synchronize_session=False)
+
+    for (user_id, question_id), wrong_delta in wrong_deltas.items():
+        if not wrong_delta:
+            continue
+        UserQuestionStat.query.filter_by(user_id=user_id, question_id=question_id).update({
+            UserQuestionStat.wrong: case((UserQuestionStat.wrong + wrong_delta < 0, 0), else_=UserQuestionStat.wrong + wrong_delta)
+        }, synchronize_session=False)
+
+    return len(dirty)
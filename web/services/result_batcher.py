@@ -0,0 +1,154 @@
+import threading
+import time
+
+
+class PendingResult:
+    """已提交到批处理的考试结果：落库完成后 event 置位，error 为空表示成功"""
+    __slots__ = ('record', 'callback', 'enqueued_at', 'event', 'error')
+
+    def __init__(self, record, callback=None):
+        self.record = record
+        self.callback = callback
+        self.enqueued_at = time.time()
+        self.event = threading.Event()
+        self.error = None
+
+    def wait(self, timeout=None):
+        """等待落库完成；失败或超时时抛出异常"""
+        if not self.event.wait(timeout):
+            raise TimeoutError(f"Result {self.record.get('id')} not persisted within {timeout} seconds")
+        if self.error:
+            raise RuntimeError(self.error)
+
+
+class ResultBatcher:
+    """
+    考试结果微批量落库：收集 max_wait 秒内（或最多 max_items 条）的评分结果，
+    在一个事务中批量写入，再逐条回调 / 唤醒等待方。
+    persist(records) 在应用上下文中执行，返回 {结果 id: 错误信息}（只包含失败的记录）。
+    """
+
+    def __init__(self, app, persist, max_items=50, max_wait=0.2):
+        self.app = app
+        self.persist = persist
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.items = []
+        self.batches = 0
+        self.persisted = 0
+        self.failed = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, record, callback=None):
+        pending = PendingResult(record, callback)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Result batcher is closed')
+            self.items.append(pending)
+            self._cond.notify()
+        return pending
+
+    def cancel(self, pending):
+        """
+        撤回尚未开始落库的结果：返回 True 表示已从队列移除（不会再写入数据库），
+        False 表示该结果已进入正在写入的批次，最终结果以落库完成为准。
+        """
+        with self._cond:
+            try:
+                self.items.remove(pending)
+            except ValueError:
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.items and not self._closed:
+                    self._cond.wait()
+                if not self.items:
+                    return
+                # 从第一条进入时开始计时，攒满一批或窗口到期即落库
+                deadline = self.items[0].enqueued_at + self.max_wait
+                while len(self.items) < self.max_items and not self._closed:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self.items[:self.max_items]
+                del self.items[:self.max_items]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with self.app.app_context():
+                errors = self.persist([p.record for p in batch]) or {}
+        except Exception as e:
+            print(f"[ResultBatcher] Batch of {len(batch)} failed: {e}")
+            errors = {p.record['id']: str(e) for p in batch}
+
+        self.batches += 1
+        self.failed += len(errors)
+        self.persisted += len(batch) - len(errors)
+
+        for pending in batch:
+            pending.error = errors.get(pending.record['id'])
+            pending.event.set()
+            if pending.callback:
+                try:
+                    pending.callback(pending.error)
+                except Exception as e:
+                    print(f"[ResultBatcher] Completion callback failed: {e}")
+
+    def stats(self):
+        with self._cond:
+            waiting = len(self.items)
+        return {
+            'waiting': waiting,
+            'batches': self.batches,
+            'persisted': self.persisted,
+            'failed': self.failed,
+            'avg_batch_size': round((self.persisted + self.failed) / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self, timeout=5):
+        """停止接收新结果，并把已收集的结果全部落库"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_default_batcher = None
+_default_lock = threading.Lock()
+_disabled_reason = None
+
+
+def disable_result_batcher(reason):
+    """
+    在本进程中关闭批量落库（如 Celery prefork 子进程：每个进程同一时间只执行一个任务，
+    没有可合并的并发结果，批处理只会让每份结果白白多等一个窗口）
+    """
+    global _disabled_reason
+    _disabled_reason = reason
+    print(f"[ResultBatcher] Disabled in this process: {reason}")
+
+
+def get_result_batcher(app, data_manager):
+    """本进程共享的批处理器（Celery worker 中各任务共用），未开启批量落库时返回 None"""
+    global _default_batcher
+    if not app.config.get('RESULT_BATCH_ENABLED') or _disabled_reason:
+        return None
+    if _default_batcher is None:
+        with _default_lock:
+            if _default_batcher is None:
+                _default_batcher = ResultBatcher(
+                    app,
+                    data_manager.save_exam_results_bulk,
+                    max_items=app.config.get('RESULT_BATCH_SIZE', 50),
+                    max_wait=app.config.get('RESULT_BATCH_WINDOW', 0.2)
+                )
+                print(f"[ResultBatcher] Enabled: up to {_default_batcher.max_items} results per {_default_batcher.max_wait}s")
+    return _default_batcher
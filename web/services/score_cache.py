@@ -0,0 +1,204 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 评分算法版本：C 端评分规则变化时递增，避免命中旧规则下缓存的分数
+SCORER_VERSION = 2
+REDIS_KEY_PREFIX = 'grading:scores:'
+REDIS_STATS_KEY = 'grading:score_cache:stats'
+# 与 grader_common.h 中的 MAX_STR_LEN 一致：C 端只比较前 256 个字符
+MAX_ANSWER_LEN = 256
+_ASCII_SPACE = ' \t\n\v\f\r'
+
+
+def normalize_answer(text):
+    """
+    与 grading.c 中 normalize_string 一致的标准化：
+    仅 ASCII 字母转小写、去除首尾空白、合并连续空白。
+    必须与 C 端完全一致，否则不同答案可能共用同一缓存键。
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    text = text[:MAX_ANSWER_LEN]
+    parts = []
+    word = []
+    for ch in text:
+        if ch in _ASCII_SPACE:
+            if word:
+                parts.append(''.join(word))
+                word = []
+        else:
+            word.append(ch.lower() if ch < '\x80' else ch)
+    if word:
+        parts.append(''.join(word))
+    return ' '.join(parts)
+
+
+def _answer_key(normalized):
+    # 长答案用摘要作键，控制内存和 Redis 字段大小
+    if len(normalized) <= 64:
+        return normalized
+    return 'sha1:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class ScoreCache:
+    """
+    答案评分缓存：(题目版本, 标准化答案) -> 得分。
+    - 进程内 LRU（有界）
+    - 可选 Redis 共享层：每题一个 hash，字段为 "题目版本:答案"，修改题目时整体删除
+    """
+
+    def __init__(self, max_entries=50000, redis_client=None, redis_ttl=86400):
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(question, user_ans):
+        return (question.id, question.version, _answer_key(normalize_answer(user_ans)))
+
+    def get_many(self, keys):
+        """批量查询，返回 {key: score}（仅包含命中的键）"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                score = self._local.get(key)
+                if score is not None:
+                    self._local.move_to_end(key)
+                    found[key] = score
+                else:
+                    missing.append(key)
+            self.local_hits += len(found)
+
+        redis_found = {}
+        if missing and self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for q_id, q_version, answer_key in missing:
+                    pipe.hget(self._redis_key(q_id), f"{SCORER_VERSION}:{q_version}:{answer_key}")
+                for key, value in zip(missing, pipe.execute()):
+                    if value is not None:
+                        redis_found[key] = int(value)
+            except Exception as e:
+                print(f"[ScoreCache] Redis lookup failed: {e}")
+
+        with self._lock:
+            self.redis_hits += len(redis_found)
+            self.misses += len(missing) - len(redis_found)
+            for key, score in redis_found.items():
+                self._store_local(key, score)
+        found.update(redis_found)
+        return found
+
+    def put_many(self, items):
+        """写入 {key: score}"""
+        if not items:
+            return
+        with self._lock:
+            for key, score in items.items():
+                self._store_local(key, score)
+
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for (q_id, q_version, answer_key), score in items.items():
+                    redis_key = self._redis_key(q_id)
+                    pipe.hset(redis_key, f"{SCORER_VERSION}:{q_version}:{answer_key}", score)
+                    pipe.expire(redis_key, self.redis_ttl)
+                pipe.execute()
+            except Exception as e:
+                print(f"[ScoreCache] Redis write failed: {e}")
+
+    def record_shared_stats(self, hits, misses):
+        """累计到 Redis 中的全局命中统计（供 Celery 模式的队列指标读取）"""
+        if not self.redis or (hits == 0 and misses == 0):
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(REDIS_STATS_KEY, 'hits', hits)
+            pipe.hincrby(REDIS_STATS_KEY, 'misses', misses)
+            pipe.execute()
+        except Exception as e:
+            print(f"[ScoreCache] Redis stats update failed: {e}")
+
+    def invalidate_question(self, q_id):
+        """题目答案或分值变化时调用：清除该题的全部缓存"""
+        with self._lock:
+            stale = [key for key in self._local if key[0] == q_id]
+            for key in stale:
+                del self._local[key]
+        if self.redis:
+            try:
+                self.redis.delete(self._redis_key(q_id))
+            except Exception as e:
+                print(f"[ScoreCache] Redis invalidation failed for question {q_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.local_hits + self.redis_hits + self.misses
+            hits = self.local_hits + self.redis_hits
+            return {
+                'entries': len(self._local),
+                'local_hits': self.local_hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _store_local(self, key, score):
+        self._local[key] = score
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    @staticmethod
+    def _redis_key(q_id):
+        return f"{REDIS_KEY_PREFIX}{q_id}"
+
+
+def get_shared_stats(redis_client):
+    """读取 Redis 中累计的全局命中统计"""
+    if not redis_client:
+        return None
+    try:
+        data = redis_client.hgetall(REDIS_STATS_KEY) or {}
+        hits = int(data.get('hits', 0))
+        misses = int(data.get('misses', 0))
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0
+        }
+    except Exception as e:
+        print(f"[ScoreCache] Redis stats read failed: {e}")
+        return None
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_score_cache(use_redis=True):
+    """获取本进程的评分缓存单例（配置来自 Config）"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                from web.config import Config
+                redis_client = None
+                if use_redis and getattr(Config, 'SCORE_CACHE_REDIS', True):
+                    from web.extensions import cache_redis
+                    redis_client = cache_redis
+                _default_cache = ScoreCache(
+                    max_entries=getattr(Config, 'SCORE_CACHE_SIZE', 50000),
+                    redis_client=redis_client,
+                    redis_ttl=getattr(Config, 'SCORE_CACHE_TTL', 86400)
+                )
+    return _default_cache
@@ -1,4 +1,3 @@
-from web.extensions import socketio
 from web.extensions import db, cache_redis
 from web.models import WorkshopDraft
 from flask_login import current_user
@@ -9,10 +8,12 @@ from celery import shared_task
 @shared_task(bind=True)
 def save_draft_task(self, user_id, title, content, description, draft_type, work_id=None):
     task_id = self.request.id
+    # 使用 worker 进程内共享的 Redis 消息队列发射器，worker 进程未初始化 Flask-SocketIO 时全局 socketio 无法推送
+    socket_emitter = resources.socket_emitter
     # 推送开始
     room_name = task_id
     try:
-        socketio.emit('draft_status', {'status': 'processing', 'percent': 10, 'task_id': task_id}, room=room_name)  # 房间推送
+        socket_emitter.emit('draft_status', {'status': 'processing', 'percent': 10, 'task_id': task_id}, room=room_name)  # 房间推送
     except Exception as e:
         print(f"[Celery] SocketIO emit failed: {e}")
     # 保存/更新草稿
@@ -50,10 +51,7 @@ def save_draft_task(self, user_id, title, content, description, draft_type, work
         # 保存后自动分析内容，推送统计数据
         stats = None
         try:
-            from web.services.analyzer import AnalyzerService
-            from web.config import Config
-            analyzer = AnalyzerService(Config.LIBANALYZER_PATH)
-            stats = analyzer.analyze(content)
+            stats = resources.analyzer.analyze(content)
         except Exception as e:
             print(f"[Celery] AnalyzerService failed: {e}")
             stats = None
@@ -61,7 +59,7 @@ def save_draft_task(self, user_id, title, content, description, draft_type, work
         # 推送完成，带上最新统计（无论成功与否 stats 字段都存在）
         try:
             msg = '草稿已保存' if stats and stats.get('ok') else (stats.get('msg') if stats and stats.get('msg') else '分析失败')
-            socketio.emit('draft_status', {
+            socket_emitter.emit('draft_status', {
                 'status': 'done',
                 'percent': 100,
                 'task_id': task_id,
@@ -75,20 +73,26 @@ def save_draft_task(self, user_id, title, content, description, draft_type, work
     except Exception as e:
         db.session.rollback()
         try:
-            socketio.emit('draft_status', {'status': 'error', 'percent': 100, 'task_id': task_id, 'msg': str(e)}, room=room_name)  # 房间推送
+            socket_emitter.emit('draft_status', {'status': 'error', 'percent': 100, 'task_id': task_id, 'msg': str(e)}, room=room_name)  # 房间推送
         except Exception as e2:
             print(f"[Celery] SocketIO emit failed: {e2}")
         return {'success': False, 'msg': str(e)}
-import ctypes
+import os
+import threading
+import time
 from datetime import datetime
 from celery import shared_task
+from web.services.grading_engine import GradingEngine
+from web.services.question_bank import resolve_exam_index
+from web.services.score_cache import get_score_cache
+from web.services.result_batcher import get_result_batcher
 
 # 延迟导入配置和依赖，防止循环依赖
 def get_config():
     from config import Config
     return Config
 
-def get_socket_emitter():
+def _create_socket_emitter():
     from flask_socketio import SocketIO
     Config = get_config()
     try:
@@ -100,30 +104,109 @@ def get_socket_emitter():
         print(f"[Celery] Warning: SocketIO emitter init failed: {e}")
         return None
 
-def get_lib():
+def _load_lib():
     Config = get_config()
     try:
         if Config.system_name == 'Windows':
             return None
-        lib = ctypes.CDLL(Config.DLL_PATH)
-        lib.calculate_score.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
-        lib.calculate_score.restype = ctypes.c_int
+        from web.services.grading import GradingService
+        lib = GradingService(Config.DLL_PATH)
+        if not lib.is_available():
+            return None
         print(f"[Celery] Successfully loaded DLL from {Config.DLL_PATH}")
         return lib
     except Exception as e:
         print(f"[Celery] Error loading DLL: {e}")
         return None
 
+def _create_data_manager():
+    from web.utils.data_manager import DataManager
+    return DataManager(get_config())
+
+def _load_analyzer():
+    from web.services.analyzer import AnalyzerService
+    return AnalyzerService(get_config().LIBANALYZER_PATH)
+
+_UNSET = object()
+
+class WorkerResources:
+    """
+    Celery worker 进程内共享的资源（评分库、SocketIO 发射器、DataManager、文本分析库），
+    每个进程只构建一次，所有任务复用。worker 启动时由 warm_up() 预先构建。
+    """
+    FACTORIES = {
+        'lib': _load_lib,
+        'socket_emitter': _create_socket_emitter,
+        'data_manager': _create_data_manager,
+        'analyzer': _load_analyzer
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self.ready = False
+
+    def _get(self, name):
+        value = self._values.get(name, _UNSET)
+        if value is _UNSET:
+            with self._lock:
+                value = self._values.get(name, _UNSET)
+                if value is _UNSET:
+                    value = self.FACTORIES[name]()
+                    self._values[name] = value
+        return value
+
+    @property
+    def lib(self):
+        return self._get('lib')
+
+    @property
+    def socket_emitter(self):
+        return self._get('socket_emitter')
+
+    @property
+    def data_manager(self):
+        return self._get('data_manager')
+
+    @property
+    def analyzer(self):
+        return self._get('analyzer')
+
+    def warm_up(self):
+        start = time.time()
+        for name in self.FACTORIES:
+            try:
+                self._get(name)
+            except Exception as e:
+                print(f"[Celery] Warmup of {name} failed: {e}")
+        get_score_cache()
+        self.ready = True
+        print(f"[Celery] Worker resources ready in {time.time() - start:.2f}s (pid {os.getpid()})")
+
+    def reset(self):
+        """prefork 子进程中调用：丢弃从父进程继承的连接，重新构建"""
+        with self._lock:
+            self._values.clear()
+            self.ready = False
+
+resources = WorkerResources()
+
+def get_socket_emitter():
+    return resources.socket_emitter
+
+def get_lib():
+    return resources.lib
+
 @shared_task(bind=True)
 def grade_exam_task(self, user_id, data):
     """
     Celery task to grade exam.
-    data: { 'ids': [], 'user_answers': {}, 'all_questions': [] }
+    data: { 'ids': [], 'user_answers': {}, 'bank_version': '...', 'category': '...' }
+    题库本身不经过 broker，按 bank_version 从 Redis 快照加载。
     """
     Config = get_config()
-    lib = get_lib()
-    socket_emitter = get_socket_emitter()
-    from utils.data_manager import DataManager
+    lib = resources.lib
+    socket_emitter = resources.socket_emitter
     task_id = self.request.id
 
     # Notify start
@@ -132,82 +215,28 @@ def grade_exam_task(self, user_id, data):
             socket_emitter.emit('status', {'status': 'processing', 'percent': 10}, room=task_id)
         except: pass
 
-    # Initialize DataManager (lightweight)
-    data_manager = DataManager(Config)
+    data_manager = resources.data_manager
 
     ids = data['ids']
     user_answers_map = data['user_answers']
-    all_questions = data['all_questions']
-
-    total_score = 0
-    results = []
-    exam_questions = []
-    total_items = len(ids)
-
-    for i, q_id in enumerate(ids):
-        q = next((item for item in all_questions if item['id'] == q_id), None)
-        if not q: continue
-        
-        exam_questions.append(q)
-        user_ans = user_answers_map.get(str(i), '')
-        
-        # Grading logic
-        valid_answers = q['answer'].replace('；', ';').split(';')
-        valid_answers = [ans.strip() for ans in valid_answers if ans.strip()]
-        if not valid_answers:
-            valid_answers = [q['answer']]
-
-        score = 0
-        for correct_ans in valid_answers:
-            current_score = 0
-            if lib:
-                try:
-                    # Encoding handling
-                    try:
-                        b_user = user_ans.encode('gbk')
-                        b_correct = correct_ans.encode('gbk')
-                    except:
-                        b_user = user_ans.encode('utf-8')
-                        b_correct = correct_ans.encode('utf-8')
-                    current_score = lib.calculate_score(b_user, b_correct, q['score'])
-                except Exception as e:
-                    print(f"Error calling DLL: {e}")
-                    # Fallback
-                    current_score = q['score'] if user_ans.strip().lower() == correct_ans.strip().lower() else 0
-            else:
-                current_score = q['score'] if user_ans.strip().lower() == correct_ans.strip().lower() else 0
-            
-            if current_score > score:
-                score = current_score
-        
-        total_score += score
-        results.append({
-            'id': q['id'],
-            'category': q.get('category', '默认题集'),
-            'question': q['content'],
-            'user_ans': user_ans,
-            'correct_ans': q['answer'],
-            'score': score,
-            'full_score': q['score']
-        })
-        
+
+    def report_progress(i, total_items):
         # Emit progress update every 5 items or 20%
         if socket_emitter and total_items > 0 and (i % 5 == 0 or i == total_items - 1):
-             percent = 10 + int((i + 1) / total_items * 80) # 10% to 90%
-             try:
-                 socket_emitter.emit('status', {'status': 'processing', 'percent': percent}, room=task_id)
-             except: pass
-        
-    max_score = sum(q['score'] for q in exam_questions)
-    
-    final_result = {
-        'total_score': total_score,
-        'max_score': max_score,
-        'details': results
-    }
+            percent = 10 + int((i + 1) / total_items * 80) # 10% to 90%
+            try:
+                socket_emitter.emit('status', {'status': 'processing', 'percent': percent}, room=task_id)
+            except: pass
+
+    engine = GradingEngine(lib, score_cache=get_score_cache())
+    index = resolve_exam_index(data, fallback_loader=data_manager.load_questions)
+    final_result = engine.grade(ids, user_answers_map, index, progress=report_progress)
+    total_score = final_result['total_score']
+    max_score = final_result['max_score']
+    results = final_result['details']
 
     # Save to Database
-    # We need to reconstruct the 'exam_record' format expected by save_exam_result
+    # We need to reconstruct the 'exam_record' format expected by record_exam_result
     exam_category = data.get('category', '默认题集')
     exam_record = {
         'id': self.request.id, # Use Celery Task ID as Exam ID
@@ -218,8 +247,26 @@ def grade_exam_task(self, user_id, data):
         'category': exam_category
     }
     # Save exam result and update stats
-    data_manager.save_exam_result(exam_record, user_id=user_id, category=exam_category)
-    data_manager.update_user_stats(user_id, results)
+    batcher = get_result_batcher(current_app._get_current_object(), data_manager)
+    if batcher:
+        # 与同一 worker 内并发的其他评分任务合并为一个事务落库
+        pending = batcher.submit({**exam_record, 'user_id': user_id})
+        try:
+            pending.wait(timeout=Config.GRADING_TIMEOUT)
+        except TimeoutError:
+            if batcher.cancel(pending):
+                # 尚未开始写入：撤回后按失败处理，不会出现任务失败但结果已入库
+                raise
+            # 已在写入中的批次里：结果仍会落库，提示前端稍后在历史记录中查看，而不是报告失败
+            print(f"[Task] Result {task_id} still being saved after {Config.GRADING_TIMEOUT}s, reporting pending")
+            if socket_emitter:
+                try:
+                    socket_emitter.emit('status', {'status': 'pending', 'percent': 95, 'result_url': f'/history/view/{task_id}'}, room=task_id)
+                except Exception as e:
+                    print(f"Socket emit error: {e}")
+            return {**_result_summary(total_score, max_score, results), 'pending': True}
+    else:
+        data_manager.record_exam_result(exam_record, user_id=user_id, category=exam_category)
     
     # Notify completion
     if socket_emitter:
@@ -229,4 +276,22 @@ def grade_exam_task(self, user_id, data):
         except Exception as e:
             print(f"Socket emit error: {e}")
 
-    return final_result
+    return _result_summary(total_score, max_score, results)
+
+
+def _result_summary(total_score, max_score, results):
+    # 结果后端只保存摘要（完整详情已入库），避免题干/答案再次写回 Redis
+    return {
+        'total_score': total_score,
+        'max_score': max_score,
+        'details': [
+            {'id': r['id'], 'category': r['category'], 'score': r['score'], 'full_score': r['full_score']}
+            for r in results
+        ]
+    }
+
+@shared_task(bind=True)
+def regrade_task(self, job_id):
+    """批量重评考试记录（题目答案或分值修改后由管理员触发），中断后可重新分发续跑"""
+    from web.services.regrade import run_regrade_job
+    return run_regrade_job(job_id, lib=resources.lib, emitter=resources.socket_emitter)
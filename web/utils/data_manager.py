@@ -2,7 +2,14 @@ import os
 import json
 import shutil
 from datetime import datetime, timedelta
-from web.models import db, Question, ExamResult, User, UserCategoryStat, UserPermission, StardustHistory
+from web.models import db, Question, ExamResult, ExamAnswer, User, UserCategoryStat, UserQuestionStat, UserPermission, StardustHistory
+from web.services.answer_backfill import parse_timestamp
+from web.services import counters
+from web.services.score_cache import get_score_cache
+from flask import current_app
+from web.services.question_search import ensure_search_index, match_filter, search_questions
+from web.services.question_exporter import export_questions_file, get_question_exporter
+from web.services.question_bank import bump_bank_version, get_cached_catalog, get_cached_questions
 
 class DataManager:
     def __init__(self, config):
@@ -22,25 +29,21 @@ class DataManager:
 
     def export_questions_to_txt(self):
         """
-        导出所有题目到 questions.txt，格式：题目|答案|分值|图片文件名|类别
+        立即导出所有题目到 questions.txt，格式：题目|答案|分值|图片文件名|类别
+        （分块读取、临时文件 + 原子替换，内容未变化时不改写文件）
         """
-        questions = Question.query.order_by(Question.id).all()
-        lines = []
-        for q in questions:
-            content = q.content.replace('\n', '[NEWLINE]') if q.content else ''
-            answer = q.answer if q.answer else ''
-            score = str(q.score) if q.score is not None else '0'
-            image = q.image if q.image else ''
-            category = q.category if q.category else '默认题集'
-            line = f"{content}|{answer}|{score}|{image}|{category}"
-            lines.append(line)
         data_file = getattr(self.config, 'DATA_FILE', 'questions.txt')
         try:
-            with open(data_file, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(lines))
-            print(f"[DataManager] 已导出所有题目到 {data_file}")
+            _, written = export_questions_file(data_file)
+            if written:
+                print(f"[DataManager] 已导出所有题目到 {data_file}")
         except Exception as e:
             print(f"[DataManager] 导出题目失败: {e}")
+
+    def schedule_export(self):
+        """题目变更后调用：由后台导出器合并短时间内的多次变更再导出"""
+        get_question_exporter(current_app._get_current_object()).schedule()
+
     def save_all_questions(self, questions):
         # This is hard to map to DB efficiently without IDs.
         # We will avoid using this in the new app.py
@@ -49,24 +52,26 @@ class DataManager:
     def get_questions_paginated(self, page=1, per_page=10, search=None, category=None):
         query = Question.query
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (Question.content.like(search_term)) | 
-                (Question.category.like(search_term))
-            )
+            # 走全文搜索索引（PostgreSQL pg_trgm / SQLite FTS5），不支持时回退为 LIKE
+            query = query.filter(match_filter(search))
         if category and category != 'all':
             query = query.filter_by(category=category)
         
         return query.order_by(Question.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
 
+    def search_questions(self, search, category=None, owner_id=None, per_page=10, cursor=None):
+        """按相关度排序的题目搜索，返回 (题目列表, 下一页游标)"""
+        return search_questions(search, category=category, owner_id=owner_id, limit=per_page, cursor=cursor)
+
     def get_system_stats(self):
-        total_questions = Question.query.count()
-        total_exams = ExamResult.query.count()
+        # 读取写入时维护的全局计数器（一次主键查询），不扫描题目与考试记录表
+        values = counters.read_counters()
+        total_questions = values['questions']
+        total_exams = values['exams']
         
         # Calculate average accuracy
-        from sqlalchemy import func
-        total_score_sum = db.session.query(func.sum(ExamResult.total_score)).scalar() or 0
-        total_max_sum = db.session.query(func.sum(ExamResult.max_score)).scalar() or 0
+        total_score_sum = values['score_sum']
+        total_max_sum = values['max_score_sum']
         
         if total_max_sum > 0:
             avg_accuracy = round((total_score_sum / total_max_sum) * 100, 1)
@@ -80,15 +85,42 @@ class DataManager:
         }
 
     def get_categories(self):
-        # Use distinct query
-        categories = db.session.query(Question.category).distinct().all()
-        return sorted([c[0] for c in categories if c[0]])
+        return sorted(c['name'] for c in self.get_category_catalog() if c['name'])
+
+    def get_category_catalog(self):
+        """
+        类别目录（随题库版本缓存）：[{'name', 'type', 'owner_id', 'count', 'total_score'}, ...]
+        type 为 personal 表示该类别全部是个人题目；owner_id 仅在所有题目属于同一用户时有值。
+        """
+        return get_cached_catalog(self._query_category_catalog)
+
+    def _query_category_catalog(self):
+        from sqlalchemy import func
+        rows = db.session.query(
+            Question.category,
+            func.count(Question.id),
+            func.coalesce(func.sum(Question.score), 0),
+            func.min(func.coalesce(Question.type, 'public')),
+            func.max(func.coalesce(Question.type, 'public')),
+            func.min(Question.owner_id),
+            func.max(Question.owner_id)
+        ).group_by(Question.category).order_by(Question.category).all()
+        catalog = []
+        for name, count, total_score, min_type, max_type, min_owner, max_owner in rows:
+            catalog.append({
+                'name': name or '默认题集',
+                'type': 'personal' if min_type == max_type == 'personal' else 'public',
+                'owner_id': min_owner if min_owner == max_owner else None,
+                'count': count,
+                'total_score': int(total_score)
+            })
+        return catalog
 
     def load_results(self, user_id=None):
         query = ExamResult.query
         if user_id:
             query = query.filter_by(user_id=user_id)
-        results = query.order_by(ExamResult.timestamp.desc()).all()
+        results = query.order_by(ExamResult.taken_at.desc().nullslast(), ExamResult.id.desc()).all()
         # 兼容旧数据: 若无 category 字段，尝试从 details 推断
         for r in results:
             if not hasattr(r, 'category') or not r.category:
@@ -101,80 +133,451 @@ class DataManager:
                         r.category = '默认题集'
         return [r.to_dict() for r in results]
 
+    def query_history(self, user_id=None, search=None, start_date=None, end_date=None, category=None,
+                      per_page=20, cursor=None):
+        """
+        历史记录摘要（不含 details），筛选条件全部在 SQL 中执行，按 (taken_at, id) 倒序游标分页。
+        尚未回填 taken_at 的旧记录排在最后（按 id 倒序），游标时间部分为空表示已进入这一段。
+        search 匹配用户名或时间；start_date / end_date 为 YYYY-MM-DD（包含当天）。
+        返回 (记录列表, 下一页游标 或 None)。
+        """
+        from sqlalchemy import or_, and_
+        query = self._history_query(user_id, search, start_date, end_date, category)
+        position = cursor.rsplit('|', 1) if cursor and '|' in cursor else None
+        in_null_segment = bool(position) and position[0] == ''
+        last_at = parse_timestamp(position[0]) if position else None
+
+        # 两段分别查询，每段都能按索引顺序读取：先 taken_at 非空的记录，不足一页再接 taken_at 为空的记录
+        rows = []
+        if not in_null_segment:
+            dated = query.filter(ExamResult.taken_at.isnot(None))
+            if last_at:
+                dated = dated.filter(or_(
+                    ExamResult.taken_at < last_at,
+                    and_(ExamResult.taken_at == last_at, ExamResult.id < position[1])
+                ))
+            rows = dated.order_by(ExamResult.taken_at.desc(), ExamResult.id.desc()).limit(per_page + 1).all()
+        if len(rows) <= per_page:
+            undated = query.filter(ExamResult.taken_at.is_(None))
+            if in_null_segment:
+                undated = undated.filter(ExamResult.id < position[1])
+            rows += undated.order_by(ExamResult.id.desc()).limit(per_page + 1 - len(rows)).all()
+
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            last = rows[-1]
+            next_cursor = f"{last.taken_at.strftime('%Y-%m-%d %H:%M:%S') if last.taken_at else ''}|{last.id}"
+        results = [{
+            'id': r.id,
+            'user_id': r.user_id,
+            'username': r.username or 'Unknown',
+            'level_info': User.level_for(r.stardust) if r.username else ('', ''),
+            'timestamp': r.timestamp,
+            'total_score': r.total_score,
+            'max_score': r.max_score,
+            'category': r.category or '默认题集'
+        } for r in rows]
+        return results, next_cursor
+
+    def iter_history_rows(self, user_id=None, search=None, start_date=None, end_date=None, category=None,
+                          chunk_size=1000):
+        """
+        按时间倒序逐行产出历史记录摘要（导出用）：只查询所需列，
+        通过服务端游标（yield_per + stream_results）分块读取，不把全部记录读入内存。
+        尚未回填 taken_at 的旧记录排在最后。
+        """
+        query = self._history_query(user_id, search, start_date, end_date, category)
+        dated = query.filter(ExamResult.taken_at.isnot(None)).order_by(ExamResult.taken_at.desc(), ExamResult.id.desc())
+        undated = query.filter(ExamResult.taken_at.is_(None)).order_by(ExamResult.id.desc())
+        for segment in (dated, undated):
+            yield from segment.execution_options(stream_results=True).yield_per(chunk_size)
+
+    def _history_query(self, user_id, search, start_date, end_date, category):
+        """历史记录摘要查询（不含 details），history 页面与导出共用同一组筛选条件"""
+        from sqlalchemy import or_
+        query = db.session.query(
+            ExamResult.id, ExamResult.user_id, ExamResult.timestamp, ExamResult.taken_at, ExamResult.total_score,
+            ExamResult.max_score, ExamResult.category, User.username, User.stardust
+        ).outerjoin(User, User.id == ExamResult.user_id)
+        if user_id:
+            query = query.filter(ExamResult.user_id == user_id)
+        if search:
+            pattern = f"%{search}%"
+            query = query.filter(or_(User.username.ilike(pattern), ExamResult.timestamp.like(pattern)))
+        # start_date / end_date 为 YYYY-MM-DD，结束日期包含当天
+        start_at = parse_timestamp(f"{start_date} 00:00:00") if start_date else None
+        end_at = parse_timestamp(f"{end_date} 23:59:59") if end_date else None
+        if start_at:
+            query = query.filter(ExamResult.taken_at >= start_at)
+        if end_at:
+            query = query.filter(ExamResult.taken_at <= end_at)
+        if category:
+            query = query.filter(ExamResult.category == category)
+        return query
+
     def save_exam_result(self, result_dict, user_id=None, category='默认题集'):
+        """保存单份考试结果（兼容旧调用）：只写入考试记录与星尘奖励，类别统计由 update_user_stats 负责"""
         print(f"[DataManager] Saving exam result: {result_dict['id']} for user: {user_id}")
+        try:
+            result = self._add_exam_result(result_dict, user_id, category)
+            if user_id:
+                self._award_stardust_many([(user_id, category, result_dict['total_score'], result_dict['max_score'])])
+            self._count_exam_results([result])
+            db.session.commit()
+            print(f"[DataManager] Successfully saved result {result_dict['id']}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[DataManager] Error saving result: {e}")
+            raise e
+
+    def record_exam_result(self, result_dict, user_id=None, category='默认题集'):
+        """
+        保存考试结果的完整落库单元：考试记录、星尘奖励、类别统计（upsert）与权限在同一事务中提交。
+        替代 save_exam_result + update_user_stats 的两次提交。
+        """
+        try:
+            result = self._add_exam_result(result_dict, user_id, category)
+            if user_id:
+                self._award_stardust_many([(user_id, category, result_dict['total_score'], result_dict['max_score'])])
+                deltas = self._category_deltas(user_id, result_dict['details'])
+                self._upsert_category_stats(deltas)
+                self._upsert_question_stats(self._question_deltas(user_id, result_dict['details']), parse_timestamp(result_dict['timestamp']))
+                self._grant_qualified_permissions(deltas.keys())
+            self._count_exam_results([result])
+            db.session.commit()
+            print(f"[DataManager] Recorded result {result_dict['id']} for user: {user_id}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[DataManager] Error recording result {result_dict['id']}: {e}")
+            raise
+
+    def _add_exam_result(self, result_dict, user_id, category):
         # 优先 result_dict['category']，否则用参数
         cat = result_dict.get('category') or category or '默认题集'
         result = ExamResult(
             id=result_dict['id'],
             timestamp=result_dict['timestamp'],
+            taken_at=parse_timestamp(result_dict['timestamp']),
             total_score=result_dict['total_score'],
             max_score=result_dict['max_score'],
             user_id=user_id,
             category=cat
         )
         result.details = result_dict['details']
-        try:
-            db.session.add(result)
-            db.session.commit()
-            print(f"[DataManager] Successfully saved result {result_dict['id']}")
-            
-            # Award Stardust
-            if user_id:
-                score = result_dict['total_score']
-                max_s = result_dict['max_score']
-                self.award_stardust(user_id, category, score, max_s)
-                
-        except Exception as e:
-            db.session.rollback()
-            print(f"[DataManager] Error saving result: {e}")
-            raise e
+        db.session.add(result)
+        return result
 
-    def award_stardust(self, user_id, category, score, max_score):
-        if max_score <= 0: return
+    @staticmethod
+    def _count_exam_results(results, sign=1):
+        """
+        累加考试计数器（不提交）。计数器是全局热点行，UPDATE 后行锁一直持有到提交，
+        所以调用方应在其他写入完成后、提交前最后调用。results 为 ExamResult 或结果字典。
+        """
+        scores = [(r['total_score'], r['max_score']) if isinstance(r, dict) else (r.total_score, r.max_score) for r in results]
+        counters.increment(
+            exams=sign * len(scores),
+            score_sum=sign * sum(s or 0 for s, _ in scores),
+            max_score_sum=sign * sum(m or 0 for _, m in scores)
+        )
+
+    @staticmethod
+    def _stardust_reward(score, max_score):
+        if max_score <= 0: return 0
         percentage = (score / max_score) * 100
         
         # Determine reward tier
-        reward = 0
         if percentage >= 90: # Excellent
-            reward = 15
+            return 15
         elif percentage >= 80: # Good
-            reward = 10
+            return 10
         elif percentage >= 60: # Qualified
-            reward = 5
-            
-        if reward == 0:
+            return 5
+        return 0
+
+    def award_stardust(self, user_id, category, score, max_score):
+        try:
+            self._award_stardust_many([(user_id, category, score, max_score)])
+            db.session.commit()
+        except Exception as e:
+            print(f"[Stardust] Error: {e}")
+            db.session.rollback()
+
+    def _award_stardust_many(self, entries):
+        """
+        发放星尘（不提交）：entries 为 [(user_id, category, score, max_score), ...]。
+        同一用户同一类别 24 小时内只奖励一次（批内也去重），余额用 UPDATE stardust = stardust + n 原子递增。
+        """
+        entries = [(u, c, self._stardust_reward(s, m)) for u, c, s, m in entries if u]
+        entries = [e for e in entries if e[2] > 0]
+        if not entries:
             return
-            
-        # Check 24h limit for this category
+
+        # 先按 id 顺序锁住相关用户行再检查 24 小时记录：同一用户并发提交的事务在这里排队，
+        # 后到的事务一定能看到先到事务已提交的奖励记录，不会重复发放（固定加锁顺序避免死锁）
+        user_ids = sorted({e[0] for e in entries})
+        db.session.query(User.id).filter(User.id.in_(user_ids)).order_by(User.id).with_for_update().all()
+
         last_24h = datetime.utcnow() - timedelta(hours=24)
-        recent_entry = StardustHistory.query.filter(
-            StardustHistory.user_id == user_id,
-            StardustHistory.category == category,
-            StardustHistory.created_at >= last_24h
-        ).first()
-        
-        if recent_entry:
-            print(f"[Stardust] User {user_id} already rewarded for {category} in last 24h")
+        rewarded = {
+            (h.user_id, h.category) for h in db.session.query(StardustHistory.user_id, StardustHistory.category).filter(
+                StardustHistory.user_id.in_(user_ids),
+                StardustHistory.created_at >= last_24h
+            ).all()
+        }
+        for user_id, category, reward in entries:
+            if (user_id, category) in rewarded:
+                print(f"[Stardust] User {user_id} already rewarded for {category} in last 24h")
+                continue
+            rewarded.add((user_id, category))
+            updated = User.query.filter_by(id=user_id).update(
+                {User.stardust: db.func.coalesce(User.stardust, 0) + reward}, synchronize_session=False
+            )
+            if updated:
+                db.session.add(StardustHistory(user_id=user_id, category=category, amount=reward, reason='exam_reward'))
+                print(f"[Stardust] User {user_id} earned {reward} stardust (Cat: {category})")
+
+    @staticmethod
+    def _category_deltas(user_id, details, deltas=None):
+        """按类别汇总单份试卷：{(user_id, category): [次数, 得分, 满分]}"""
+        deltas = {} if deltas is None else deltas
+        per_exam = {}
+        for d in details:
+            cat = d.get('category', '默认题集')
+            agg = per_exam.setdefault(cat, [0, 0])
+            agg[0] += d.get('score', 0)
+            agg[1] += d.get('full_score', 0)
+        for cat, (score, max_score) in per_exam.items():
+            delta = deltas.setdefault((user_id, cat), [0, 0, 0])
+            delta[0] += 1
+            delta[1] += score
+            delta[2] += max_score
+        return deltas
+
+    def _upsert_category_stats(self, deltas):
+        """
+        累加类别统计（不提交）：PostgreSQL / SQLite(>=3.24) 使用
+        INSERT ... ON CONFLICT (user_id, category) DO UPDATE SET total_score = total_score + excluded.total_score，
+        并发的评分任务不会互相覆盖；其他数据库回退为加行锁的读-改-写。
+        """
+        if not deltas:
             return
-            
-        # Award
+        insert = self._upsert_insert()
+        if insert is None:
+            for (user_id, cat), (attempts, score, max_score) in deltas.items():
+                stat = UserCategoryStat.query.filter_by(user_id=user_id, category=cat).with_for_update().first()
+                if not stat:
+                    stat = UserCategoryStat(user_id=user_id, category=cat, total_attempts=0, total_score=0, total_max_score=0)
+                    db.session.add(stat)
+                stat.total_attempts = (stat.total_attempts or 0) + attempts
+                stat.total_score = (stat.total_score or 0) + score
+                stat.total_max_score = (stat.total_max_score or 0) + max_score
+            db.session.flush()
+            return
+
+        coalesce = db.func.coalesce
+        for (user_id, cat), (attempts, score, max_score) in deltas.items():
+            stmt = insert(UserCategoryStat).values(
+                user_id=user_id, category=cat,
+                total_attempts=attempts, total_score=score, total_max_score=max_score
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'category'],
+                set_={
+                    'total_attempts': coalesce(UserCategoryStat.total_attempts, 0) + stmt.excluded.total_attempts,
+                    'total_score': coalesce(UserCategoryStat.total_score, 0) + stmt.excluded.total_score,
+                    'total_max_score': coalesce(UserCategoryStat.total_max_score, 0) + stmt.excluded.total_max_score
+                }
+            )
+            db.session.execute(stmt)
+
+    @staticmethod
+    def _question_deltas(user_id, details, deltas=None, sign=1):
+        """按题目汇总作答：{(user_id, question_id): [作答次数, 错误次数, 题干]}，sign=-1 用于撤销"""
+        deltas = {} if deltas is None else deltas
+        for d in details:
+            q_id = d.get('id')
+            if q_id is None:
+                continue
+            delta = deltas.setdefault((user_id, q_id), [0, 0, None])
+            delta[0] += sign
+            if d.get('score', 0) < d.get('full_score', 0):
+                delta[1] += sign
+            delta[2] = d.get('question') or delta[2]
+        return deltas
+
+    def _upsert_question_stats(self, deltas, attempted_at=None):
+        """
+        累加题目统计（不提交），与 _upsert_category_stats 相同的 upsert / 行锁回退策略。
+        计数不会减到 0 以下；只有撤销（作答、错误增量都 <= 0）的键只 UPDATE 已有行，不插入空统计行。
+        """
+        if not deltas:
+            return
+        from sqlalchemy import case
+        attempted_at = attempted_at or datetime.now()
+        coalesce = db.func.coalesce
+
+        def clamped(column, delta):
+            value = coalesce(column, 0) + delta
+            return case((value < 0, 0), else_=value)
+
+        increments = {}
+        for (user_id, q_id), delta in deltas.items():
+            attempts, wrong, _ = delta
+            if attempts > 0 or wrong > 0:
+                increments[(user_id, q_id)] = delta
+                continue
+            UserQuestionStat.query.filter_by(user_id=user_id, question_id=q_id).update({
+                UserQuestionStat.attempts: clamped(UserQuestionStat.attempts, attempts),
+                UserQuestionStat.wrong: clamped(UserQuestionStat.wrong, wrong)
+            }, synchronize_session=False)
+        if not increments:
+            return
+
+        insert = self._upsert_insert()
+        if insert is None:
+            for (user_id, q_id), (attempts, wrong, question) in increments.items():
+                stat = UserQuestionStat.query.filter_by(user_id=user_id, question_id=q_id).with_for_update().first()
+                if not stat:
+                    stat = UserQuestionStat(user_id=user_id, question_id=q_id, attempts=0, wrong=0)
+                    db.session.add(stat)
+                stat.attempts = max(0, (stat.attempts or 0) + attempts)
+                stat.wrong = max(0, (stat.wrong or 0) + wrong)
+                if attempts > 0:
+                    stat.question = question or stat.question
+                    stat.last_attempt_at = attempted_at
+            db.session.flush()
+            return
+
+        for (user_id, q_id), (attempts, wrong, question) in increments.items():
+            stmt = insert(UserQuestionStat).values(
+                user_id=user_id, question_id=q_id, question=question,
+                attempts=max(0, attempts), wrong=max(0, wrong),
+                last_attempt_at=attempted_at if attempts > 0 else None
+            )
+            set_ = {
+                'attempts': clamped(UserQuestionStat.attempts, attempts),
+                'wrong': clamped(UserQuestionStat.wrong, wrong)
+            }
+            if attempts > 0:
+                set_['question'] = coalesce(stmt.excluded.question, UserQuestionStat.question)
+                set_['last_attempt_at'] = stmt.excluded.last_attempt_at
+            db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'question_id'], set_=set_))
+
+    def rebuild_question_stats(self):
+        """根据 exam_answer 全量重建题目统计（首次部署或修复数据时使用），返回统计行数"""
+        from sqlalchemy import func, case
+        UserQuestionStat.query.delete(synchronize_session=False)
+        rows = db.session.query(
+            ExamResult.user_id, ExamAnswer.question_id,
+            func.count(ExamAnswer.id),
+            func.sum(case((ExamAnswer.score < ExamAnswer.full_score, 1), else_=0)),
+            func.max(ExamAnswer.question),
+            func.max(ExamResult.taken_at)
+        ).join(ExamResult, ExamResult.id == ExamAnswer.result_id)\
+            .filter(ExamResult.user_id.isnot(None), ExamAnswer.question_id.isnot(None))\
+            .group_by(ExamResult.user_id, ExamAnswer.question_id)
+        mappings = [{
+            'user_id': user_id, 'question_id': q_id, 'attempts': attempts, 'wrong': wrong or 0,
+            'question': question, 'last_attempt_at': last_at
+        } for user_id, q_id, attempts, wrong, question, last_at in rows]
+        db.session.bulk_insert_mappings(UserQuestionStat, mappings)
+        db.session.commit()
+        return len(mappings)
+
+    @staticmethod
+    def _upsert_insert():
+        """返回支持 on_conflict_do_update 的 insert 构造函数，不支持时返回 None"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            return insert
+        if dialect == 'sqlite':
+            import sqlite3
+            if sqlite3.sqlite_version_info >= (3, 24, 0):
+                from sqlalchemy.dialects.sqlite import insert
+                return insert
+        return None
+
+    def _grant_qualified_permissions(self, keys):
+        """统计更新后检查授权规则（正确率 >= 80% 且至少 3 次），不提交"""
+        keys = set(keys)
+        if not keys:
+            return
+        user_ids = {user_id for user_id, _ in keys}
+        categories = {cat for _, cat in keys}
+        stats = UserCategoryStat.query.filter(
+            UserCategoryStat.user_id.in_(user_ids),
+            UserCategoryStat.category.in_(categories)
+        ).populate_existing().all()
+        granted = {
+            (p.user_id, p.category) for p in db.session.query(UserPermission.user_id, UserPermission.category).filter(
+                UserPermission.user_id.in_(user_ids),
+                UserPermission.category.in_(categories)
+            ).all()
+        }
+        for stat in stats:
+            key = (stat.user_id, stat.category)
+            if key not in keys or key in granted or not stat.total_max_score:
+                continue
+            if stat.total_score / stat.total_max_score >= 0.8 and stat.total_attempts >= 3:
+                db.session.add(UserPermission(user_id=stat.user_id, category=stat.category))
+                granted.add(key)
+
+    def save_exam_results_bulk(self, records):
+        """
+        批量保存考试结果（ResultBatcher 调用）：考试记录、星尘奖励、类别统计与权限在一个事务中写入。
+        records: [{'id', 'user_id', 'timestamp', 'total_score', 'max_score', 'details', 'category'}, ...]
+        返回 {结果 id: 错误信息}；整批失败时逐条回退到 record_exam_result，单条坏数据不影响其他结果。
+        """
         try:
-            user = User.query.get(user_id)
-            if user:
-                user.stardust = (user.stardust or 0) + reward
-                history = StardustHistory(
-                    user_id=user_id,
-                    category=category,
-                    amount=reward,
-                    reason='exam_reward'
-                )
-                db.session.add(history)
-                db.session.commit()
-                print(f"[Stardust] User {user_id} earned {reward} stardust (Cat: {category})")
+            self._save_exam_results_bulk(records)
+            print(f"[DataManager] Bulk saved {len(records)} exam results")
+            return {}
         except Exception as e:
-            print(f"[Stardust] Error: {e}")
             db.session.rollback()
+            print(f"[DataManager] Bulk save failed ({e}), retrying one by one")
+
+        errors = {}
+        for record in records:
+            try:
+                self.record_exam_result(record, user_id=record.get('user_id'), category=record.get('category'))
+            except Exception as e:
+                errors[record['id']] = str(e)
+        return errors
+
+    def _save_exam_results_bulk(self, records):
+        db.session.bulk_insert_mappings(ExamResult, [{
+            'id': r['id'],
+            'user_id': r.get('user_id'),
+            'timestamp': r['timestamp'],
+            'taken_at': parse_timestamp(r['timestamp']),
+            'total_score': r['total_score'],
+            'max_score': r['max_score'],
+            'category': r.get('category') or '默认题集'
+        } for r in records])
+        db.session.bulk_insert_mappings(ExamAnswer, [
+            ExamAnswer.mapping(d, i, r['id'])
+            for r in records for i, d in enumerate(r['details']) if isinstance(d, dict)
+        ])
+
+        self._award_stardust_many([
+            (r.get('user_id'), r.get('category') or '默认题集', r['total_score'], r['max_score']) for r in records
+        ])
+
+        # 类别 / 题目统计：先在内存中按 (用户, 类别) 与 (用户, 题目) 汇总，每个键一条 upsert
+        deltas = {}
+        question_deltas = {}
+        for r in records:
+            if r.get('user_id'):
+                self._category_deltas(r['user_id'], r['details'], deltas)
+                self._question_deltas(r['user_id'], r['details'], question_deltas)
+        self._upsert_category_stats(deltas)
+        self._upsert_question_stats(question_deltas, max(parse_timestamp(r['timestamp']) or datetime.now() for r in records))
+        self._grant_qualified_permissions(deltas.keys())
+
+        self._count_exam_results(records)
+        db.session.commit()
 
     def get_result(self, result_id):
         r = ExamResult.query.get(result_id)
@@ -183,15 +586,38 @@ class DataManager:
     def delete_result(self, result_id):
         r = ExamResult.query.get(result_id)
         if r:
-            # Rollback stats
+            # Rollback stats（按类别汇总的得分在 SQL 中计算，无需解析逐题详情）
             try:
-                self.rollback_user_stats(r.user_id, r.details)
+                self.rollback_user_stats(r.user_id, self._result_category_totals(r))
+                if r.user_id:
+                    self._upsert_question_stats(self._question_deltas(r.user_id, self._result_answer_outcomes(r), sign=-1))
             except Exception as e:
                 print(f"Error rolling back stats: {e}")
             
             db.session.delete(r)
+            self._count_exam_results([r], sign=-1)
             db.session.commit()
 
+    @staticmethod
+    def _result_category_totals(result):
+        """考试结果按类别汇总的 [{'category', 'score', 'full_score'}]，旧记录回退到 details_json"""
+        if result.details_json:
+            return result.details
+        from sqlalchemy import func
+        rows = db.session.query(
+            ExamAnswer.category, func.sum(ExamAnswer.score), func.sum(ExamAnswer.full_score)
+        ).filter(ExamAnswer.result_id == result.id).group_by(ExamAnswer.category).all()
+        return [{'category': cat, 'score': score or 0, 'full_score': full or 0} for cat, score, full in rows]
+
+    @staticmethod
+    def _result_answer_outcomes(result):
+        """考试结果的逐题得分 [{'id', 'score', 'full_score'}]（不含题干与答案），旧记录回退到 details_json"""
+        if result.details_json:
+            return result.details
+        rows = db.session.query(ExamAnswer.question_id, ExamAnswer.score, ExamAnswer.full_score)\
+            .filter(ExamAnswer.result_id == result.id).all()
+        return [{'id': q_id, 'score': score or 0, 'full_score': full or 0} for q_id, score, full in rows]
+
     def rollback_user_stats(self, user_id, results):
         """
         Reverse the effect of update_user_stats.
@@ -233,47 +659,26 @@ class DataManager:
 
     def get_user_dashboard_stats(self, user_id):
         # 1. Score Trend (Last 7 exams)
-        recent_exams = ExamResult.query.filter_by(user_id=user_id)\
-            .order_by(ExamResult.timestamp.desc())\
+        recent_exams = db.session.query(ExamResult.timestamp, ExamResult.total_score)\
+            .filter(ExamResult.user_id == user_id)\
+            .order_by(ExamResult.taken_at.desc().nullslast(), ExamResult.id.desc())\
             .limit(7).all()
         recent_exams.reverse() # Make it chronological
         
         trend_labels = [r.timestamp.split(' ')[0] for r in recent_exams]
         trend_data = [r.total_score for r in recent_exams]
         
-        # 2. Error Analysis (Top 5 wrong questions from last 20 exams)
-        analyze_exams = ExamResult.query.filter_by(user_id=user_id)\
-            .order_by(ExamResult.timestamp.desc())\
-            .limit(20).all()
-            
-        question_stats = {} # {short_content: {wrong: 0, total: 0}}
-        
-        for exam in analyze_exams:
-            details = exam.details
-            if not details: continue
-            for q in details:
-                content = q.get('question')
-                if not content: continue
-                
-                # Truncate content
-                short_content = (content[:10] + '..') if len(content) > 10 else content
-                
-                if short_content not in question_stats:
-                    question_stats[short_content] = {'wrong': 0, 'total': 0}
-                
-                question_stats[short_content]['total'] += 1
-                if q.get('score', 0) < q.get('full_score', 0):
-                    question_stats[short_content]['wrong'] += 1
-                    
-        # Calculate error counts
-        error_list = []
-        for content, stats in question_stats.items():
-            if stats['wrong'] > 0:
-                error_list.append({'label': content, 'count': stats['wrong']})
-        
-        # Sort by error count descending
-        error_list.sort(key=lambda x: x['count'], reverse=True)
-        top_errors = error_list[:5]
+        # 2. Error Analysis (Top 5 wrong questions)：读取评分时增量维护的题目统计
+        top_stats = UserQuestionStat.query\
+            .filter(UserQuestionStat.user_id == user_id, UserQuestionStat.wrong > 0)\
+            .order_by(UserQuestionStat.wrong.desc(), UserQuestionStat.last_attempt_at.desc())\
+            .limit(5).all()
+        top_errors = []
+        for stat in top_stats:
+            content = stat.question or f'#{stat.question_id}'
+            # Truncate content
+            label = (content[:10] + '..') if len(content) > 10 else content
+            top_errors.append({'label': label, 'count': stat.wrong})
         
         return {
             'trend': {
@@ -291,33 +696,11 @@ class DataManager:
         Update user statistics based on exam results.
         results: list of dicts with keys 'category', 'score', 'full_score'
         """
-        # Group results by category
-        category_results = {}
-        for r in results:
-            cat = r.get('category', '默认题集')
-            if cat not in category_results:
-                category_results[cat] = {'score': 0, 'max_score': 0}
-            category_results[cat]['score'] += r.get('score', 0)
-            category_results[cat]['max_score'] += r.get('full_score', 0)
-        
-        # Update database
-        for cat, data in category_results.items():
-            stat = UserCategoryStat.query.filter_by(user_id=user_id, category=cat).first()
-            if not stat:
-                stat = UserCategoryStat(user_id=user_id, category=cat, total_attempts=0, total_score=0, total_max_score=0)
-                db.session.add(stat)
-            
-            stat.total_attempts = (stat.total_attempts or 0) + 1
-            stat.total_score = (stat.total_score or 0) + data['score']
-            stat.total_max_score = (stat.total_max_score or 0) + data['max_score']
-            
-            # Check for permission grant (e.g., > 80% accuracy and > 5 attempts)
-            # This is a simple rule, can be made more complex
-            if stat.total_max_score > 0:
-                accuracy = stat.total_score / stat.total_max_score
-                if accuracy >= 0.8 and stat.total_attempts >= 3:
-                    self.grant_permission(user_id, cat)
-        
+        deltas = self._category_deltas(user_id, results)
+        self._upsert_category_stats(deltas)
+        self._upsert_question_stats(self._question_deltas(user_id, results))
+        # Check for permission grant (e.g., >= 80% accuracy and >= 3 attempts)
+        self._grant_qualified_permissions(deltas.keys())
         db.session.commit()
 
     def grant_permission(self, user_id, category):
@@ -392,6 +775,7 @@ class DataManager:
     def init_db(self, app):
         with app.app_context():
             db.create_all()
+            ensure_search_index()
             if User.query.filter_by(is_admin=True).count() == 0:
                 admin = User(username='admin', is_admin=True)
                 admin.set_password('admin123')
@@ -406,6 +790,7 @@ class DataManager:
     def update_question(self, q_id, content, answer, score, image=None, category=None):
         q = Question.query.get(q_id)
         if q:
+            grading_changed = (q.answer != answer or q.score != score)
             q.content = content
             q.answer = answer
             q.score = score
@@ -414,7 +799,10 @@ class DataManager:
             if category is not None:
                 q.category = category
             db.session.commit()
-            self.export_questions_to_txt()
+            bump_bank_version()
+            if grading_changed:
+                get_score_cache().invalidate_question(q_id)
+            self.schedule_export()
     
     def delete_question(self, q_id):
         q = Question.query.get(q_id)
@@ -422,17 +810,24 @@ class DataManager:
             return None
         image_filename = q.image if q.image else None
         db.session.delete(q)
+        counters.increment(questions=-1)
         db.session.commit()
-        self.export_questions_to_txt()
+        bump_bank_version()
+        get_score_cache().invalidate_question(q_id)
+        self.schedule_export()
         return image_filename
 
     def load_questions(self):
+        """当前题库（进程内缓存，版本号变化时才查询数据库）；返回不可变 tuple，请勿修改其中的字典"""
+        return get_cached_questions(self._query_questions)
+
+    def _query_questions(self):
         questions = Question.query.order_by(Question.id).all()
         return [q.to_dict() for q in questions]
 
     def save_question(self, content, answer, score=10, image=None, category='默认题集'):
         """
-        保存单个题目到数据库，并导出所有题目到 txt
+        保存单个题目到数据库，并安排后台导出题目到 txt
         """
         q = Question(
             content=content,
@@ -442,7 +837,9 @@ class DataManager:
             category=category
         )
         db.session.add(q)
+        counters.increment(questions=1)
         db.session.commit()
-        self.export_questions_to_txt()
+        bump_bank_version()
+        self.schedule_export()
         return q.id
 
@@ -1,9 +1,130 @@
 import threading
-import queue
 import time
+from collections import deque
 import uuid
 from datetime import datetime
-from web.tasks import grade_exam_task
+from web.extensions import socketio
+from web.tasks import grade_exam_task, regrade_task
+from web.services.grading_engine import GradingEngine
+from web.services.question_bank import resolve_exam_index
+from web.services.regrade import run_regrade_job
+from web.services.result_batcher import get_result_batcher
+from web.services.grading_pool import GradingProcessPool
+from web.services.score_cache import get_score_cache, get_shared_stats
+from web.utils.queue_stats import count_alive_workers, read_queue_stats
+from web.utils.scheduler import FairScheduler, QueueFull
+
+class CeleryHealthMonitor:
+    """
+    后台探测 Celery worker 是否在线，缓存健康状态供分发时直接读取。
+    探测在独立线程中进行，不阻塞应用启动和请求处理。
+    """
+
+    def __init__(self, app, interval=10, timeout=1.0, on_healthy=None):
+        self.app = app
+        self.interval = interval
+        self.timeout = timeout
+        # 每次探测到 Celery 可用时回调（例如释放本地评分进程池）
+        self.on_healthy = on_healthy
+        self.healthy = False
+        self.workers = 0
+        self.last_seen = None
+        self.last_check = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+    def check(self):
+        """优先读取 worker 心跳（Redis），没有心跳时再 ping 所有 worker，更新健康状态"""
+        workers = 0
+        error = None
+        from web.extensions import cache_redis
+        if cache_redis is not None:
+            try:
+                workers = count_alive_workers(
+                    cache_redis, self.app.config.get('GRADING_STATS_INTERVAL', 5)
+                )
+            except Exception as e:
+                error = str(e)
+        if workers == 0:
+            try:
+                celery_ext = getattr(self.app, 'extensions', {}).get('celery', None)
+                if celery_ext:
+                    ping_result = celery_ext.control.inspect(timeout=self.timeout).ping()
+                    if ping_result and isinstance(ping_result, dict):
+                        workers = len(ping_result)
+                else:
+                    error = 'Celery not initialized'
+            except Exception as e:
+                error = str(e)
+
+        was_healthy = self.healthy
+        self.workers = workers
+        self.healthy = workers > 0
+        self.last_check = time.time()
+        self.last_error = error
+        if self.healthy:
+            self.last_seen = self.last_check
+
+        if self.healthy != was_healthy:
+            if self.healthy:
+                print(f"[Queue] Celery available ({workers} workers), switching to Distributed Mode")
+            else:
+                print(f"[Queue] Celery unavailable ({error or 'no workers'}), switching to local mode")
+        if self.healthy and self.on_healthy:
+            try:
+                self.on_healthy()
+            except Exception as e:
+                print(f"[Queue] Celery recovery hook failed: {e}")
+
+    def mark_unhealthy(self, reason):
+        """分发失败时立即标记为不可用，等待下一次探测恢复"""
+        if self.healthy:
+            print(f"[Queue] Celery dispatch failed ({reason}), switching to local mode")
+        self.healthy = False
+        self.last_error = str(reason)
+
+    def snapshot(self):
+        return {
+            'healthy': self.healthy,
+            'workers': self.workers,
+            'last_seen': datetime.fromtimestamp(self.last_seen).isoformat() if self.last_seen else None,
+            'last_check': datetime.fromtimestamp(self.last_check).isoformat() if self.last_check else None,
+            'error': self.last_error
+        }
+
+    def stop(self):
+        self._stop.set()
+
+
+FINISHED_STATUSES = ('done', 'error', 'timeout')
+
+
+class TaskRecord:
+    """本地评分任务记录（__slots__ 减少每个任务的内存占用）"""
+    __slots__ = ('task_id', 'user_id', 'lane', 'status', 'data', 'result', 'error', 'traceback',
+                 'created_at', 'started_at', 'finished_at', 'processing_time')
+
+    def __init__(self, task_id, user_id, lane, data, created_at):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.lane = lane
+        self.status = 'waiting'
+        self.data = data
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.created_at = created_at
+        self.started_at = None
+        self.finished_at = None
+        self.processing_time = None
+
 
 class GradingQueue:
     def __init__(self, app, data_manager, lib_instance, num_workers=1):
@@ -20,57 +141,74 @@ class GradingQueue:
             'avg_processing_time': 0,
             'last_cleanup': time.time()
         }
-        
-        # 改进的Celery检测逻辑
-        celery_detected = False
-        try:
-            celery_ext = getattr(self.app, 'extensions', {}).get('celery', None)
-            if celery_ext:
-                # 方式1：尝试ping所有worker
-                inspector = celery_ext.control.inspect()
-                ping_result = None
-                
-                try:
-                    # 设置超时避免长时间等待
-                    ping_result = inspector.ping(timeout=2)
-                except Exception as ping_error:
-                    print(f"[Queue] Celery ping failed: {ping_error}")
-                    # 方式2：检查注册的任务
-                    try:
-                        registered = inspector.registered(timeout=2)
-                        if registered and isinstance(registered, dict) and len(registered) > 0:
-                            celery_detected = True
-                            print(f"[Queue] Celery detected via registered: {list(registered.keys())}")
-                    except Exception as reg_error:
-                        print(f"[Queue] Celery registered check failed: {reg_error}")
-                
-                if ping_result and isinstance(ping_result, dict) and len(ping_result) > 0:
-                    celery_detected = True
-                    print(f"[Queue] Celery detected via ping with {len(ping_result)} workers")
-                    
-        except Exception as e:
-            print(f"[Queue] Celery detection failed: {e}")
-        
-        # 决定运行模式
-        if celery_detected:
-            try:
-                from web.tasks import grade_exam_task
-                self.celery_task = grade_exam_task
-                self.mode = 'celery'
-                print("[Queue] Initialized in Distributed Mode (Celery)")
-            except Exception as e:
-                print(f"[Queue] Celery task import failed: {e}, falling back to Thread Mode")
-                self.mode = 'thread'
+        self.celery_task = grade_exam_task
+
+        # 本地模式（线程 / 进程）的数据结构，工作线程在首次需要本地评分时才启动
+        # 公平调度：优先级通道 + 用户轮询 + 有界容量（满时 QueueFull，由调用方提示重试）
+        self.queue = FairScheduler(
+            capacity=self.app.config.get('GRADING_QUEUE_CAPACITY', 1000),
+            workers=num_workers
+        )
+        self.tasks = {}
+        # 各状态的任务数，在状态切换时增减，统计接口无需遍历 self.tasks
+        self.status_counts = {'waiting': 0, 'processing': 0, 'done': 0, 'error': 0, 'timeout': 0}
+        # 已结束任务的过期队列：(结束时间, task_id)，按时间追加，天然有序
+        self.expiry = {'done': deque(), 'failed': deque()}
+        self.lib = lib_instance
+        self.engine = GradingEngine(lib_instance, score_cache=get_score_cache())
+        self.grading_timeout = self.app.config.get('GRADING_TIMEOUT', 30)
+        self.num_workers = num_workers
+        self.local_mode = self._local_mode()
+        self.workers = []
+        self.pool = None
+        self.batcher = None
+        self._local_started = False
+        self._local_lock = threading.Lock()
+
+        # Celery worker 进程内（celery_worker.py 调用 create_app）不做探测，也不启动本地评分
+        self.role = self.app.config.get('GRADING_ROLE', 'web')
+        if self.role == 'celery_worker':
+            self.health = None
+            print("[Queue] Running inside Celery worker, local grading disabled")
         else:
-            print("[Queue] Celery not detected, falling back to Thread Mode")
-            self.mode = 'thread'
-        
-        # 线程模式初始化
-        if self.mode == 'thread':
-            self.queue = queue.Queue()
-            self.tasks = {}
-            self.lib = lib_instance
-            self.workers = []
+            # Celery 可用性在后台探测，分发时按缓存的健康状态在 Celery 与本地之间切换
+            self.health = CeleryHealthMonitor(
+                self.app,
+                interval=self.app.config.get('CELERY_HEALTH_INTERVAL', 10),
+                timeout=self.app.config.get('CELERY_HEALTH_TIMEOUT', 1.0),
+                on_healthy=self._release_process_pool
+            )
+
+    @property
+    def mode(self):
+        """当前分发模式：celery / process / thread"""
+        if self.health is None or self.health.healthy:
+            return 'celery'
+        return self.local_mode
+
+    def _local_mode(self):
+        """Celery 不可用时的本地评分模式：process（多进程）或 thread（线程）"""
+        mode = self.app.config.get('GRADING_LOCAL_MODE', 'thread')
+        return 'process' if mode == 'process' else 'thread'
+
+    def _ensure_local_workers(self):
+        """按需启动本地评分（首次回退到本地模式时）"""
+        if self._local_started:
+            return
+        with self._local_lock:
+            if self._local_started:
+                return
+            num_workers = self.num_workers
+
+            if self.local_mode == 'process':
+                # 进程模式：每个调度线程驱动一个评分子进程
+                num_workers = self.app.config.get('GRADING_PROCESSES') or num_workers
+                self._start_process_pool(num_workers)
+                if self.local_mode != 'process':
+                    num_workers = self.num_workers
+            self.queue.workers = max(1, num_workers)
+            # 可选：考试结果微批量落库（RESULT_BATCH_ENABLED）
+            self.batcher = get_result_batcher(self.app, self.data_manager)
             
             # 启动清理线程
             self.cleanup_thread = threading.Thread(target=self._cleanup_worker, daemon=True)
@@ -81,18 +219,86 @@ class GradingQueue:
                 t = threading.Thread(target=self._worker, args=(i,), daemon=True)
                 t.start()
                 self.workers.append(t)
+            self._local_started = True
+
+    def _start_process_pool(self, size):
+        """启动评分进程池（调用方持有 _local_lock）；启动失败时退回线程模式"""
+        try:
+            self.pool = GradingProcessPool(size, self.app.config.get('DLL_PATH'))
+            print(f"[Queue] Local Process Mode started with {size} processes")
+        except Exception as e:
+            print(f"[Queue] Grading process pool failed to start: {e}, falling back to Thread Mode")
+            self.local_mode = 'thread'
+            self.pool = None
+
+    def _process_pool(self):
+        """当前评分进程池；Celery 恢复后进程池已释放、又回退到本地评分时重新启动"""
+        pool = self.pool
+        if pool is None and self.local_mode == 'process':
+            with self._local_lock:
+                if self.pool is None and self.local_mode == 'process':
+                    self._start_process_pool(len(self.workers) or self.num_workers)
+                pool = self.pool
+        return pool
+
+    def _release_process_pool(self):
+        """
+        Celery 恢复后关闭本地评分进程池，释放子进程占用的 CPU 与内存（调度线程保留，开销很小）。
+        仍有本地任务等待或处理中时暂不关闭，下一次探测时再检查。
+        """
+        if self.pool is None:
+            return
+        with self._local_lock:
+            with self.tasks_lock:
+                busy = self.status_counts['waiting'] + self.status_counts['processing']
+            if self.pool is None or busy:
+                return
+            pool, self.pool = self.pool, None
+        pool.shutdown()
+        print("[Queue] Celery recovered, local grading process pool released")
 
-    def add_task(self, user_id, exam_data):
+    def add_task(self, user_id, exam_data, lane='exam'):
+        """
+        提交评分任务。lane 为本地调度的优先级通道（exam / regrade / maintenance），
+        本地队列已满时抛出 QueueFull。
+        """
+        # 记录提交时间，worker 据此统计排队等待时长
+        exam_data = {**exam_data, 'submitted_at': time.time()}
         if self.mode == 'celery':
-            # Celery异步分发
-            result = self.celery_task.delay(user_id, exam_data)
-            return result.id
-        else:
-            # 线程模式
-            return self._add_thread_task(user_id, exam_data)
+            # Celery异步分发；broker 不可用时不重试，直接回退到本地评分
+            try:
+                result = self.celery_task.apply_async(args=(user_id, exam_data), retry=False)
+                return result.id
+            except Exception as e:
+                if self.health is None:
+                    raise
+                self.health.mark_unhealthy(e)
 
-    def get_status(self, task_id):
+        # 本地模式（线程 / 进程）
+        self._ensure_local_workers()
+        return self._add_thread_task(user_id, exam_data, lane)
+
+    def add_regrade(self, user_id, job_id):
+        """提交重评任务：Celery 可用时交给 worker，否则进入本地 regrade 通道（排在考试提交之后）"""
         if self.mode == 'celery':
+            try:
+                return regrade_task.apply_async(args=(job_id,), retry=False).id
+            except Exception as e:
+                if self.health is None:
+                    raise
+                self.health.mark_unhealthy(e)
+
+        self._ensure_local_workers()
+        return self._add_thread_task(user_id, {'regrade_job_id': job_id}, lane='regrade')
+
+    def get_status(self, task_id):
+        # 本地评分的任务优先（模式切换后旧任务仍可查询）
+        with self.tasks_lock:
+            is_local = task_id in self.tasks
+        if is_local or (self.health is not None and self.health.last_seen is None):
+            # 本进程从未连上过 Celery 时，任务只可能在本地
+            return self._get_thread_status(task_id)
+        else:
             try:
                 from celery.result import AsyncResult
                 res = AsyncResult(task_id, app=self.app.extensions['celery'])
@@ -125,102 +331,84 @@ class GradingQueue:
                 }
             except Exception as e:
                 return {'status': 'error', 'error': str(e)}
-        else:
-            return self._get_thread_status(task_id)
 
     def get_queue_stats(self):
         if self.mode == 'celery':
+            # 读取 worker 心跳聚合值与 broker 积压长度，不再向所有 worker 广播 inspect
+            from web.extensions import cache_redis
             try:
-                inspector = self.app.extensions['celery'].control.inspect()
-                
-                # 获取活跃和等待的任务
-                active_tasks = {}
-                reserved_tasks = {}
-                
-                try:
-                    active_tasks = inspector.active(timeout=2) or {}
-                except Exception as e:
-                    print(f"[QueueStats] Failed to get active tasks: {e}")
-                
-                try:
-                    reserved_tasks = inspector.reserved(timeout=2) or {}
-                except Exception as e:
-                    print(f"[QueueStats] Failed to get reserved tasks: {e}")
-                
-                # 计算统计
-                active_count = 0
-                reserved_count = 0
-                worker_count = 0
-                
-                if active_tasks and isinstance(active_tasks, dict):
-                    active_count = sum(len(v) for v in active_tasks.values())
-                    worker_count = len(active_tasks)
-                
-                if reserved_tasks and isinstance(reserved_tasks, dict):
-                    reserved_count = sum(len(v) for v in reserved_tasks.values())
-                
-                # 防止异常值
-                if active_count > 1000:
-                    print(f"[QueueStats] active_count异常，强制归零")
-                    active_count = 0
-                if reserved_count > 1000:
-                    print(f"[QueueStats] reserved_count异常，强制归零")
-                    reserved_count = 0
-                
-                return {
-                    'mode': 'Distributed (Celery)',
-                    'active': active_count,
-                    'waiting': reserved_count,
-                    'workers': worker_count,
-                    'last_update': datetime.now().isoformat()
-                }
+                if cache_redis is None:
+                    raise RuntimeError('Redis unavailable')
+                stats = read_queue_stats(cache_redis, self.app.config.get('GRADING_STATS_INTERVAL', 5))
+                stats['score_cache'] = self._score_cache_stats()
+                stats['celery_health'] = self.health.snapshot() if self.health else None
+                return stats
             except Exception as e:
-                print(f"[QueueStats] inspect异常: {e}")
+                print(f"[QueueStats] Heartbeat stats unavailable: {e}")
                 return {
                     'mode': 'Distributed (Celery)',
                     'active': 0,
                     'waiting': 0,
-                    'workers': 0,
+                    'workers': self.health.workers if self.health else 0,
                     'error': str(e),
                     'last_update': datetime.now().isoformat()
                 }
         else:
             with self.tasks_lock:
-                active_count = sum(1 for t in self.tasks.values() if t.get('status') == 'processing')
-                
-                return {
-                    'mode': 'Local Thread',
-                    'active': active_count,
-                    'waiting': self.queue.qsize(),
-                    'total_tasks': len(self.tasks),
-                    'workers': len(self.workers),
-                    **self.metrics,
-                    'last_update': datetime.now().isoformat()
-                }
+                active_count = self.status_counts['processing']
+                total_tasks = len(self.tasks)
+            stats = {
+                'mode': 'Local Process' if self.mode == 'process' else 'Local Thread',
+                'active': active_count,
+                'waiting': self.queue.qsize(),
+                'total_tasks': total_tasks,
+                'workers': len(self.workers),
+                'scheduler': self.queue.stats(),
+                'score_cache': self._score_cache_stats(),
+                'celery_health': self.health.snapshot() if self.health else None,
+                **self.metrics,
+                'last_update': datetime.now().isoformat()
+            }
+            if self.batcher:
+                stats['result_batcher'] = self.batcher.stats()
+            if self.pool:
+                stats['processes'] = self.pool.size
+                stats['process_restarts'] = self.pool.restarts
+            return stats
 
     def get_metrics(self):
         """获取性能指标"""
         with self.tasks_lock:
-            return {
-                **self.metrics,
-                'queue_size': self.queue.qsize() if self.mode == 'thread' else 0,
-                'active_tasks': sum(1 for t in self.tasks.values() if t.get('status') == 'processing'),
-                'waiting_tasks': sum(1 for t in self.tasks.values() if t.get('status') == 'waiting'),
-                'mode': self.mode,
-                'last_cleanup': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.metrics['last_cleanup']))
-            }
+            counts = dict(self.status_counts)
+        return {
+            **self.metrics,
+            'queue_size': self.queue.qsize(),
+            'active_tasks': counts['processing'],
+            'waiting_tasks': counts['waiting'],
+            'status_counts': counts,
+            'mode': self.mode,
+            'score_cache': self._score_cache_stats(),
+            'last_cleanup': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.metrics['last_cleanup']))
+        }
+
+    def _score_cache_stats(self):
+        """评分缓存命中率：进程模式汇总子进程，Celery 模式读取 Redis 全局计数"""
+        if self.mode == 'celery':
+            from web.extensions import cache_redis
+            return get_shared_stats(cache_redis)
+        if self.pool:
+            return self.pool.cache_stats()
+        return self.engine.score_cache.stats()
 
     # --- 线程模式实现 ---
     
-    def _add_thread_task(self, user_id, exam_data):
+    def _add_thread_task(self, user_id, exam_data, lane='exam'):
         """添加线程任务（线程安全）"""
         # 线程安全的清理
         with self.tasks_lock:
-            # 定期清理旧任务
             current_time = time.time()
-            if current_time - self.metrics['last_cleanup'] > 3600:  # 每小时清理一次
-                self._cleanup_old_tasks()
-                self.metrics['last_cleanup'] = current_time
+            # 过期清理只检查各过期队列的队首，开销与实际删除数成正比
+            self._cleanup_old_tasks()
             
             # 防止内存溢出
             if len(self.tasks) > self.max_tasks:
@@ -228,22 +416,31 @@ class GradingQueue:
             
             # 创建新任务
             task_id = str(uuid.uuid4())
-            self.tasks[task_id] = {
-                'task_id': task_id,
-                'user_id': user_id,
-                'status': 'waiting',
-                'submitted_at': datetime.now(),
-                'created_at': current_time,
-                'data': exam_data,
-                'result': None,
-                'error': None,
-                'processing_time': None
-            }
+            self.tasks[task_id] = TaskRecord(task_id, user_id, lane, exam_data, current_time)
+            self.status_counts['waiting'] += 1
         
-        self.queue.put(task_id)
+        try:
+            self.queue.put(task_id, user_id, lane)
+        except QueueFull:
+            with self.tasks_lock:
+                task = self.tasks.pop(task_id, None)
+                if task:
+                    self.status_counts[task.status] -= 1
+            print(f"[Queue] Queue full, rejected task for user {user_id} (lane={lane})")
+            raise
         print(f"[Queue] Task {task_id} added to queue, total tasks: {len(self.tasks)}")
         return task_id
 
+    def _set_status(self, task, status):
+        """切换任务状态并同步计数；结束状态的任务进入对应的过期队列（调用方持有 tasks_lock）"""
+        self.status_counts[task.status] -= 1
+        self.status_counts[status] += 1
+        task.status = status
+        if status in FINISHED_STATUSES:
+            task.finished_at = time.time()
+            expiry = self.expiry['done' if status == 'done' else 'failed']
+            expiry.append((task.finished_at, task.task_id))
+
     def _get_thread_status(self, task_id):
         """获取线程任务状态（线程安全）"""
         with self.tasks_lock:
@@ -252,14 +449,14 @@ class GradingQueue:
                 return {'status': 'not_found', 'error': 'Task not found'}
             
             response = {
-                'status': task['status'],
-                'result': task.get('result'),
-                'error': task.get('error'),
-                'submitted_at': task['submitted_at'].isoformat() if task.get('submitted_at') else None
+                'status': task.status,
+                'result': task.result,
+                'error': task.error,
+                'submitted_at': datetime.fromtimestamp(task.created_at).isoformat()
             }
             
-            if task.get('processing_time'):
-                response['processing_time'] = task['processing_time']
+            if task.processing_time:
+                response['processing_time'] = task.processing_time
             
             return response
 
@@ -271,48 +468,45 @@ class GradingQueue:
                 self._cleanup_old_tasks()
 
     def _cleanup_old_tasks(self):
-        """清理旧任务"""
+        """
+        清理旧任务（调用方持有 tasks_lock）：
+        1. 已完成超过1小时
+        2. 失败 / 超时超过24小时
+        过期队列按结束时间有序，只需从队首弹出已过期的条目。
+        """
         now = time.time()
-        to_delete = []
-        
-        for task_id, task in self.tasks.items():
-            task_age = now - task.get('created_at', now)
-            
-            # 清理条件：
-            # 1. 已完成超过1小时
-            # 2. 失败超过24小时
-            # 3. 总任务数超过阈值时的最早任务
-            if task['status'] == 'done' and task_age > 3600:  # 1小时
-                to_delete.append(task_id)
-            elif task['status'] == 'error' and task_age > 86400:  # 24小时
-                to_delete.append(task_id)
-            elif len(self.tasks) > self.max_tasks and len(to_delete) < self.cleanup_threshold:
-                to_delete.append(task_id)
-        
-        # 删除任务
         deleted_count = 0
-        for task_id in to_delete[:self.cleanup_threshold]:
-            if task_id in self.tasks:
-                del self.tasks[task_id]
-                deleted_count += 1
+        for kind, ttl in (('done', 3600), ('failed', 86400)):
+            expiry = self.expiry[kind]
+            while expiry and now - expiry[0][0] > ttl:
+                _, task_id = expiry.popleft()
+                if self._drop_task(task_id):
+                    deleted_count += 1
         
         if deleted_count > 0:
             print(f"[Queue] Cleaned up {deleted_count} old tasks")
             self.metrics['last_cleanup'] = now
 
     def _emergency_cleanup(self):
-        """紧急清理：当任务数超过最大限制时"""
+        """紧急清理：任务数超过最大限制时，删除最早结束的任务（等待和处理中的任务不删除）"""
         print(f"[Queue] Emergency cleanup triggered: {len(self.tasks)} > {self.max_tasks}")
         
-        # 按创建时间排序，删除最早的任务
-        sorted_tasks = sorted(self.tasks.items(), key=lambda x: x[1].get('created_at', 0))
-        to_delete = [task_id for task_id, _ in sorted_tasks[:self.cleanup_threshold]]
+        removed = 0
+        for kind in ('done', 'failed'):
+            expiry = self.expiry[kind]
+            while expiry and removed < self.cleanup_threshold:
+                _, task_id = expiry.popleft()
+                if self._drop_task(task_id):
+                    removed += 1
         
-        for task_id in to_delete:
-            if task_id in self.tasks:
-                del self.tasks[task_id]
-        
-        print(f"[Queue] Emergency cleanup removed {len(to_delete)} tasks")
+        print(f"[Queue] Emergency cleanup removed {removed} tasks")
+
+    def _drop_task(self, task_id):
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return False
+        self.status_counts[task.status] -= 1
+        return True
 
     def _worker(self, worker_id):
         """工作线程"""
@@ -330,20 +524,23 @@ class GradingQueue:
                     with self.tasks_lock:
                         task = self.tasks.get(task_id)
                         if not task:
-                            self.queue.task_done()
                             continue
                         
                         # 更新状态
-                        task['status'] = 'processing'
-                        task['started_at'] = datetime.now()
+                        self._set_status(task, 'processing')
+                        task.started_at = start_time
                     
                     print(f"[Worker-{worker_id}] Processing task {task_id}")
                     
-                    # 评分处理（带超时保护）
-                    result = self._grade_exam_with_timeout(task['data'], timeout=30)
-                    
-                    # 保存结果
-                    with self.app.app_context():
+                    if task.lane == 'regrade':
+                        # 批量重评：分块执行，不受单份试卷的评分超时限制
+                        with self.app.app_context():
+                            result = run_regrade_job(task.data['regrade_job_id'], lib=self.lib, emitter=socketio)
+                    else:
+                        # 评分处理（带超时保护）
+                        result = self._grade_exam_with_timeout(task.data, timeout=self.grading_timeout)
+                        
+                        # 保存结果
                         exam_record = {
                             'id': task_id,
                             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -351,24 +548,32 @@ class GradingQueue:
                             'max_score': result['max_score'],
                             'details': result['details']
                         }
-                        cat = task['data'].get('category', 'all')
-                        self.data_manager.save_exam_result(exam_record, user_id=task['user_id'], category=cat)
-                        self.data_manager.update_user_stats(task['user_id'], result['details'])
+                        cat = task.data.get('category', 'all')
+                        if self.batcher:
+                            # 批量落库：工作线程继续评分，落库完成后由回调标记任务完成
+                            self.batcher.submit(
+                                {**exam_record, 'user_id': task.user_id, 'category': cat},
+                                callback=self._batched_completion(task, result, start_time)
+                            )
+                            continue
+                        with self.app.app_context():
+                            self.data_manager.record_exam_result(exam_record, user_id=task.user_id, category=cat)
                     
                     # 更新任务状态
                     with self.tasks_lock:
-                        task['result'] = result
-                        task['status'] = 'done'
-                        task['processing_time'] = time.time() - start_time
+                        task.result = result
+                        task.processing_time = time.time() - start_time
+                        task.data = None  # 答案已落库，释放内存
+                        self._set_status(task, 'done')
                     
                     self.metrics['tasks_processed'] += 1
-                    print(f"[Worker-{worker_id}] Task {task_id} completed in {task['processing_time']:.2f}s")
+                    print(f"[Worker-{worker_id}] Task {task_id} completed in {task.processing_time:.2f}s")
                     
                 except TimeoutError:
                     with self.tasks_lock:
                         if task:
-                            task['status'] = 'timeout'
-                            task['error'] = 'Processing timeout after 30 seconds'
+                            task.error = f'Processing timeout after {self.grading_timeout} seconds'
+                            self._set_status(task, 'timeout')
                     self.metrics['tasks_failed'] += 1
                     print(f"[Worker-{worker_id}] Task {task_id} timeout")
                     
@@ -378,33 +583,56 @@ class GradingQueue:
                     
                     with self.tasks_lock:
                         if task:
-                            task['status'] = 'error'
-                            task['error'] = str(e)
-                            task['traceback'] = error_trace
+                            task.error = str(e)
+                            task.traceback = error_trace
+                            self._set_status(task, 'error')
                     
                     self.metrics['tasks_failed'] += 1
                     print(f"[Worker-{worker_id}] Task {task_id} failed: {e}")
                     
                 finally:
                     # 更新平均处理时间
-                    if task and task.get('processing_time'):
+                    if task and task.processing_time:
                         current_avg = self.metrics['avg_processing_time']
                         total_processed = self.metrics['tasks_processed']
                         self.metrics['avg_processing_time'] = (
-                            (current_avg * (total_processed - 1) + task['processing_time']) / total_processed
-                            if total_processed > 0 else task['processing_time']
+                            (current_avg * (total_processed - 1) + task.processing_time) / total_processed
+                            if total_processed > 0 else task.processing_time
                         )
-                    
-                    self.queue.task_done()
+                        self.queue.record_service_time(task.processing_time)
                     
             except Exception as e:
                 print(f"[Worker-{worker_id}] Critical error: {e}")
                 time.sleep(1)  # 避免错误循环
 
+    def _batched_completion(self, task, result, start_time):
+        """生成批量落库完成后的回调：更新任务状态与指标"""
+        def on_persisted(error):
+            with self.tasks_lock:
+                task.processing_time = time.time() - start_time
+                task.data = None
+                if error:
+                    task.error = f'Failed to save result: {error}'
+                    self._set_status(task, 'error')
+                else:
+                    task.result = result
+                    self._set_status(task, 'done')
+            if error:
+                self.metrics['tasks_failed'] += 1
+                print(f"[Queue] Task {task.task_id} failed to persist: {error}")
+            else:
+                self.metrics['tasks_processed'] += 1
+                self.queue.record_service_time(task.processing_time)
+        return on_persisted
+
     def _grade_exam_with_timeout(self, data, timeout=30):
         """带超时的评分函数"""
-        import threading
-        
+        pool = self._process_pool()
+        if pool:
+            # 进程模式：超时由进程池强制执行（终止并替换子进程）
+            index = resolve_exam_index(data, fallback_loader=self._load_questions)
+            return pool.grade(index, data['ids'], data['user_answers'], timeout=timeout)
+
         result_container = {}
         exception_container = {}
         
@@ -428,74 +656,14 @@ class GradingQueue:
         return result_container['result']
 
     def _grade_exam(self, data):
-        """评分逻辑（保持不变）"""
-        ids = data['ids']
-        user_answers_map = data['user_answers']
-        all_questions = data['all_questions']
-        
-        total_score = 0
-        results = []
-        exam_questions = []
-
-        for i, q_id in enumerate(ids):
-            q = next((item for item in all_questions if item['id'] == q_id), None)
-            if not q:
-                continue
-            
-            exam_questions.append(q)
-            user_ans = user_answers_map.get(str(i), '')
-            
-            valid_answers = q['answer'].replace('；', ';').split(';')
-            valid_answers = [ans.strip() for ans in valid_answers if ans.strip()]
-            if not valid_answers:
-                valid_answers = [q['answer']]
-
-            score = 0
-            for correct_ans in valid_answers:
-                current_score = 0
-                if self.lib:
-                    # 使用安全的编码函数
-                    b_user = self._safe_encode(user_ans)
-                    b_correct = self._safe_encode(correct_ans)
-                    current_score = self.lib.calculate_score(b_user, b_correct, q['score'])
-                else:
-                    current_score = q['score'] if user_ans.strip().lower() == correct_ans.strip().lower() else 0
-                
-                if current_score > score:
-                    score = current_score
-            
-            total_score += score
-            results.append({
-                'id': q['id'],
-                'category': q.get('category', '默认题集'),
-                'question': q['content'],
-                'user_ans': user_ans,
-                'correct_ans': q['answer'],
-                'score': score,
-                'full_score': q['score']
-            })
-        
-        max_score = sum(q['score'] for q in exam_questions)
-        return {
-            'total_score': total_score,
-            'max_score': max_score,
-            'details': results
-        }
+        """评分逻辑（委托给共享评分引擎）"""
+        index = resolve_exam_index(data, fallback_loader=self._load_questions)
+        return self.engine.grade(data['ids'], data['user_answers'], index)
 
-    def _safe_encode(self, text):
-        """安全编码函数"""
-        if not isinstance(text, str):
-            text = str(text)
-        
-        encodings = ['gbk', 'gb2312', 'utf-8', 'latin-1']
-        for encoding in encodings:
-            try:
-                return text.encode(encoding, errors='ignore')
-            except (UnicodeEncodeError, LookupError):
-                continue
-        
-        # 最终回退
-        return text.encode('utf-8', errors='ignore')
+    def _load_questions(self):
+        """题库快照缺失时的回退：从数据库读取当前题库（工作线程中需要应用上下文）"""
+        with self.app.app_context():
+            return self.data_manager.load_questions()
 
     def _sanitize_details(self, details):
         """清理评分详情中的敏感信息"""
@@ -521,15 +689,23 @@ class GradingQueue:
         """优雅关闭"""
         print("[Queue] Shutting down...")
         
-        if self.mode == 'thread':
+        if self.health:
+            self.health.stop()
+        
+        if self._local_started:
             # 停止所有工作线程
-            for _ in range(len(self.workers)):
-                self.queue.put(None)
+            self.queue.close()
             
             # 等待线程结束
             for worker in self.workers:
                 if worker.is_alive():
                     worker.join(timeout=5)
             
+            if self.pool:
+                self.pool.shutdown()
+            
+            if self.batcher:
+                self.batcher.close()
+            
             print(f"[Queue] Shutdown complete. Final task count: {len(self.tasks)}")
 
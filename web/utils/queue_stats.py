@@ -0,0 +1,227 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Celery worker 定时把队列指标写入 Redis，Web 端读取聚合值，不再对集群做同步 inspect 广播
+WORKERS_KEY = 'grading:stats:workers'          # zset: worker_id -> 最近心跳时间
+WORKER_KEY_PREFIX = 'grading:stats:worker:'    # hash: 单个 worker 的指标
+EMIT_LOCK_KEY = 'grading:stats:emit_lock'      # 同一周期只由一个 worker 推送管理员房间
+ADMIN_ROOM = 'admin:queue'
+BROKER_QUEUE = 'celery'                        # Celery 默认队列（Redis broker 中为 list）
+HEARTBEAT_INTERVAL = 5
+LATENCY_SAMPLES = 50
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round((len(values) - 1) * pct)))
+    return round(values[k], 3)
+
+
+class WorkerStatsPublisher:
+    """
+    在 Celery worker 进程内统计任务数与耗时，每 interval 秒写入一次 Redis（带 TTL）。
+    """
+
+    def __init__(self, redis_client, interval=HEARTBEAT_INTERVAL, emitter_factory=None, ready_check=None):
+        self.redis = redis_client
+        self.interval = interval
+        self.emitter_factory = emitter_factory
+        # 可选：返回本进程资源是否已预热完成
+        self.ready_check = ready_check
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.run_times = deque(maxlen=LATENCY_SAMPLES)
+        self.wait_times = deque(maxlen=LATENCY_SAMPLES)
+        self._started = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            print(f"[QueueStats] Heartbeat publisher started for {self.worker_id}")
+
+    def stop(self):
+        self._stop.set()
+
+    def task_started(self, task_id, submitted_at=None):
+        now = time.time()
+        with self.lock:
+            self.active += 1
+            self._started[task_id] = now
+            if submitted_at:
+                self.wait_times.append(max(0.0, now - submitted_at))
+
+    def task_finished(self, task_id, failed=False):
+        now = time.time()
+        with self.lock:
+            self.active = max(0, self.active - 1)
+            started = self._started.pop(task_id, None)
+            if started:
+                self.run_times.append(now - started)
+            if failed:
+                self.failed += 1
+            else:
+                self.processed += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.publish()
+            self._stop.wait(self.interval)
+
+    def publish(self):
+        now = time.time()
+        with self.lock:
+            payload = {
+                'active': self.active,
+                'processed': self.processed,
+                'failed': self.failed,
+                'run_times': json.dumps([round(t, 3) for t in self.run_times]),
+                'wait_times': json.dumps([round(t, 3) for t in self.wait_times]),
+                'heartbeat': now,
+                'ready': 1 if (self.ready_check is None or self.ready_check()) else 0
+            }
+        try:
+            key = f"{WORKER_KEY_PREFIX}{self.worker_id}"
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, mapping=payload)
+            pipe.expire(key, self.interval * 3)
+            pipe.zadd(WORKERS_KEY, {self.worker_id: now})
+            # 清理已下线 worker 的心跳记录
+            pipe.zremrangebyscore(WORKERS_KEY, 0, now - self.interval * 3)
+            pipe.execute()
+        except Exception as e:
+            print(f"[QueueStats] Heartbeat publish failed: {e}")
+            return
+
+        self._emit_admin_update()
+
+    def _emit_admin_update(self):
+        """每个周期由抢到锁的 worker 向管理员房间推送一次聚合统计"""
+        if not self.emitter_factory:
+            return
+        try:
+            if not self.redis.set(EMIT_LOCK_KEY, self.worker_id, nx=True, ex=self.interval):
+                return
+            emitter = self.emitter_factory()
+            if emitter:
+                emitter.emit('queue_stats', read_queue_stats(self.redis, self.interval), room=ADMIN_ROOM)
+        except Exception as e:
+            print(f"[QueueStats] Admin update emit failed: {e}")
+
+
+def count_alive_workers(redis_client, interval=HEARTBEAT_INTERVAL):
+    """心跳未过期的 worker 数量"""
+    return redis_client.zcount(WORKERS_KEY, time.time() - interval * 3, '+inf')
+
+
+def read_queue_stats(redis_client, interval=HEARTBEAT_INTERVAL):
+    """
+    读取所有在线 worker 的心跳数据并聚合（一次 pipeline 往返），
+    附带 broker 队列中真实的积压长度。
+    """
+    now = time.time()
+    worker_ids = redis_client.zrangebyscore(WORKERS_KEY, now - interval * 3, '+inf')
+
+    pipe = redis_client.pipeline(transaction=False)
+    for worker_id in worker_ids:
+        pipe.hgetall(f"{WORKER_KEY_PREFIX}{worker_id}")
+    pipe.llen(BROKER_QUEUE)
+    replies = pipe.execute()
+    backlog = replies[-1] or 0
+
+    active = processed = failed = ready = 0
+    run_times = []
+    wait_times = []
+    last_heartbeat = 0
+    workers = 0
+    for data in replies[:-1]:
+        if not data:
+            continue
+        workers += 1
+        ready += int(data.get('ready', 1))
+        active += int(data.get('active', 0))
+        processed += int(data.get('processed', 0))
+        failed += int(data.get('failed', 0))
+        run_times.extend(json.loads(data.get('run_times') or '[]'))
+        wait_times.extend(json.loads(data.get('wait_times') or '[]'))
+        last_heartbeat = max(last_heartbeat, float(data.get('heartbeat', 0)))
+
+    return {
+        'mode': 'Distributed (Celery)',
+        'active': active,
+        'waiting': backlog,
+        'workers': workers,
+        'ready_workers': ready,
+        'tasks_processed': processed,
+        'tasks_failed': failed,
+        'latency': {
+            'run_avg': round(sum(run_times) / len(run_times), 3) if run_times else 0.0,
+            'run_p95': _percentile(run_times, 0.95),
+            'wait_avg': round(sum(wait_times) / len(wait_times), 3) if wait_times else 0.0,
+            'wait_p95': _percentile(wait_times, 0.95)
+        },
+        'last_heartbeat': datetime.fromtimestamp(last_heartbeat).isoformat() if last_heartbeat else None,
+        'last_update': datetime.now().isoformat()
+    }
+
+
+_publisher = None
+
+
+def install_worker_stats(celery_app, redis_client, emitter_factory=None, ready_check=None):
+    """在 Celery worker 中注册信号：统计任务并启动心跳线程"""
+    from celery import signals
+
+    global _publisher
+    if redis_client is None:
+        print("[QueueStats] Redis unavailable, worker heartbeat disabled")
+        return None
+
+    interval = celery_app.conf.get('GRADING_STATS_INTERVAL', HEARTBEAT_INTERVAL)
+    _publisher = WorkerStatsPublisher(
+        redis_client, interval=interval, emitter_factory=emitter_factory, ready_check=ready_check
+    )
+
+    @signals.worker_ready.connect(weak=False)
+    def _on_worker_ready(sender=None, **kwargs):
+        # prefork 池由子进程各自上报（worker_process_init），主进程不计入
+        controller = getattr(sender, 'controller', sender)
+        pool_cls = str(getattr(controller, 'pool_cls', '') or '').lower()
+        if 'prefork' not in pool_cls and 'processes' not in pool_cls:
+            _publisher.start()
+
+    @signals.worker_process_init.connect(weak=False)
+    def _on_worker_process_init(**kwargs):
+        _publisher.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        _publisher.start()
+
+    @signals.task_prerun.connect(weak=False)
+    def _on_task_prerun(task_id=None, args=None, kwargs=None, **extra):
+        submitted_at = None
+        for arg in (args or ()):
+            if isinstance(arg, dict) and arg.get('submitted_at'):
+                submitted_at = arg['submitted_at']
+                break
+        _publisher.task_started(task_id, submitted_at=submitted_at)
+
+    @signals.task_postrun.connect(weak=False)
+    def _on_task_postrun(task_id=None, state=None, **extra):
+        _publisher.task_finished(task_id, failed=(state == 'FAILURE'))
+
+    @signals.worker_shutdown.connect(weak=False)
+    def _on_worker_shutdown(**kwargs):
+        _publisher.stop()
+
+    return _publisher
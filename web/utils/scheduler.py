@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# 优先级通道：靠前的通道先被调度（正在进行的考试提交优先于重评和维护任务）
+LANES = ('exam', 'regrade', 'maintenance')
+WAIT_SAMPLES = 200
+
+
+class QueueFull(Exception):
+    """队列已满：调用方应在 retry_after 秒后重试，而不是丢弃任务"""
+
+    def __init__(self, retry_after, lane='exam'):
+        self.retry_after = retry_after
+        self.lane = lane
+        super().__init__(f"Grading queue is full, retry after {retry_after}s")
+
+
+class _Lane:
+    """单个优先级通道：按用户分组，用户之间轮询（公平排队）"""
+    __slots__ = ('name', 'users', 'rotation', 'size', 'enqueued', 'dispatched', 'rejected', 'waits')
+
+    def __init__(self, name):
+        self.name = name
+        self.users = {}           # user_id -> deque[(task_id, enqueued_at)]
+        self.rotation = deque()   # 有待处理任务的用户，按轮询顺序
+        self.size = 0
+        self.enqueued = 0
+        self.dispatched = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def push(self, user_id, task_id, now):
+        pending = self.users.get(user_id)
+        if pending is None:
+            pending = self.users[user_id] = deque()
+            self.rotation.append(user_id)
+        pending.append((task_id, now))
+        self.size += 1
+        self.enqueued += 1
+
+    def pop(self, now):
+        user_id = self.rotation.popleft()
+        pending = self.users[user_id]
+        task_id, enqueued_at = pending.popleft()
+        if pending:
+            # 该用户还有任务：排到队尾，先轮到其他用户
+            self.rotation.append(user_id)
+        else:
+            del self.users[user_id]
+        self.size -= 1
+        self.dispatched += 1
+        self.waits.append(now - enqueued_at)
+        return task_id
+
+    def stats(self, now):
+        waits = sorted(self.waits)
+        oldest = 0.0
+        for pending in self.users.values():
+            oldest = max(oldest, now - pending[0][1])
+        return {
+            'waiting': self.size,
+            'users': len(self.users),
+            'enqueued': self.enqueued,
+            'dispatched': self.dispatched,
+            'rejected': self.rejected,
+            'wait_avg': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'wait_p95': round(waits[int((len(waits) - 1) * 0.95)], 3) if waits else 0.0,
+            'oldest_wait': round(oldest, 3)
+        }
+
+
+class FairScheduler:
+    """
+    本地评分调度器（替代无界 FIFO 的 queue.Queue）：
+    - 多个优先级通道，高优先级通道非空时先调度
+    - 通道内按用户轮询，单个用户批量提交不会饿死其他用户
+    - 总容量有界，满时抛出 QueueFull（附带建议的重试秒数）
+    """
+
+    def __init__(self, capacity=1000, lane_capacity=None, workers=1):
+        self.capacity = capacity
+        # 各通道的独立上限（未配置则只受总容量限制）
+        self.lane_capacity = lane_capacity or {}
+        self.workers = max(1, workers)
+        self.lanes = OrderedDict((name, _Lane(name)) for name in LANES)
+        self.size = 0
+        self.avg_service_time = 1.0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, task_id, user_id, lane='exam'):
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        with self._cond:
+            target = self.lanes[lane]
+            limit = self.lane_capacity.get(lane)
+            if self.size >= self.capacity or (limit and target.size >= limit):
+                target.rejected += 1
+                raise QueueFull(self._retry_after(), lane=lane)
+            target.push(user_id, task_id, time.time())
+            self.size += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """阻塞直到有任务可调度；调度器关闭后返回 None"""
+        with self._cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while self.size == 0 and not self._closed:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self.size == 0:
+                return None
+            now = time.time()
+            for lane in self.lanes.values():
+                if lane.size:
+                    self.size -= 1
+                    return lane.pop(now)
+
+    def record_service_time(self, seconds):
+        """记录单个任务的处理耗时（指数平均），用于估算 retry_after"""
+        with self._cond:
+            self.avg_service_time = self.avg_service_time * 0.8 + seconds * 0.2
+
+    def _retry_after(self):
+        # 按当前积压和处理速度估算排空一批任务所需时间
+        estimate = self.size * self.avg_service_time / self.workers
+        return max(1, min(300, int(estimate) + 1))
+
+    def qsize(self):
+        return self.size
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {
+                'capacity': self.capacity,
+                'waiting': self.size,
+                'retry_after': self._retry_after() if self.size >= self.capacity else 0,
+                'lanes': {name: lane.stats(now) for name, lane in self.lanes.items()}
+            }
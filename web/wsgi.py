@@ -1,16 +1,18 @@
 
-# ---- gevent patch_all 必须最早 ----
-import gevent.monkey
-gevent.monkey.patch_all(ssl=True, aggressive=True)
-
+# Windows / waitress 入口：python wsgi.py
+# 评分进程池使用 spawn，子进程会以 __mp_main__ 重新导入本模块，
+# 因此 gevent patch 与 create_app 都只在 __main__ 中执行，子进程不会再构建一遍整个应用
 import os
 import sys
 
-from web import create_app
+if __name__ == "__main__":
+    # ---- gevent patch_all 必须最早 ----
+    import gevent.monkey
+    gevent.monkey.patch_all(ssl=True, aggressive=True)
 
-app = create_app()
+    from web import create_app
+    app = create_app()
 
-if __name__ == "__main__":
     from waitress import serve
     print("=======================================================")
     print("   Auto Grading System - Production Server (Windows)")